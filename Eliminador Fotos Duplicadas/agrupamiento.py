@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+AGRUPAMIENTO DE CUASI-DUPLICADOS - Grupos de fotos parecidas con NumPy
+Distancias de Hamming vectorizadas por bloques y componentes conexas
+"""
+
+from indice_similitud import segmentos_hamming
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+if NUMPY_AVAILABLE:
+    # Bits a 1 de cada byte, para NumPy sin np.bitwise_count (< 2.0)
+    _BITS_POR_BYTE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def contar_bits(valores):
+    """Popcount elemento a elemento de un array uint64"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(valores)
+    bytes_ = np.ascontiguousarray(valores).view(np.uint8).reshape(valores.shape + (8,))
+    return _BITS_POR_BYTE[bytes_].sum(axis=-1, dtype=np.uint8)
+
+
+def empaquetar_hashes(columnas_hex, previos=None):
+    """
+    Convierte listas de hashes hexadecimales (una por tipo de hash) en un
+    array uint64 de forma (n, tipos). `previos` son hashes ya enteros, fila
+    a fila (p. ej. un array('Q') de la biblioteca), que van delante.
+    """
+    hashes = np.array([[int(h, 16) for h in columna] for columna in columnas_hex],
+                      dtype=np.uint64).T.reshape(-1, len(columnas_hex))
+    if previos is not None and len(previos):
+        return np.concatenate([matriz_hashes(previos, len(columnas_hex)), hashes])
+    return hashes.copy()
+
+
+def matriz_hashes(enteros, tipos):
+    """
+    Vista uint64 de forma (n, tipos), sin copiar, de hashes ya enteros
+    guardados fila a fila en un array('Q'). Mientras exista la vista el
+    array no puede crecer.
+    """
+    return np.frombuffer(enteros, dtype=np.uint64).reshape(-1, tipos)
+
+
+class _Conjuntos:
+    """Union-find cuya raíz es siempre el índice más bajo del conjunto"""
+
+    def __init__(self, n):
+        self.padre = list(range(n))
+
+    def raiz(self, i):
+        padre = self.padre
+        while padre[i] != i:
+            padre[i] = padre[padre[i]]
+            i = padre[i]
+        return i
+
+    def unir(self, a, b):
+        ra, rb = self.raiz(a), self.raiz(b)
+        if ra != rb:
+            if ra < rb:
+                self.padre[rb] = ra
+            else:
+                self.padre[ra] = rb
+
+
+def agrupar_cuasi_duplicados(hashes, umbrales, combinacion='todos', tamaño_bloque=2048):
+    """
+    Agrupa en componentes conexas las fotos a distancia <= umbral.
+
+    hashes:      array uint64 (n, tipos), p. ej. columnas aHash, dHash, pHash
+    umbrales:    umbral de Hamming para cada tipo
+    combinacion: 'todos' (cerca en todos los tipos) o 'alguno' (en cualquiera)
+
+    Para no comparar todo con todo, solo se comparan las fotos que
+    comparten un segmento del hash (ver IndiceHamming); dentro de cada
+    grupo de candidatos la comparación se hace en bloques de
+    tamaño_bloque x tamaño_bloque, así que la memoria está acotada.
+
+    Devuelve un array (n,) con el identificador de grupo de cada foto: el
+    índice de la primera foto del grupo.
+    """
+    if combinacion not in ('todos', 'alguno'):
+        raise ValueError(f"Combinación no soportada: {combinacion}")
+
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if hashes.ndim == 1:
+        hashes = hashes[:, None]
+    n, tipos = hashes.shape
+    umbrales = np.asarray(umbrales, dtype=np.uint8)
+    conjuntos = _Conjuntos(n)
+
+    # Con 'todos' basta con buscar candidatos en el primer tipo; con
+    # 'alguno' un par puede estar cerca solo en uno de ellos
+    tipos_candidatos = [0] if combinacion == 'todos' else range(tipos)
+
+    for tipo in tipos_candidatos:
+        for desplazamiento, mascara in segmentos_hamming(int(umbrales[tipo])):
+            claves = (hashes[:, tipo] >> np.uint64(desplazamiento)) & np.uint64(mascara)
+            orden = np.argsort(claves, kind='stable')
+            claves = claves[orden]
+            cortes = np.flatnonzero(claves[1:] != claves[:-1]) + 1
+            inicios = np.concatenate(([0], cortes))
+            finales = np.concatenate((cortes, [n]))
+            repetidos = (finales - inicios) > 1
+
+            for inicio, final in zip(inicios[repetidos], finales[repetidos]):
+                miembros = orden[inicio:final]
+                _comparar_miembros(hashes, miembros, umbrales, combinacion,
+                                   tamaño_bloque, conjuntos)
+
+    return np.array([conjuntos.raiz(i) for i in range(n)], dtype=np.int64)
+
+
+def _comparar_miembros(hashes, miembros, umbrales, combinacion, tamaño_bloque, conjuntos):
+    """Une los pares cercanos de `miembros`, comparando por bloques"""
+    m = len(miembros)
+    for i in range(0, m, tamaño_bloque):
+        filas = miembros[i:i + tamaño_bloque]
+        for j in range(i, m, tamaño_bloque):
+            columnas = miembros[j:j + tamaño_bloque]
+            distancias = contar_bits(hashes[filas][:, None, :] ^ hashes[columnas][None, :, :])
+            cerca = distancias <= umbrales
+            cerca = cerca.all(axis=-1) if combinacion == 'todos' else cerca.any(axis=-1)
+            if i == j:
+                cerca = np.triu(cerca, k=1)
+            for a, b in zip(*np.nonzero(cerca)):
+                conjuntos.unir(int(filas[a]), int(columnas[b]))
+
+
+def elegir_mejores(grupos, medidas):
+    """
+    Elige la mejor foto de cada grupo de una vez, sin recorrer los grupos.
+
+    grupos:  número de grupo de cada foto (n,)
+    medidas: array (n, medidas) donde más es mejor (p. ej. resolución,
+             nitidez, contraste, bytes por píxel); NaN cuenta como 0
+
+    Cada medida se divide por su máximo dentro del grupo, así que escalas
+    distintas pesan igual, y la puntuación es la media. Con empate (p. ej.
+    copias exactas) gana la primera. Devuelve {grupo: índice de la mejor}.
+    """
+    grupos = np.asarray(grupos, dtype=np.int64)
+    if not len(grupos):
+        return {}
+    medidas = np.nan_to_num(np.asarray(medidas, dtype=np.float64).reshape(len(grupos), -1), nan=0.0)
+    medidas = np.clip(medidas, 0, None)
+    _, posiciones = np.unique(grupos, return_inverse=True)
+
+    maximos = np.zeros((posiciones.max() + 1, medidas.shape[1]))
+    for columna in range(medidas.shape[1]):
+        np.maximum.at(maximos[:, columna], posiciones, medidas[:, columna])
+    maximos = maximos[posiciones]
+    normalizadas = np.divide(medidas, maximos, out=np.zeros_like(medidas), where=maximos > 0)
+    puntuacion = normalizadas.mean(axis=1)
+
+    # Por grupo, de mejor a peor y, a igualdad, por orden de aparición
+    orden = np.lexsort((np.arange(len(grupos)), -puntuacion, posiciones))
+    primeras = orden[np.concatenate(([True], posiciones[orden][1:] != posiciones[orden][:-1]))]
+    return {int(grupos[i]): int(i) for i in primeras}
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+ALMACÉN COMPACTO - Estructuras sin un objeto Python por foto
+Cadenas internadas en un bloque de bytes, diccionario entero -> entero
+y conjunto de rutas sobre arrays, para índices de decenas de millones de fotos
+"""
+
+import hashlib
+from array import array
+
+# Valor de clave libre en MapaEnteros (las claves válidas son >= 0)
+VACIO = -1
+# Constante de Fibonacci para repartir claves consecutivas por la tabla
+_MULTIPLICADOR = 0x9E3779B97F4A7C15
+_MASCARA_64 = (1 << 64) - 1
+
+
+class TablaCadenas:
+    """
+    Lista de cadenas guardadas una tras otra en un único bytearray UTF-8.
+    Cada cadena se identifica por su posición (0, 1, 2...). Cuesta los
+    bytes de la cadena más 12 bytes de índice, en lugar de ~50 bytes de
+    cabecera de un str (o ~200 de un Path) por elemento.
+    """
+
+    __slots__ = ('datos', 'inicios', 'largos')
+
+    def __init__(self):
+        self.datos = bytearray()
+        self.inicios = array('Q')
+        self.largos = array('I')
+
+    def __len__(self):
+        return len(self.inicios)
+
+    def agregar(self, texto):
+        """Añade una cadena y devuelve su identificador"""
+        codificado = str(texto).encode('utf-8', 'surrogateescape')
+        self.inicios.append(len(self.datos))
+        self.largos.append(len(codificado))
+        self.datos += codificado
+        return len(self.inicios) - 1
+
+    def reemplazar(self, identificador, texto):
+        """Cambia una cadena; la anterior queda ocupando sitio en el bloque"""
+        codificado = str(texto).encode('utf-8', 'surrogateescape')
+        self.inicios[identificador] = len(self.datos)
+        self.largos[identificador] = len(codificado)
+        self.datos += codificado
+
+    def quitar_ultima(self):
+        """Deshace el último agregar()"""
+        del self.datos[self.inicios.pop():]
+        self.largos.pop()
+
+    def __getitem__(self, identificador):
+        inicio = self.inicios[identificador]
+        return self.datos[inicio:inicio + self.largos[identificador]].decode('utf-8', 'surrogateescape')
+
+    def bytes_usados(self):
+        return (len(self.datos) + len(self.inicios) * self.inicios.itemsize
+                + len(self.largos) * self.largos.itemsize)
+
+
+class MapaEnteros:
+    """
+    Diccionario de enteros >= 0 a enteros < 2**32 con direccionamiento
+    abierto (sondeo lineal) sobre dos arrays. Con una ocupación entre el
+    35 % y el 70 % cuesta unos 17-34 bytes por entrada, frente a ~100 de un
+    dict con claves y valores int.
+    """
+
+    __slots__ = ('claves', 'valores', 'cantidad', 'bits')
+
+    def __init__(self, capacidad=1024):
+        self.bits = max(4, (capacidad - 1).bit_length())
+        self.claves = array('q', [VACIO]) * (1 << self.bits)
+        self.valores = array('I', [0]) * (1 << self.bits)
+        self.cantidad = 0
+
+    def __len__(self):
+        return self.cantidad
+
+    def _posicion(self, clave):
+        """Hueco de la clave: el suyo si existe o el libre donde iría"""
+        mascara = (1 << self.bits) - 1
+        i = ((clave * _MULTIPLICADOR) & _MASCARA_64) >> (64 - self.bits)
+        claves = self.claves
+        while True:
+            actual = claves[i]
+            if actual == clave or actual == VACIO:
+                return i
+            i = (i + 1) & mascara
+
+    def get(self, clave, defecto=None):
+        i = self._posicion(clave)
+        return self.valores[i] if self.claves[i] != VACIO else defecto
+
+    def __contains__(self, clave):
+        return self.claves[self._posicion(clave)] != VACIO
+
+    def __setitem__(self, clave, valor):
+        if clave < 0:
+            raise ValueError("MapaEnteros solo admite claves >= 0")
+        i = self._posicion(clave)
+        if self.claves[i] == VACIO:
+            self.claves[i] = clave
+            self.cantidad += 1
+            self.valores[i] = valor
+            if self.cantidad * 10 > len(self.claves) * 7:
+                self._crecer()
+        else:
+            self.valores[i] = valor
+
+    def _crecer(self):
+        claves, valores = self.claves, self.valores
+        self.bits += 1
+        self.claves = array('q', [VACIO]) * (1 << self.bits)
+        self.valores = array('I', [0]) * (1 << self.bits)
+        for clave, valor in zip(claves, valores):
+            if clave != VACIO:
+                i = self._posicion(clave)
+                self.claves[i] = clave
+                self.valores[i] = valor
+
+    def bytes_usados(self):
+        return len(self.claves) * (self.claves.itemsize + self.valores.itemsize)
+
+
+def huella_ruta(ruta):
+    """Huella de 63 bits (BLAKE2b) de una ruta, válida como clave de MapaEnteros"""
+    digest = hashlib.blake2b(str(ruta).encode('utf-8', 'surrogateescape'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') >> 1
+
+
+class ConjuntoRutas:
+    """
+    Conjunto de rutas guardadas solo como huella de 63 bits (BLAKE2b) en un
+    MapaEnteros: unos 17-34 bytes por ruta, frente a ~150 de un set de str.
+    Dos rutas distintas con la misma huella se confundirían; con diez
+    millones de rutas la probabilidad de que ocurra es de ~1 entre 200.000.
+    """
+
+    __slots__ = ('mapa',)
+
+    def __init__(self, capacidad=1024):
+        self.mapa = MapaEnteros(capacidad)
+
+    def __len__(self):
+        return len(self.mapa)
+
+    def agregar(self, ruta):
+        self.mapa[huella_ruta(ruta)] = 1
+
+    def __contains__(self, ruta):
+        return huella_ruta(ruta) in self.mapa
+
+    def bytes_usados(self):
+        return self.mapa.bytes_usados()
@@ -4,12 +4,76 @@ ANALIZADOR DE RESULTADOS - Estadísticas de fotos organizadas
 Ejecutar DESPUÉS de organizar las fotos
 """
 
-import os
-from pathlib import Path
+import sys
+from pathlib import Path, PurePosixPath
 from collections import defaultdict
 
-def analizar_carpeta_organizada(carpeta_path):
-    """Analiza la distribución de fotos en la carpeta organizada"""
+from escaner import recorrer_imagenes, EXTENSIONES_IMAGEN
+from manifiesto import ManifiestoBiblioteca, CARPETA_REVISION, NOMBRE_MANIFIESTO
+
+def contar_desde_disco(carpeta):
+    """
+    Cuenta las fotos recorriendo la biblioteca (bibliotecas sin manifiesto).
+    Devuelve (distribucion, revision, carpetas_vacias).
+    """
+    distribucion = defaultdict(dict)
+    carpetas_vacias = 0
+    
+    # Carpetas de años: nombres solo con dígitos (no 00_PENDIENTE_REVISION)
+    for año_carpeta in sorted(carpeta.iterdir()):
+        if año_carpeta.is_dir() and año_carpeta.name.isdigit():
+            for mes_carpeta in sorted(año_carpeta.iterdir()):
+                if mes_carpeta.is_dir():
+                    cantidad = sum(1 for _ in recorrer_imagenes(mes_carpeta, EXTENSIONES_IMAGEN, recursivo=False))
+                    if cantidad > 0:
+                        distribucion[año_carpeta.name][mes_carpeta.name] = cantidad
+                    elif not any(mes_carpeta.iterdir()):
+                        carpetas_vacias += 1
+    
+    revision = {}
+    revision_path = carpeta / CARPETA_REVISION
+    if revision_path.exists():
+        for subcarpeta in revision_path.iterdir():
+            if subcarpeta.is_dir():
+                revision[subcarpeta.name] = sum(1 for _ in recorrer_imagenes(subcarpeta))
+    
+    return distribucion, revision, carpetas_vacias
+
+def verificar_manifiesto(carpeta, manifiesto, depurar=False):
+    """
+    Comprueba el manifiesto contra el disco en un solo recorrido: fotos
+    registradas que ya no están y fotos presentes que no están registradas.
+    Con depurar=True se quitan del manifiesto las que ya no existen.
+    """
+    en_disco = {PurePosixPath(archivo.relative_to(carpeta)).as_posix()
+                for archivo, _ in recorrer_imagenes(carpeta)}
+    registradas = manifiesto.rutas()
+    faltan = registradas - en_disco
+    sin_registrar = en_disco - registradas
+    
+    print(f"\n🔎 VERIFICACIÓN DEL MANIFIESTO")
+    print(f"   Registradas: {len(registradas):,} | En disco: {len(en_disco):,}")
+    print(f"   Registradas pero ausentes: {len(faltan):,}")
+    print(f"   En disco sin registrar: {len(sin_registrar):,}")
+    for ruta in sorted(faltan)[:10]:
+        print(f"      ❌ {ruta}")
+    for ruta in sorted(sin_registrar)[:10]:
+        print(f"      ➕ {ruta}")
+    
+    if depurar and faltan:
+        manifiesto.eliminar(faltan)
+        print(f"   🧹 {len(faltan):,} entradas ausentes quitadas del manifiesto")
+    elif faltan:
+        print("   💡 Usa --depurar para quitarlas del manifiesto")
+    return faltan, sin_registrar
+
+def analizar_carpeta_organizada(carpeta_path, verificar=False, depurar=False):
+    """
+    Analiza la distribución de fotos en la carpeta organizada. Con
+    verificar=True contrasta antes el manifiesto con el disco (solo
+    informa); con depurar=True además quita del manifiesto las fotos que
+    ya no existen, el único caso en que se abre para escribir.
+    """
     carpeta = Path(carpeta_path)
     
     if not carpeta.exists():
@@ -20,26 +84,23 @@ def analizar_carpeta_organizada(carpeta_path):
     print(f"📊 ANÁLISIS DE: {carpeta_path}")
     print(f"{'='*60}")
     
-    # Contar fotos por año y mes
-    distribucion = defaultdict(lambda: defaultdict(int))
-    total_fotos = 0
+    # Contar fotos por año y mes: del manifiesto si existe, si no del disco
+    manifiesto = ManifiestoBiblioteca.abrir_existente(carpeta, solo_lectura=not depurar)
+    if manifiesto is not None:
+        print(f"📒 Usando el manifiesto {NOMBRE_MANIFIESTO}")
+        try:
+            if verificar or depurar:
+                verificar_manifiesto(carpeta, manifiesto, depurar=depurar)
+            distribucion = manifiesto.distribucion()
+            revision = manifiesto.revision()
+        finally:
+            manifiesto.cerrar()
+        carpetas_vacias = 0
+    else:
+        print("📂 Sin manifiesto: recorriendo las carpetas")
+        distribucion, revision, carpetas_vacias = contar_desde_disco(carpeta)
     
-    # Buscar carpetas de años (nombres numéricos)
-    for año_carpeta in sorted(carpeta.glob("[0-9]*")):
-        if año_carpeta.is_dir():
-            año = año_carpeta.name
-            for mes_carpeta in sorted(año_carpeta.glob("*")):
-                if mes_carpeta.is_dir():
-                    # Contar archivos de imagen
-                    extensiones = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
-                    cantidad = 0
-                    for ext in extensiones:
-                        cantidad += len(list(mes_carpeta.glob(f"*{ext}")))
-                        cantidad += len(list(mes_carpeta.glob(f"*{ext.upper()}")))
-                    
-                    if cantidad > 0:
-                        distribucion[año][mes_carpeta.name] = cantidad
-                        total_fotos += cantidad
+    total_fotos = sum(sum(meses.values()) for meses in distribucion.values())
     
     if total_fotos == 0:
         print("⚠️ No se encontraron fotos organizadas por año/mes")
@@ -92,32 +153,22 @@ def analizar_carpeta_organizada(carpeta_path):
         print(f"   • Años con fotos: {len(distribucion)}")
         print(f"   • Promedio por año: {total_fotos // len(distribucion):,} fotos")
         
-        # Carpetas vacías
-        carpetas_vacias = 0
-        for año_carpeta in carpeta.glob("[0-9]*"):
-            if año_carpeta.is_dir():
-                for mes_carpeta in año_carpeta.glob("*"):
-                    if mes_carpeta.is_dir() and not any(mes_carpeta.iterdir()):
-                        carpetas_vacias += 1
-        
+        # Carpetas vacías (solo se conocen recorriendo el disco)
         if carpetas_vacias > 0:
             print(f"\n📁 Carpetas vacías: {carpetas_vacias}")
             print("   (Normal - solo se llenan si hay fotos de esa fecha)")
     
     # Analizar carpeta de revisión
-    revision_path = carpeta / "00_PENDIENTE_REVISION"
-    if revision_path.exists():
+    if revision or (carpeta / CARPETA_REVISION).exists():
         print(f"\n{'='*40}")
         print("⚠️  FOTOS PENDIENTES DE REVISIÓN")
         print(f"{'='*40}")
         
         total_revisar = 0
-        for subcarpeta in revision_path.glob("*"):
-            if subcarpeta.is_dir():
-                cantidad = len(list(subcarpeta.glob("*.*")))
-                if cantidad > 0:
-                    print(f"   📁 {subcarpeta.name}: {cantidad:,} fotos")
-                    total_revisar += cantidad
+        for subcarpeta, cantidad in sorted(revision.items()):
+            if cantidad > 0:
+                print(f"   📁 {subcarpeta}: {cantidad:,} fotos")
+                total_revisar += cantidad
         
         if total_revisar > 0:
             print(f"\n   Total a revisar: {total_revisar:,} fotos")
@@ -145,7 +196,11 @@ def main():
     if not carpeta:
         carpeta = "FOTOS_ORGANIZADAS"
     
-    analizar_carpeta_organizada(carpeta)
+    # --verificar: contrasta el manifiesto con el disco antes de analizar
+    # --depurar: además quita del manifiesto las fotos que ya no existen
+    verificar = '--verificar' in sys.argv[1:]
+    depurar = '--depurar' in sys.argv[1:]
+    analizar_carpeta_organizada(carpeta, verificar=verificar, depurar=depurar)
     
     input("\n🎯 Presiona Enter para salir...")
 
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK DE DECODIFICACIÓN - Hash perceptual completo vs. reducido
+Compara tiempo por imagen y memoria máxima (RSS) en JPEGs grandes
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFilter
+import imagehash
+
+from indice_similitud import distancia_hamming, hash_a_entero
+from metricas import memoria_residente_mb
+from sonda_imagen import SondaImagen
+
+
+def generar_jpegs(carpeta, cantidad=5, ancho=6000, alto=4000, semilla=1):
+    """Genera JPEGs sintéticos del tamaño de una cámara de 24 MP"""
+    random.seed(semilla)
+    archivos = []
+    for i in range(cantidad):
+        imagen = Image.new('RGB', (ancho, alto), (random.randrange(256),) * 3)
+        dibujo = ImageDraw.Draw(imagen)
+        for _ in range(60):
+            x, y = random.randrange(ancho), random.randrange(alto)
+            color = tuple(random.randrange(256) for _ in range(3))
+            dibujo.ellipse((x, y, x + random.randrange(200, 2000), y + random.randrange(200, 2000)), fill=color)
+        imagen = imagen.filter(ImageFilter.GaussianBlur(3))
+        ruta = Path(carpeta) / f"camara_{i:02d}.jpg"
+        imagen.save(ruta, quality=92)
+        archivos.append(str(ruta))
+    return archivos
+
+
+def hash_completo(archivo):
+    """Método anterior: decodificar la imagen completa"""
+    with Image.open(archivo) as imagen:
+        return str(imagehash.average_hash(imagen))
+
+
+def hash_reducido(archivo):
+    """Método actual: decodificación reducida vía SondaImagen"""
+    with SondaImagen(archivo) as sonda:
+        return sonda.hash_perceptual()
+
+
+def medir(modo, archivos):
+    """Se ejecuta en un subproceso para que el RSS máximo sea solo de este modo"""
+    funcion = hash_completo if modo == 'completo' else hash_reducido
+    tiempos = []
+    hashes = []
+    for archivo in archivos:
+        inicio = time.perf_counter()
+        hashes.append(funcion(archivo))
+        tiempos.append(time.perf_counter() - inicio)
+    return {
+        'modo': modo,
+        'ms_por_imagen': round(1000 * sum(tiempos) / len(tiempos), 1),
+        'rss_max_mb': memoria_residente_mb(maxima=True),
+        'hashes': hashes
+    }
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--medir':
+        print(json.dumps(medir(sys.argv[2], sys.argv[3:])))
+        return
+
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as carpeta:
+        print(f"🖼️  Generando {cantidad} JPEGs de 6000x4000...")
+        archivos = generar_jpegs(carpeta, cantidad)
+
+        resultados = {}
+        for modo in ('completo', 'reducido'):
+            salida = subprocess.run([sys.executable, __file__, '--medir', modo] + archivos,
+                                    capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            resultados[modo] = json.loads(salida.stdout)
+
+    print(f"\n{'Modo':<10} {'ms/imagen':>10} {'RSS máx (MB)':>14}")
+    for modo, r in resultados.items():
+        print(f"{modo:<10} {r['ms_por_imagen']:>10} {r['rss_max_mb']:>14}")
+
+    distancias = [distancia_hamming(hash_a_entero(a), hash_a_entero(b))
+                  for a, b in zip(resultados['completo']['hashes'], resultados['reducido']['hashes'])]
+    print(f"\nBits distintos entre ambos hashes: máx {max(distancias)}, "
+          f"media {sum(distancias) / len(distancias):.2f} (de 64)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK DE MEMORIA - Bytes por foto de los índices de duplicados
+Llena el detector de duplicados exactos y el índice perceptual con un
+millón de fotos sintéticas (como tras una carga desde la caché: digest y
+hash ya conocidos, sin leer archivos) y mide la memoria con tracemalloc
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from duplicados_exactos import DetectorDuplicadosExactos
+from indice_similitud import IndiceHamming
+
+# Bytes por foto máximos (detector de exactos + índice perceptual)
+PRESUPUESTO_BYTES_POR_FOTO = 300.0
+
+MESES = ('01_Enero', '02_Febrero', '03_Marzo', '04_Abril', '05_Mayo', '06_Junio', '07_Julio',
+         '08_Agosto', '09_Septiembre', '10_Octubre', '11_Noviembre', '12_Diciembre')
+
+
+def fotos_sinteticas(cantidad, semilla=1, duplicados=0.02):
+    """
+    Genera (ruta, nombre, tamaño, digest, hash perceptual). Una fracción
+    `duplicados` repite el contenido de una foto anterior y otra igual es
+    un cuasi-duplicado (hash a 2 bits de distancia de uno anterior).
+    Los tamaños se repiten a menudo, así que el detector compara digests.
+    """
+    rng = random.Random(semilla)
+    vistas = []
+    for i in range(cantidad):
+        nombre = f"IMG_{i:08d}.JPG"
+        ruta = f"/fotos/{2005 + i % 20}/{MESES[i % 12]}/lote_{i // 500:05d}/{nombre}"
+        azar = rng.random()
+        if vistas and azar < duplicados:
+            _, tamaño, digest, hash_perceptual = rng.choice(vistas)
+        else:
+            tamaño = rng.randrange(500_000, 12_000_000)
+            digest = rng.randbytes(16).hex()
+            hash_perceptual = rng.getrandbits(64)
+            if vistas and azar < 2 * duplicados:
+                hash_perceptual = rng.choice(vistas)[3] ^ 0b101
+        if len(vistas) < 10_000:
+            vistas.append((ruta, tamaño, digest, hash_perceptual))
+        yield ruta, nombre, tamaño, digest, hash_perceptual
+
+
+def medir(cantidad, semilla=1):
+    """Registra `cantidad` fotos y devuelve el desglose de memoria"""
+    fotos = list(fotos_sinteticas(cantidad, semilla))
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    inicio = time.perf_counter()
+
+    detector = DetectorDuplicadosExactos(algoritmo='md5')
+    indice = IndiceHamming(umbral=5)
+    exactos = 0
+    for ruta, nombre, tamaño, digest, hash_perceptual in fotos:
+        # Como cargar_biblioteca(): los exactos se descartan y el resto se indexa sin buscar
+        if detector.registrar(ruta, nombre, tamaño, digest) is not None:
+            exactos += 1
+        else:
+            indice.agregar(ruta, hash_perceptual)
+        detector.digests_calculados.clear()
+    cuasi = sum(1 for _, _, _, _, hash_perceptual in fotos[-1000:]
+                if len(indice.buscar(hash_perceptual)) > 1)
+
+    duracion = time.perf_counter() - inicio
+    memoria = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return {
+        'fotos': cantidad,
+        'registradas': len(detector),
+        'indexadas': len(indice),
+        'duplicados_exactos': exactos,
+        'cuasi_duplicados': cuasi,
+        'segundos': round(duracion, 2),
+        'bytes_totales': memoria,
+        'bytes_por_foto': round(memoria / cantidad, 1),
+        'detector_bytes_por_foto': round(detector.bytes_usados() / cantidad, 1),
+        'indice_bytes_por_foto': round(indice.bytes_usados() / cantidad, 1),
+        'rutas_bytes_por_foto': round(detector.rutas.bytes_usados() / cantidad, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria por foto de los índices de duplicados")
+    parser.add_argument('--fotos', type=int, default=1_000_000)
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--presupuesto', type=float, default=PRESUPUESTO_BYTES_POR_FOTO,
+                        help="bytes por foto máximos; por encima, código de salida 1")
+    args = parser.parse_args()
+
+    print(f"🧮 Registrando {args.fotos:,} fotos sintéticas...")
+    r = medir(args.fotos, args.semilla)
+    print(f"   {r['registradas']:,} en el detector, {r['indexadas']:,} en el índice perceptual "
+          f"({r['duplicados_exactos']:,} exactos; {r['cuasi_duplicados']} de las últimas 1.000 con "
+          f"algún cuasi-duplicado) en {r['segundos']} s")
+    print(f"💾 Memoria: {r['bytes_totales'] / 1e6:,.1f} MB → {r['bytes_por_foto']} bytes por foto")
+    print(f"   detector {r['detector_bytes_por_foto']} (rutas {r['rutas_bytes_por_foto']}), "
+          f"índice perceptual {r['indice_bytes_por_foto']}")
+    print(f"   Proyección a 10 millones de fotos: {r['bytes_por_foto'] * 10_000_000 / 1e9:,.2f} GB")
+
+    if r['bytes_por_foto'] > args.presupuesto:
+        print(f"❌ Por encima del presupuesto de {args.presupuesto:.0f} bytes por foto")
+        sys.exit(1)
+    print(f"✅ Dentro del presupuesto de {args.presupuesto:.0f} bytes por foto")
+
+
+if __name__ == "__main__":
+    main()
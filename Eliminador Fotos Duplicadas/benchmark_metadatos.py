@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK DE METADATOS - Lector de cabeceras vs. PIL para fecha y dimensiones
+Compara tiempo y bytes leídos por archivo sobre el corpus sintético del
+benchmark del organizador, y comprueba que ambos caminos coinciden
+"""
+
+import argparse
+import io
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from PIL import Image
+from PIL.ExifTags import TAGS
+
+from benchmark_organizador import generar_corpus
+from escaner import recorrer_imagenes
+from metadatos_imagen import leer_metadatos
+
+
+def metadatos_anterior(archivo):
+    """Camino anterior: leer el archivo, abrirlo con PIL y recorrer el IFD0 por nombre de etiqueta"""
+    with open(archivo, 'rb') as f:
+        datos = f.read()
+    with Image.open(io.BytesIO(datos)) as imagen:
+        fecha = None
+        for tag_id, valor in imagen.getexif().items():
+            if TAGS.get(tag_id, tag_id) in ('DateTime', 'DateTimeOriginal', 'DateTimeDigitized'):
+                try:
+                    fecha = datetime.strptime(valor, '%Y:%m:%d %H:%M:%S')
+                    break
+                except (ValueError, TypeError):
+                    continue
+        return {'fecha': fecha, 'dimensiones': imagen.size, 'bytes_leidos': len(datos)}
+
+
+def metadatos_cabecera(archivo):
+    """Camino nuevo desde el disco: solo la cabecera"""
+    return leer_metadatos(archivo)
+
+
+def medir(funcion, archivos, repeticiones):
+    """Mejor de `repeticiones` pasadas (con la caché de páginas ya caliente)"""
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultados = [funcion(archivo) for archivo in archivos]
+        duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return mejor, resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lector de cabeceras vs. PIL")
+    parser.add_argument('--fotos', type=int, default=300)
+    parser.add_argument('--ancho', type=int, default=1024)
+    parser.add_argument('--alto', type=int, default=768)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--corpus', help="carpeta del corpus (por defecto, una temporal)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporal:
+        carpeta = Path(args.corpus or temporal)
+        print(f"🖼️  Corpus de {args.fotos} fotos de {args.ancho}x{args.alto}...")
+        try:
+            generar_corpus(carpeta, args.fotos, ancho=args.ancho, alto=args.alto)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        archivos = [str(archivo) for archivo, _ in recorrer_imagenes(carpeta)]
+        contenidos = [Path(archivo).read_bytes() for archivo in archivos]
+
+        caminos = {
+            'PIL (anterior)': (metadatos_anterior, archivos),
+            'cabecera, disco': (metadatos_cabecera, archivos),
+            'cabecera, memoria': (leer_metadatos, contenidos),
+        }
+        resultados = {}
+        print(f"\n{'Camino':<20} {'µs/archivo':>11} {'KB leídos/archivo':>18}")
+        for nombre, (funcion, entradas) in caminos.items():
+            duracion, salida = medir(funcion, entradas, args.repeticiones)
+            resultados[nombre] = salida
+            leidos = [r.get('bytes_leidos', 0) for r in salida if r]
+            print(f"{nombre:<20} {1e6 * duracion / len(entradas):>11.1f} "
+                  f"{sum(leidos) / max(len(leidos), 1) / 1024:>18.2f}")
+
+    anterior, nuevo = resultados['PIL (anterior)'], resultados['cabecera, disco']
+    sin_cabecera = sum(1 for r in nuevo if r is None)
+    dimensiones = sum(1 for a, n in zip(anterior, nuevo) if n and a['dimensiones'] != n['dimensiones'])
+    fechas = sum(1 for a, n in zip(anterior, nuevo) if n and a['fecha'] != n['fecha'])
+    print(f"\n{len(archivos)} archivos: {sin_cabecera} necesitarían PIL, "
+          f"{dimensiones} con dimensiones distintas, {fechas} con fecha distinta "
+          f"(DateTimeOriginal donde antes se leía DateTime)")
+
+
+if __name__ == "__main__":
+    main()
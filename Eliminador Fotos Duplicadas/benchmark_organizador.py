@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK DEL ORGANIZADOR - Rendimiento de punta a punta con un corpus sintético
+Genera un corpus reproducible, organiza, analiza y guarda los resultados
+para comparar entre versiones
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from PIL import Image, ImageChops
+
+from metricas import memoria_residente_mb
+
+CARPETA_SCRIPT = Path(__file__).resolve().parent
+RESULTADOS_POR_DEFECTO = CARPETA_SCRIPT / "resultados_benchmark.jsonl"
+ARCHIVOS_POR_LOTE = 1000
+RE_LOTE = re.compile(r'lote_\d{4}')
+
+# Proporción de cada tipo de archivo en el corpus
+MEZCLA = (
+    ('jpeg_exif', 0.60),      # JPEG con fecha EXIF
+    ('jpeg_sin_exif', 0.10),  # JPEG sin EXIF (fecha por mtime)
+    ('png', 0.10),            # PNG sin metadatos
+    ('copia_exacta', 0.08),   # copia byte a byte de una anterior
+    ('cuasi_duplicado', 0.08),  # redimensionada o recomprimida
+    ('baja_calidad', 0.04),   # diminuta y muy comprimida
+)
+
+
+def _imagen_base(rng, ancho, alto, ruido):
+    """Imagen suave a partir de una rejilla 8x8 aleatoria (hash perceptual distinto) con ruido"""
+    rejilla = Image.frombytes('RGB', (8, 8), bytes(rng.randrange(256) for _ in range(8 * 8 * 3)))
+    return ImageChops.add(rejilla.resize((ancho, alto), Image.BILINEAR), ruido, offset=-32)
+
+
+def _exif_con_fecha(rng):
+    exif = Image.Exif()
+    exif[306] = (f"{rng.randrange(2005, 2025)}:{rng.randrange(1, 13):02d}:"
+                 f"{rng.randrange(1, 29):02d} 12:00:00")
+    return exif
+
+
+def generar_corpus(carpeta, cantidad, semilla=1, ancho=1024, alto=768):
+    """
+    Genera `cantidad` archivos en carpeta/lote_NNNN/ con la mezcla de MEZCLA.
+    Con la misma semilla se obtienen los mismos bytes y las mismas fechas.
+    Si la carpeta ya tiene un corpus con los mismos parámetros se reutiliza;
+    si tiene otro, se borran sus lotes y su corpus.json, y nada más. Una
+    carpeta con cualquier otra cosa dentro (p. ej. fotos de verdad) no se
+    toca: se lanza ValueError.
+    """
+    carpeta = Path(carpeta)
+    parametros = {'cantidad': cantidad, 'semilla': semilla, 'ancho': ancho, 'alto': alto}
+    descripcion_path = carpeta / "corpus.json"
+    if descripcion_path.exists():
+        descripcion = json.loads(descripcion_path.read_text())
+        if descripcion.get('parametros') == parametros:
+            return descripcion
+    if carpeta.exists():
+        ajenos = [entrada.name for entrada in carpeta.iterdir()
+                  if entrada.name != descripcion_path.name
+                  and not (entrada.is_dir() and RE_LOTE.fullmatch(entrada.name))]
+        if ajenos:
+            raise ValueError(f"{carpeta} no está vacía y no es un corpus sintético "
+                             f"(contiene {', '.join(sorted(ajenos)[:3])}); elige una carpeta vacía o nueva")
+        descripcion_path.unlink(missing_ok=True)
+        for lote in carpeta.iterdir():
+            shutil.rmtree(lote)
+    carpeta.mkdir(parents=True, exist_ok=True)
+
+    rng = random.Random(semilla)
+    # Ruido de ±32 niveles derivado de la semilla (effect_noise no es reproducible)
+    ruido = Image.frombytes('L', (ancho, alto), rng.randbytes(ancho * alto)).point(lambda v: v // 4)
+    ruido = ruido.convert('RGB')
+    tipos = [tipo for tipo, _ in MEZCLA]
+    pesos = [peso for _, peso in MEZCLA]
+    originales = []
+    conteo = {tipo: 0 for tipo in tipos}
+    bytes_totales = 0
+    fecha_base = datetime(2024, 1, 1).timestamp()
+
+    for i in range(cantidad):
+        lote = carpeta / f"lote_{i // ARCHIVOS_POR_LOTE:04d}"
+        if i % ARCHIVOS_POR_LOTE == 0:
+            lote.mkdir()
+        tipo = rng.choices(tipos, pesos)[0]
+        if tipo in ('copia_exacta', 'cuasi_duplicado') and not originales:
+            tipo = 'jpeg_exif'
+
+        if tipo == 'copia_exacta':
+            ruta = lote / f"copia_{i:07d}.jpg"
+            shutil.copyfile(rng.choice(originales), ruta)
+        elif tipo == 'cuasi_duplicado':
+            ruta = lote / f"cuasi_{i:07d}.jpg"
+            with Image.open(rng.choice(originales)) as original:
+                exif = original.getexif()
+                if rng.random() < 0.5:
+                    original = original.resize((ancho * 9 // 10, alto * 9 // 10))
+                original.convert('RGB').save(ruta, quality=rng.choice((60, 75)), exif=exif)
+        elif tipo == 'baja_calidad':
+            ruta = lote / f"miniatura_{i:07d}.jpg"
+            _imagen_base(rng, 320, 240, ruido.crop((0, 0, 320, 240))).save(ruta, quality=30)
+        else:
+            imagen = _imagen_base(rng, ancho, alto, ruido)
+            if tipo == 'png':
+                ruta = lote / f"captura_{i:07d}.png"
+                imagen.save(ruta, compress_level=1)
+            else:
+                ruta = lote / f"foto_{i:07d}.jpg"
+                exif = _exif_con_fecha(rng) if tipo == 'jpeg_exif' else Image.Exif()
+                imagen.save(ruta, quality=90, exif=exif)
+            originales.append(ruta)
+
+        # mtime fijo: las fotos sin EXIF se fechan por él
+        mtime = fecha_base - rng.randrange(10 * 365 * 86400)
+        os.utime(ruta, (mtime, mtime))
+        conteo[tipo] += 1
+        bytes_totales += ruta.stat().st_size
+
+    descripcion = {'parametros': parametros, 'tipos': conteo, 'bytes': bytes_totales}
+    descripcion_path.write_text(json.dumps(descripcion, indent=2))
+    return descripcion
+
+
+def medir(corpus, destino, procesos, modo, agrupar, hilos=0):
+    """Se ejecuta en un subproceso: organiza y analiza, midiendo cada etapa"""
+    from organizador_fotos import OrganizadorFotos
+    from analizar_resultados import analizar_carpeta_organizada
+
+    etapas = {}
+
+    @contextlib.contextmanager
+    def etapa(nombre):
+        inicio = time.perf_counter()
+        yield
+        etapas[nombre] = round(time.perf_counter() - inicio, 3)
+
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        with etapa('inicializar'):
+            organizador = OrganizadorFotos(corpus, destino, procesos=procesos, modo_colocacion=modo,
+                                           agrupar_cuasi=agrupar, silencioso=True,
+                                           planificar=hilos > 0, hilos=hilos or 4)
+            organizador.crear_estructura_carpetas()
+        with etapa('procesar_carpeta'):
+            organizador.procesar_carpeta()
+        with etapa('generar_reporte'):
+            organizador.generar_reporte()
+            organizador.cerrar()
+        with etapa('analizar'):
+            analizar_carpeta_organizada(destino)
+
+    return {
+        'etapas_s': etapas,
+        'etapas_organizador_ms': {nombre: {'media': etapa['media_ms'], 'p95': etapa['p95_ms']}
+                                  for nombre, etapa in organizador.metricas.resumen()['etapas'].items()},
+        'estadisticas': organizador.estadisticas,
+        'rss_max_mb': memoria_residente_mb(maxima=True)
+    }
+
+
+def version_actual():
+    """Commit actual del repositorio, si se puede saber"""
+    try:
+        salida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True, cwd=CARPETA_SCRIPT)
+        return salida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconocida'
+
+
+def resultado_anterior(ruta_resultados, parametros):
+    """Último resultado guardado con los mismos parámetros, o None"""
+    anterior = None
+    if Path(ruta_resultados).exists():
+        with open(ruta_resultados, encoding='utf-8') as f:
+            for linea in f:
+                if linea.strip():
+                    resultado = json.loads(linea)
+                    if resultado['parametros'] == parametros:
+                        anterior = resultado
+    return anterior
+
+
+def comparar(actual, anterior, tolerancia=0.10, minimo_s=0.05):
+    """
+    Imprime la diferencia con el resultado anterior y marca las regresiones
+    (cambios de más de `tolerancia`; en etapas, además, de más de `minimo_s`)
+    """
+    print(f"\n📊 Comparación con {anterior['version']} ({anterior['fecha']}):")
+    metricas = [('archivos_por_s', True), ('bytes_por_s', True), ('rss_max_mb', False)]
+    metricas += [(f"etapas_s.{nombre}", False) for nombre in actual['etapas_s']]
+    for metrica, mayor_es_mejor in metricas:
+        valor, previo = actual, anterior
+        for clave in metrica.split('.'):
+            valor, previo = valor.get(clave), (previo or {}).get(clave)
+        if not previo:
+            continue
+        cambio = (valor - previo) / previo
+        peor = -cambio if mayor_es_mejor else cambio
+        if metrica.startswith('etapas_s.') and abs(valor - previo) < minimo_s:
+            peor = 0
+        marca = "⚠️  REGRESIÓN" if peor > tolerancia else "✅" if peor < -tolerancia else "  "
+        print(f"   {marca} {metrica}: {previo} → {valor} ({cambio:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta del organizador de fotos")
+    parser.add_argument('cantidad', type=int, nargs='?', default=1000,
+                        help="archivos del corpus (de 1000 a 1000000)")
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--ancho', type=int, default=1024)
+    parser.add_argument('--alto', type=int, default=768)
+    parser.add_argument('--procesos', type=int, default=1)
+    parser.add_argument('--modo', default='copiar', help="modo de colocación")
+    parser.add_argument('--agrupar', action='store_true', help="agrupar cuasi-duplicados en lote")
+    parser.add_argument('--hilos', type=int, default=0,
+                        help="planificar primero y colocar con este número de hilos (0 = sin plan)")
+    parser.add_argument('--corpus', help="carpeta donde generar (o reutilizar) el corpus")
+    parser.add_argument('--resultados', default=str(RESULTADOS_POR_DEFECTO),
+                        help="archivo JSONL donde se acumulan los resultados")
+    parser.add_argument('--medir', nargs=2, metavar=('CORPUS', 'DESTINO'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(*args.medir, args.procesos, args.modo, args.agrupar, args.hilos)))
+        return
+
+    corpus = Path(args.corpus) if args.corpus else Path(tempfile.gettempdir()) / \
+        f"corpus_fotos_{args.cantidad}_{args.semilla}_{args.ancho}x{args.alto}"
+    print(f"🖼️  Preparando corpus de {args.cantidad:,} archivos en {corpus}...")
+    inicio = time.perf_counter()
+    try:
+        descripcion = generar_corpus(corpus, args.cantidad, args.semilla, args.ancho, args.alto)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"   {descripcion['tipos']} ({descripcion['bytes'] / 1e6:,.1f} MB, "
+          f"{time.perf_counter() - inicio:.1f} s)")
+
+    with tempfile.TemporaryDirectory() as temporal:
+        destino = Path(temporal) / "FOTOS_ORGANIZADAS"
+        comando = [sys.executable, os.path.abspath(__file__), '--medir', str(corpus), str(destino),
+                   '--procesos', str(args.procesos), '--modo', args.modo]
+        if args.agrupar:
+            comando.append('--agrupar')
+        if args.hilos:
+            comando += ['--hilos', str(args.hilos)]
+        print("🚀 Organizando y analizando...")
+        salida = subprocess.run(comando, capture_output=True, text=True, check=True, cwd=CARPETA_SCRIPT)
+        medicion = json.loads(salida.stdout.strip().splitlines()[-1])
+
+    segundos = medicion['etapas_s']['procesar_carpeta']
+    parametros = {'cantidad': args.cantidad, 'semilla': args.semilla, 'ancho': args.ancho,
+                  'alto': args.alto, 'procesos': args.procesos, 'modo': args.modo,
+                  'agrupar': args.agrupar}
+    if args.hilos:
+        parametros['hilos'] = args.hilos
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version': version_actual(),
+        'parametros': parametros,
+        'archivos_por_s': round(args.cantidad / segundos, 1) if segundos else None,
+        'bytes_por_s': round(descripcion['bytes'] / segundos) if segundos else None,
+        **medicion
+    }
+
+    print(f"\n{'Etapa':<20} {'s':>10}")
+    for nombre, valor in resultado['etapas_s'].items():
+        print(f"{nombre:<20} {valor:>10}")
+    print(f"\n{'Etapa por archivo':<20} {'media ms':>10} {'p95 ms':>10}")
+    for nombre, valor in resultado['etapas_organizador_ms'].items():
+        print(f"{nombre:<20} {valor['media']:>10} {valor['p95']:>10}")
+    print(f"\n📈 {resultado['archivos_por_s']} archivos/s, "
+          f"{resultado['bytes_por_s'] / 1e6:.1f} MB/s, RSS máx {resultado['rss_max_mb']} MB")
+    print(f"   {resultado['estadisticas']}")
+
+    anterior = resultado_anterior(args.resultados, parametros)
+    if anterior is not None:
+        comparar(resultado, anterior)
+
+    with open(args.resultados, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+    print(f"\n💾 Resultado guardado en {args.resultados}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+CACHÉ DE HUELLAS - Guarda en disco los datos calculados de cada foto
+Permite que las ejecuciones repetidas solo procesen las fotos nuevas o cambiadas
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+
+NOMBRE_CACHE = ".cache_huellas.sqlite"
+# compactar() solo recorre la caché una vez cada tantos días (salvo si se fuerza)
+COMPACTAR_CADA_DIAS = 30
+# y solo reescribe la base de datos (VACUUM) si las páginas libres superan esta fracción
+FRACCION_VACUUM = 0.25
+
+
+class CacheHuellas:
+    """
+    Caché SQLite de huellas por archivo.
+
+    Cada fila se identifica por la ruta y se valida con tamaño, mtime e
+    inodo: si alguno cambia, la fila se considera obsoleta y se recalcula.
+    Los campos desconocidos se guardan como NULL y se calculan cuando hacen
+    falta. Con solo_lectura=True (simulaciones) se consulta pero no se
+    escribe nada: guardar() y compactar() no hacen nada.
+    """
+
+    def __init__(self, ruta_db, lote_commit=500, version_phash=1, version_fecha=1, solo_lectura=False):
+        self.ruta_db = Path(ruta_db)
+        self.solo_lectura = solo_lectura
+        self.version_phash = version_phash
+        self.version_fecha = version_fecha
+        self.lote_commit = lote_commit
+        self.pendientes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidados = 0
+        if solo_lectura:
+            # immutable: sin bloqueos ni archivos -wal/-shm (mode=ro los crearía en modo WAL)
+            self.conexion = sqlite3.connect(f"{self.ruta_db.resolve().as_uri()}?mode=ro&immutable=1", uri=True)
+            columnas = [fila[1] for fila in self.conexion.execute("PRAGMA table_info(huellas)")]
+            if 'contraste' not in columnas:
+                self.conexion.close()
+                raise ValueError(f"{self.ruta_db} es de una versión anterior y no se puede leer sin migrarla")
+            return
+        self.ruta_db.parent.mkdir(parents=True, exist_ok=True)
+        self.conexion = sqlite3.connect(str(self.ruta_db))
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.execute("""
+            CREATE TABLE IF NOT EXISTS huellas (
+                ruta TEXT PRIMARY KEY,
+                bytes INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inodo INTEGER NOT NULL,
+                digest TEXT,
+                algoritmo TEXT,
+                phash TEXT,
+                fecha TEXT,
+                ancho INTEGER,
+                alto INTEGER,
+                phash_version INTEGER,
+                dhash TEXT,
+                phash_dct TEXT,
+                fecha_version INTEGER,
+                nitidez REAL,
+                contraste REAL
+            )
+        """)
+        # Cachés creadas por versiones anteriores: añadir las columnas nuevas
+        columnas = [fila[1] for fila in self.conexion.execute("PRAGMA table_info(huellas)")]
+        for columna, tipo in (('phash_version', 'INTEGER'), ('dhash', 'TEXT'), ('phash_dct', 'TEXT'),
+                              ('fecha_version', 'INTEGER'), ('nitidez', 'REAL'), ('contraste', 'REAL')):
+            if columna not in columnas:
+                self.conexion.execute(f"ALTER TABLE huellas ADD COLUMN {columna} {tipo}")
+        self.conexion.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)")
+        self.conexion.commit()
+
+    @classmethod
+    def abrir_solo_lectura(cls, ruta_db, **opciones):
+        """Abre una caché existente sin escribir en ella, o devuelve None si no hay (o no se puede leer)"""
+        if not Path(ruta_db).exists():
+            return None
+        try:
+            return cls(ruta_db, solo_lectura=True, **opciones)
+        except (sqlite3.Error, ValueError):
+            return None
+
+    @staticmethod
+    def _clave(ruta):
+        return os.path.abspath(ruta)
+
+    def obtener(self, ruta, st):
+        """Devuelve la huella guardada si el archivo no ha cambiado, o None"""
+        fila = self.conexion.execute(
+            "SELECT bytes, mtime_ns, inodo, digest, algoritmo, phash, fecha, ancho, alto, phash_version, "
+            "dhash, phash_dct, fecha_version, nitidez, contraste FROM huellas WHERE ruta = ?",
+            (self._clave(ruta),)
+        ).fetchone()
+
+        if fila is None:
+            self.fallos += 1
+            return None
+
+        (tamaño, mtime_ns, inodo, digest, algoritmo, phash, fecha, ancho, alto,
+         phash_version, dhash, phash_dct, fecha_version, nitidez, contraste) = fila
+        if (tamaño, mtime_ns, inodo) != (st.st_size, st.st_mtime_ns, st.st_ino):
+            # El archivo cambió desde la última vez
+            self.invalidados += 1
+            self.fallos += 1
+            return None
+
+        if phash_version != self.version_phash:
+            # Hashes perceptuales (y medidas de calidad, de la misma
+            # decodificación) calculados con otra versión: se recalculan
+            phash = dhash = phash_dct = nitidez = contraste = None
+        if fecha_version != self.version_fecha:
+            # Fecha extraída con otra versión del lector de metadatos
+            fecha = None
+
+        self.aciertos += 1
+        return {
+            'digest': digest,
+            'algoritmo': algoritmo,
+            'phash': phash,
+            'dhash': dhash,
+            'phash_dct': phash_dct,
+            'nitidez': nitidez,
+            'contraste': contraste,
+            'fecha': datetime.fromisoformat(fecha) if fecha else None,
+            'dimensiones': (ancho, alto) if ancho is not None else None,
+        }
+
+    def guardar(self, ruta, st, huella):
+        """Guarda (o reemplaza) la huella de un archivo"""
+        if self.solo_lectura:
+            return
+        fecha = huella.get('fecha')
+        dimensiones = huella.get('dimensiones') or (None, None)
+        self.conexion.execute(
+            "INSERT OR REPLACE INTO huellas "
+            "(ruta, bytes, mtime_ns, inodo, digest, algoritmo, phash, fecha, ancho, alto, phash_version, "
+            "dhash, phash_dct, fecha_version, nitidez, contraste) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self._clave(ruta), st.st_size, st.st_mtime_ns, st.st_ino,
+             huella.get('digest'), huella.get('algoritmo'), huella.get('phash'),
+             fecha.isoformat() if fecha else None, dimensiones[0], dimensiones[1],
+             self.version_phash, huella.get('dhash'), huella.get('phash_dct'), self.version_fecha,
+             huella.get('nitidez'), huella.get('contraste'))
+        )
+        self._quizas_commit()
+
+    def actualizar_digest(self, ruta, digest, algoritmo):
+        """Añade el digest a una fila existente (se calcula a veces más tarde)"""
+        if self.solo_lectura:
+            return
+        self.conexion.execute(
+            "UPDATE huellas SET digest = ?, algoritmo = ? WHERE ruta = ?",
+            (digest, algoritmo, self._clave(ruta))
+        )
+        self._quizas_commit()
+
+    def _quizas_commit(self):
+        self.pendientes += 1
+        if self.pendientes >= self.lote_commit:
+            self.conexion.commit()
+            self.pendientes = 0
+
+    def compactar(self, forzar=False, cada_dias=COMPACTAR_CADA_DIAS):
+        """
+        Elimina las filas de archivos que ya no existen (un stat por fila).
+        Como cuesta tanto como recorrer la biblioteca, sin forzar solo se
+        hace una vez cada `cada_dias`; la primera vez solo se anota la
+        fecha. VACUUM reescribe la base de datos entera, así que solo se
+        lanza cuando las páginas libres superan FRACCION_VACUUM. Devuelve
+        las filas eliminadas, o None si aún no tocaba.
+        """
+        if self.solo_lectura:
+            return None
+        ahora = datetime.now()
+        fila = self.conexion.execute("SELECT valor FROM meta WHERE clave = 'ultima_compactacion'").fetchone()
+        if not forzar and (fila is None or ahora - datetime.fromisoformat(fila[0]) < timedelta(days=cada_dias)):
+            if fila is None:
+                self._fijar_ultima_compactacion(ahora)
+            return None
+
+        desaparecidas = [(ruta,) for ruta, in self.conexion.execute("SELECT ruta FROM huellas")
+                         if not os.path.exists(ruta)]
+        self.conexion.executemany("DELETE FROM huellas WHERE ruta = ?", desaparecidas)
+        self._fijar_ultima_compactacion(ahora)
+        libres = self.conexion.execute("PRAGMA freelist_count").fetchone()[0]
+        paginas = self.conexion.execute("PRAGMA page_count").fetchone()[0]
+        if paginas and libres / paginas > FRACCION_VACUUM:
+            self.conexion.execute("VACUUM")
+        return len(desaparecidas)
+
+    def _fijar_ultima_compactacion(self, fecha):
+        self.conexion.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('ultima_compactacion', ?)",
+                              (fecha.isoformat(),))
+        self.conexion.commit()
+
+    def confirmar(self):
+        """Escribe en disco lo pendiente sin esperar a completar el lote"""
+        self.conexion.commit()
+        self.pendientes = 0
+
+    def cerrar(self):
+        self.conexion.commit()
+        self.conexion.close()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+COLOCACIÓN DE ARCHIVOS - Cómo se lleva cada foto a su destino
+Mover, enlace duro, reflink o copia en el kernel, con respaldo automático
+"""
+
+import errno
+import filecmp
+import itertools
+import os
+import shutil
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+MODOS_COLOCACION = ('copiar', 'mover', 'enlace', 'reflink')
+
+# ioctl FICLONE de Linux (btrfs, XFS, bcachefs...): clona sin copiar datos
+FICLONE = 0x40049409
+
+# Errores que significan "esta operación no es posible aquí", no un fallo real
+ERRORES_NO_SOPORTADO = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EINVAL,
+                        errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF}
+
+# renameat2(RENAME_NOREPLACE) de Linux: renombrar fallando si el destino existe
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+try:
+    import ctypes
+    _renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    _renameat2.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+    _renameat2.restype = ctypes.c_int
+    RENAMEAT2_AVAILABLE = True
+except (ImportError, OSError, AttributeError, TypeError):
+    RENAMEAT2_AVAILABLE = False
+
+
+class Colocador:
+    """
+    Coloca archivos en su destino según el modo pedido:
+      - copiar:  copy_file_range (copia dentro del kernel), o copia normal
+      - mover:   enlace duro y borrado, o renombrado sin sobrescribir si el
+                 sistema de archivos no tiene enlaces duros (exFAT, SMB...);
+                 entre sistemas de archivos distintos, copiar y borrar
+      - enlace:  enlace duro, o copiar
+      - reflink: clon copy-on-write (FICLONE), o copiar
+    Cuando el modo pedido no es posible se usa el siguiente y se anota el motivo.
+    Ningún modo sobrescribe un archivo que ya exista en el destino.
+    La carpeta de cada destino se crea la primera vez que se usa y se
+    recuerda, así no se repiten mkdir/stat por cada archivo.
+    Puede usarse desde varios hilos a la vez (ejecutor del plan).
+    """
+
+    def __init__(self, modo='copiar'):
+        if modo not in MODOS_COLOCACION:
+            raise ValueError(f"Modo de colocación no soportado: {modo}")
+        self.modo = modo
+        self.mueve = modo == 'mover'
+        self.archivos = defaultdict(int)
+        self.bytes_escritos = defaultdict(int)
+        self.respaldos = defaultdict(int)
+        self.nombres_cambiados = 0
+        self.carpetas = set()
+        self.carpetas_creadas = 0
+        self._cerrojo = threading.Lock()
+
+    def preparar_carpeta(self, carpeta):
+        """
+        Crea la carpeta (y sus padres) si no se ha visto ya en esta
+        ejecución. `carpetas_creadas` cuenta solo las que no existían.
+        """
+        carpeta = Path(carpeta)
+        if carpeta in self.carpetas:
+            return
+        with self._cerrojo:
+            if carpeta in self.carpetas:
+                return
+            faltan = []
+            actual = carpeta
+            while actual not in self.carpetas and not actual.is_dir() and actual.parent != actual:
+                faltan.append(actual)
+                actual = actual.parent
+            for nueva in reversed(faltan):
+                try:
+                    nueva.mkdir()
+                    self.carpetas_creadas += 1
+                except FileExistsError:
+                    if not nueva.is_dir():
+                        raise  # hay un archivo con ese nombre
+            self.carpetas.update(carpeta.parents)
+            self.carpetas.add(carpeta)
+
+    def preparar_carpetas(self, carpetas):
+        """Crea de una vez todas las carpetas de un plan, cada una una sola vez"""
+        for carpeta in sorted(set(map(Path, carpetas))):
+            try:
+                self.preparar_carpeta(carpeta)
+            except OSError:
+                pass  # colocar() lo vuelve a intentar y el error queda anotado en esa foto
+
+    def _respaldo(self, operacion, error):
+        motivo = f"{operacion}: {errno.errorcode.get(error.errno, error.errno)}"
+        with self._cerrojo:
+            if motivo not in self.respaldos:
+                print(f"   ⚠️  {operacion} no disponible ({error.strerror}), se copia en su lugar")
+            self.respaldos[motivo] += 1
+
+    def _anotar(self, operacion, bytes_escritos):
+        with self._cerrojo:
+            self.archivos[operacion] += 1
+            self.bytes_escritos[operacion] += bytes_escritos
+        return bytes_escritos
+
+    def _crear(self, destino, escribir):
+        """
+        Crea `destino` en exclusiva (FileExistsError si ya existe, también
+        si otro hilo lo acaba de crear) y lo borra si la escritura no termina,
+        para no dejar archivos a medias que parecerían otra foto.
+        """
+        fd = open(destino, 'xb')
+        try:
+            with fd:
+                return escribir(fd)
+        except BaseException:
+            try:
+                os.unlink(destino)
+            except OSError:
+                pass
+            raise
+
+    def _copiar(self, origen, destino):
+        """Copia con copy_file_range y, si no se puede, con copyfileobj; devuelve los bytes escritos"""
+        with open(origen, 'rb') as fo:
+            if hasattr(os, 'copy_file_range'):
+                def copiar_en_kernel(fd):
+                    copiados = 0
+                    tamaño = os.fstat(fo.fileno()).st_size
+                    while copiados < tamaño:
+                        n = os.copy_file_range(fo.fileno(), fd.fileno(), tamaño - copiados)
+                        if n == 0:
+                            break
+                        copiados += n
+                    return copiados
+                try:
+                    copiados = self._crear(destino, copiar_en_kernel)
+                except OSError as e:
+                    if e.errno not in ERRORES_NO_SOPORTADO:
+                        raise
+                    self._respaldo('copy_file_range', e)
+                    fo.seek(0)
+                else:
+                    shutil.copystat(origen, destino)
+                    return self._anotar('copy_file_range', copiados)
+
+            def copiar_en_python(fd):
+                shutil.copyfileobj(fo, fd, 1024 * 1024)
+                return fd.tell()
+            copiados = self._crear(destino, copiar_en_python)
+        shutil.copystat(origen, destino)
+        return self._anotar('copia', copiados)
+
+    def _reflink(self, origen, destino):
+        import fcntl
+        with open(origen, 'rb') as fo:
+            self._crear(destino, lambda fd: fcntl.ioctl(fd.fileno(), FICLONE, fo.fileno()))
+        shutil.copystat(origen, destino)
+
+    def _renombrar(self, origen, destino):
+        """
+        os.rename que nunca sobrescribe: renameat2(RENAME_NOREPLACE) o, si
+        no existe o el sistema de archivos no lo admite, reservar el nombre
+        creando `destino` en exclusiva y reemplazarlo con os.replace.
+        """
+        if RENAMEAT2_AVAILABLE:
+            if _renameat2(AT_FDCWD, os.fsencode(origen), AT_FDCWD, os.fsencode(destino), RENAME_NOREPLACE) == 0:
+                return
+            error = ctypes.get_errno()
+            if error not in (errno.ENOSYS, errno.EINVAL):
+                raise OSError(error, os.strerror(error), str(destino))
+        open(destino, 'xb').close()
+        try:
+            os.replace(origen, destino)
+        except BaseException:
+            try:
+                os.unlink(destino)
+            except OSError:
+                pass
+            raise
+
+    def _mismo_contenido(self, origen, destino):
+        """True si `destino` ya es esta misma foto (el mismo archivo o los mismos bytes)"""
+        try:
+            if os.path.samefile(origen, destino):
+                return True
+            return (os.path.getsize(origen) == os.path.getsize(destino)
+                    and filecmp.cmp(origen, destino, shallow=False))
+        except OSError:
+            return False
+
+    def colocar(self, origen, destino):
+        """
+        Lleva `origen` a `destino` sin sobrescribir nunca otro archivo. Si el
+        nombre ya existe con otro contenido (dos IMG_0001.jpg del mismo mes)
+        se usa nombre_1.jpg, nombre_2.jpg...; si el contenido es el mismo, la
+        foto ya está colocada (al mover, se borra el origen). Devuelve
+        (destino final, bytes escritos).
+        """
+        destino = Path(destino)
+        for n in itertools.count():
+            candidato = destino if n == 0 else destino.with_name(f"{destino.stem}_{n}{destino.suffix}")
+            try:
+                return candidato, self._colocar_en_carpeta(origen, candidato)
+            except FileExistsError:
+                if self._mismo_contenido(origen, candidato):
+                    if self.mueve and os.path.abspath(origen) != os.path.abspath(candidato):
+                        os.unlink(origen)  # la foto ya está en el destino (o es un enlace de un intento anterior)
+                    return candidato, self._anotar('ya_colocado', 0)
+                with self._cerrojo:
+                    self.nombres_cambiados += 1
+
+    def _colocar_en_carpeta(self, origen, destino):
+        carpeta = destino.parent
+        self.preparar_carpeta(carpeta)
+        try:
+            return self._colocar(origen, destino)
+        except FileNotFoundError:
+            if carpeta.is_dir():
+                raise  # lo que falta es el origen
+            # La carpeta se borró después de crearla (p. ej. vaciada a mano en modo continuo)
+            with self._cerrojo:
+                self.carpetas.discard(carpeta)
+            self.preparar_carpeta(carpeta)
+            return self._colocar(origen, destino)
+
+    def _colocar(self, origen, destino):
+        """Una sola colocación; FileExistsError si `destino` ya existe"""
+        if self.modo == 'mover':
+            # Enlace y borrado en lugar de os.rename, que sobrescribiría el destino
+            try:
+                os.link(origen, destino)
+            except OSError as e:
+                if e.errno not in ERRORES_NO_SOPORTADO:
+                    raise
+            else:
+                os.unlink(origen)
+                return self._anotar('renombrado', 0)
+            # Sin enlaces duros (exFAT, muchos recursos SMB): renombrar sin sobrescribir
+            try:
+                self._renombrar(origen, destino)
+                return self._anotar('renombrado', 0)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                self._respaldo('renombrado', e)
+            escritos = self._copiar(origen, destino)
+            os.unlink(origen)
+            return escritos
+
+        if self.modo == 'enlace':
+            try:
+                os.link(origen, destino)
+                return self._anotar('enlace_duro', 0)
+            except OSError as e:
+                if e.errno not in ERRORES_NO_SOPORTADO:
+                    raise
+                self._respaldo('enlace_duro', e)
+
+        elif self.modo == 'reflink':
+            try:
+                self._reflink(origen, destino)
+                return self._anotar('reflink', 0)
+            except (OSError, ImportError) as e:
+                if isinstance(e, OSError) and e.errno not in ERRORES_NO_SOPORTADO:
+                    raise
+                if isinstance(e, ImportError):
+                    e = OSError(errno.ENOSYS, "fcntl no disponible")
+                self._respaldo('reflink', e)
+
+        return self._copiar(origen, destino)
+
+    def resumen(self):
+        """Archivos y bytes escritos por operación, y motivos de respaldo"""
+        return {
+            'modo': self.modo,
+            'archivos': dict(self.archivos),
+            'bytes_escritos': dict(self.bytes_escritos),
+            'respaldos': dict(self.respaldos),
+            'nombres_cambiados': self.nombres_cambiados,
+            'carpetas_creadas': self.carpetas_creadas
+        }
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+DIARIO DE EJECUCIÓN - Registro en disco de cada decisión (JSON Lines)
+Se escribe archivo por archivo, así una ejecución interrumpida puede reanudarse
+"""
+
+import json
+import os
+from pathlib import Path
+
+from almacen_compacto import ConjuntoRutas
+
+NOMBRE_DIARIO = "diario_organizacion.jsonl"
+
+
+class DiarioEjecucion:
+    """
+    Diario de solo añadido: una línea JSON por archivo decidido, escrita y
+    vaciada al disco en cuanto se toma la decisión.
+
+    Con reanudar=True se conserva el diario existente; `completados` tiene
+    las rutas de origen que ya se decidieron (las del diario y las de esta
+    ejecución) y que no hay que repetir. Es un ConjuntoRutas, no un set:
+    en cada ejecución recibe todas las fotos del origen.
+    Con escribir=False (simulaciones) el diario del disco solo se lee, si
+    se reanuda, y nunca se crea ni se trunca.
+    """
+
+    def __init__(self, ruta, reanudar=False, sincronizar_cada=100, escribir=True):
+        self.ruta = Path(ruta)
+        self.completados = ConjuntoRutas()
+        self.sincronizar_cada = sincronizar_cada
+        self.escritas = 0
+        self.archivo = None
+        existente = reanudar and self.ruta.exists()
+        self.leer_existente = existente
+
+        if existente:
+            if escribir:
+                self._reparar_ultima_linea()
+            for entrada in self.entradas():
+                self.completados.agregar(entrada['origen'])
+        if escribir:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            self.archivo = open(self.ruta, 'a' if existente else 'w', encoding='utf-8')
+            self.leer_existente = True
+
+    def _reparar_ultima_linea(self):
+        """Descarta una última línea a medio escribir (caída durante la escritura)"""
+        with open(self.ruta, 'rb+') as f:
+            contenido = f.read()
+            if contenido and not contenido.endswith(b'\n'):
+                f.truncate(contenido.rfind(b'\n') + 1)
+
+    def registrar(self, entrada):
+        """Añade una decisión al diario y la vacía al disco"""
+        if self.archivo is None:
+            self.completados.agregar(entrada['origen'])
+            return
+        self.archivo.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+        self.archivo.flush()
+        self.completados.agregar(entrada['origen'])
+        self.escritas += 1
+        if self.escritas % self.sincronizar_cada == 0:
+            os.fsync(self.archivo.fileno())
+
+    def entradas(self):
+        """Recorre las decisiones del diario sin cargarlo entero en memoria"""
+        if not self.leer_existente:
+            return
+        if self.archivo is not None and not self.archivo.closed:
+            self.archivo.flush()
+        with open(self.ruta, encoding='utf-8') as f:
+            for linea in f:
+                if not linea.endswith('\n'):
+                    break  # última línea a medio escribir (sin reparar, al solo leer)
+                if linea.strip():
+                    yield json.loads(linea)
+
+    def cerrar(self):
+        if self.archivo is not None and not self.archivo.closed:
+            self.archivo.flush()
+            os.fsync(self.archivo.fileno())
+            self.archivo.close()
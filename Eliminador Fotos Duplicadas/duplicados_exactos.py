@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+DETECTOR DE DUPLICADOS EXACTOS - Comparación por etapas
+1. Tamaño del archivo  2. Bloques inicial y final  3. Contenido completo
+"""
+
+import os
+import hashlib
+from array import array
+
+from almacen_compacto import TablaCadenas, MapaEnteros
+
+ALGORITMOS_HASH = ('md5', 'blake2b', 'sha1', 'sha256')
+# Fin de la cadena de archivos con el mismo tamaño
+SIN_SIGUIENTE = 0xFFFFFFFF
+
+
+def nuevo_hash(algoritmo='md5'):
+    """Crea un objeto hash del algoritmo indicado"""
+    if algoritmo not in ALGORITMOS_HASH:
+        raise ValueError(f"Algoritmo de hash no soportado: {algoritmo}")
+    return hashlib.new(algoritmo)
+
+
+def calcular_digest(archivo, algoritmo='md5', tamaño_buffer=1024 * 1024):
+    """Calcula el digest del contenido completo; devuelve (digest, bytes_leidos)"""
+    h = nuevo_hash(algoritmo)
+    leidos = 0
+    buffer = bytearray(tamaño_buffer)
+    vista = memoryview(buffer)
+    with open(archivo, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            h.update(vista[:n])
+            leidos += n
+    return h.hexdigest(), leidos
+
+
+class DetectorDuplicadosExactos:
+    """
+    Detecta duplicados exactos leyendo lo mínimo posible.
+
+    Un archivo con un tamaño que no ha aparecido antes no se lee. Solo
+    cuando dos archivos comparten tamaño se comparan sus bloques inicial
+    y final, y solo si esos coinciden se calcula el digest completo. Los
+    digests se calculan una vez y se guardan junto al archivo.
+
+    Cada archivo registrado es un número (su orden de registro) y sus datos
+    viven en arrays paralelos, sin objetos Python por archivo:
+    ruta y nombre en tablas de cadenas, tamaño (8 bytes), siguiente archivo
+    con el mismo tamaño (4), digest en binario (16 con md5) y si se conoce
+    (1). El primer archivo de cada tamaño está en un MapaEnteros. Los hashes
+    parciales, que solo existen para tamaños repetidos, van en un dict.
+    """
+
+    def __init__(self, algoritmo='md5', tamaño_bloque=64 * 1024, tamaño_buffer=1024 * 1024):
+        self.algoritmo = algoritmo
+        self.ancho_digest = nuevo_hash(algoritmo).digest_size  # Valida el algoritmo cuanto antes
+        self.tamaño_bloque = tamaño_bloque
+        self.tamaño_buffer = tamaño_buffer
+        self.rutas = TablaCadenas()
+        self.nombres = TablaCadenas()
+        self.tamaños = array('Q')
+        self.siguiente = array('I')
+        self.completos = bytearray()
+        self.con_completo = bytearray()
+        self.parciales = {}
+        self.por_tamaño = MapaEnteros()
+        self.digests_calculados = []
+        self.bytes_leidos = 0
+
+    def __len__(self):
+        return len(self.tamaños)
+
+    def bytes_usados(self):
+        """Memoria ocupada por las estructuras del detector (sin los hashes parciales)"""
+        return (self.rutas.bytes_usados() + self.nombres.bytes_usados() + self.por_tamaño.bytes_usados()
+                + len(self.tamaños) * (self.tamaños.itemsize + self.siguiente.itemsize)
+                + len(self.completos) + len(self.con_completo))
+
+    def _completo(self, i):
+        if not self.con_completo[i]:
+            return None
+        return bytes(self.completos[i * self.ancho_digest:(i + 1) * self.ancho_digest])
+
+    def _fijar_completo(self, i, digest):
+        self.completos[i * self.ancho_digest:(i + 1) * self.ancho_digest] = digest
+        self.con_completo[i] = 1
+        self.digests_calculados.append((self.rutas[i], digest.hex()))
+
+    def _hash_parcial(self, i, datos=None):
+        """Hash de los bloques inicial y final (o del archivo entero si es pequeño)"""
+        parcial = self.parciales.get(i)
+        if parcial is None:
+            tamaño = self.tamaños[i]
+            h = nuevo_hash(self.algoritmo)
+            if datos is not None:
+                # El contenido ya está en memoria (sonda del archivo actual)
+                datos = memoryview(datos())
+                if tamaño <= 2 * self.tamaño_bloque:
+                    h.update(datos)
+                    if not self.con_completo[i]:
+                        self._fijar_completo(i, h.digest())
+                else:
+                    h.update(datos[:self.tamaño_bloque])
+                    h.update(datos[-self.tamaño_bloque:])
+            else:
+                with open(self.rutas[i], 'rb') as f:
+                    if tamaño <= 2 * self.tamaño_bloque:
+                        contenido = f.read()
+                        h.update(contenido)
+                        self.bytes_leidos += len(contenido)
+                        # Para archivos pequeños el hash parcial ya es el completo
+                        if not self.con_completo[i]:
+                            self._fijar_completo(i, h.digest())
+                    else:
+                        inicio = f.read(self.tamaño_bloque)
+                        f.seek(-self.tamaño_bloque, os.SEEK_END)
+                        final = f.read(self.tamaño_bloque)
+                        h.update(inicio)
+                        h.update(final)
+                        self.bytes_leidos += len(inicio) + len(final)
+            parcial = self.parciales[i] = h.digest()
+        return parcial
+
+    def _hash_completo(self, i, datos=None):
+        """Digest del contenido completo"""
+        if not self.con_completo[i]:
+            if datos is not None:
+                h = nuevo_hash(self.algoritmo)
+                h.update(datos())
+                digest = h.digest()
+            else:
+                digest, leidos = calcular_digest(self.rutas[i], self.algoritmo, self.tamaño_buffer)
+                self.bytes_leidos += leidos
+                digest = bytes.fromhex(digest)
+            self._fijar_completo(i, digest)
+        return self._completo(i)
+
+    def _descartar_ultimo(self):
+        """Quita el último archivo registrado (duplicado o ilegible): no ocupa sitio"""
+        i = len(self.tamaños) - 1
+        self.rutas.quitar_ultima()
+        self.nombres.quitar_ultima()
+        self.tamaños.pop()
+        self.siguiente.pop()
+        del self.completos[i * self.ancho_digest:]
+        self.con_completo.pop()
+        self.parciales.pop(i, None)
+
+    def renombrar(self, ruta_anterior, ruta_nueva, tamaño):
+        """Actualiza la ruta de un archivo registrado que se ha movido"""
+        ruta_anterior = str(ruta_anterior)
+        i = self.por_tamaño.get(tamaño, SIN_SIGUIENTE)
+        while i != SIN_SIGUIENTE:
+            if self.rutas[i] == ruta_anterior:
+                self.rutas.reemplazar(i, ruta_nueva)
+                return
+            i = self.siguiente[i]
+
+    def _anotar(self, archivo, nombre, tamaño, digest):
+        """Añade el archivo a los arrays, aún fuera de las cadenas por tamaño; devuelve su número"""
+        nuevo = len(self.tamaños)
+        self.rutas.agregar(archivo)
+        self.nombres.agregar(nombre)
+        self.tamaños.append(tamaño)
+        self.siguiente.append(SIN_SIGUIENTE)
+        digest = bytes.fromhex(digest) if digest is not None else None
+        if digest is not None and len(digest) == self.ancho_digest:
+            self.completos += digest
+            self.con_completo.append(1)
+        else:
+            self.completos += bytes(self.ancho_digest)
+            self.con_completo.append(0)
+        return nuevo
+
+    def agregar_sin_comparar(self, archivo, nombre, tamaño, digest=None):
+        """
+        Registra un archivo sin compararlo con los ya registrados ni leer
+        nada, p. ej. las fotos de la biblioteca, que no hay que deduplicar
+        entre sí: sus bloques y su digest solo se calculan si un archivo
+        que llega después tiene el mismo tamaño. Entra en la cadena justo
+        detrás del primero de su tamaño, sin recorrerla.
+        """
+        nuevo = self._anotar(archivo, nombre, tamaño, digest)
+        primero = self.por_tamaño.get(tamaño)
+        if primero is None:
+            self.por_tamaño[tamaño] = nuevo
+        else:
+            self.siguiente[nuevo] = self.siguiente[primero]
+            self.siguiente[primero] = nuevo
+
+    def registrar(self, archivo, nombre, tamaño=None, digest=None, datos=None):
+        """
+        Registra un archivo. Devuelve el nombre del original si es un
+        duplicado exacto de un archivo ya registrado, o None.
+        Si ya se conoce el digest completo (p. ej. de la caché) se usa
+        directamente sin leer el archivo. `datos` es una función opcional
+        que devuelve el contenido ya leído, para no volver a leerlo aquí;
+        no se guarda más allá de esta llamada.
+        """
+        try:
+            if tamaño is None:
+                tamaño = os.path.getsize(archivo)
+        except OSError:
+            return None
+
+        nuevo = self._anotar(archivo, nombre, tamaño, digest)
+        otra = self.por_tamaño.get(tamaño)
+        if otra is None:
+            # Tamaño único hasta ahora: no hace falta leer nada
+            self.por_tamaño[tamaño] = nuevo
+            return None
+
+        try:
+            while True:
+                if not (self.con_completo[nuevo] and self.con_completo[otra]):
+                    if self._hash_parcial(otra) != self._hash_parcial(nuevo, datos):
+                        if self.siguiente[otra] == SIN_SIGUIENTE:
+                            break
+                        otra = self.siguiente[otra]
+                        continue
+                if self._hash_completo(otra) == self._hash_completo(nuevo, datos):
+                    self._descartar_ultimo()
+                    return self.nombres[otra]
+                if self.siguiente[otra] == SIN_SIGUIENTE:
+                    break
+                otra = self.siguiente[otra]
+        except OSError:
+            self._descartar_ultimo()
+            return None
+
+        # Al final de la cadena, para que el original sea siempre el primero
+        self.siguiente[otra] = nuevo
+        return None
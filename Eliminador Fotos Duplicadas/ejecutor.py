@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+EJECUTOR DEL PLAN - Organización en dos fases: planificar y ejecutar
+La primera fase decide qué hacer con cada foto sin escribir nada y guarda
+el plan; la segunda lo ejecuta en un pool de hilos, ordenado por dispositivo,
+con límite de caudal y reintentos ante errores transitorios
+"""
+
+import argparse
+import errno
+import json
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+
+from almacen_compacto import MapaEnteros, huella_ruta
+
+NOMBRE_PLAN = "plan_organizacion.jsonl"
+FORMATO_PLAN = 'plan_organizacion'
+VERSION_PLAN = 1
+
+# Errores que suelen desaparecer al repetir (sobre todo en sistemas de archivos de red)
+ERRORES_TRANSITORIOS = {errno.EAGAIN, errno.EBUSY, errno.EINTR, errno.ETIMEDOUT, errno.ESTALE,
+                        errno.ECONNRESET, errno.ECONNABORTED, errno.EIO}
+
+
+class PlanAcciones:
+    """
+    Plan de una ejecución en JSON Lines: una cabecera y una línea por foto
+    con la entrada del diario (acción, categoría, razón...) y lo necesario
+    para ejecutarla más tarde: ruta absoluta del origen, destino relativo a
+    la carpeta destino, tamaño y mtime del origen para comprobar que no ha
+    cambiado, su dispositivo e inodo para ordenar la ejecución sin otro
+    stat, y el digest para el manifiesto. Se escribe en un temporal y se
+    renombra al cerrar, así nunca queda un plan a medias.
+    """
+
+    def __init__(self, ruta, carpeta_destino, cabecera):
+        self.ruta = Path(ruta)
+        self.carpeta_destino = Path(carpeta_destino)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self.temporal = self.ruta.with_name(self.ruta.name + '.tmp')
+        self.archivo = open(self.temporal, 'w', encoding='utf-8')
+        self.archivo.write(json.dumps({'formato': FORMATO_PLAN, 'version': VERSION_PLAN,
+                                       'creado': datetime.now().isoformat(), **cabecera},
+                                      ensure_ascii=False) + '\n')
+        self.acciones = defaultdict(int)
+        self.bytes_a_colocar = 0
+
+    def agregar(self, archivo, destino, entrada, st=None, huella=None):
+        """Añade la decisión sobre una foto (destino None si no hay nada que colocar)"""
+        huella = huella or {}
+        if destino is not None:
+            destino = PurePosixPath(Path(destino).relative_to(self.carpeta_destino)).as_posix()
+        operacion = {
+            'origen': os.path.abspath(archivo),
+            'destino': destino,
+            'entrada': entrada,
+            'bytes': st.st_size if st is not None else None,
+            'mtime_ns': st.st_mtime_ns if st is not None else None,
+            'dispositivo': st.st_dev if st is not None else None,
+            'inodo': st.st_ino if st is not None else None,
+            'digest': huella.get('digest'),
+            'algoritmo': huella.get('algoritmo')
+        }
+        self.archivo.write(json.dumps(operacion, ensure_ascii=False) + '\n')
+        self.acciones[entrada['accion']] += 1
+        if destino is not None and st is not None:
+            self.bytes_a_colocar += st.st_size
+
+    def cerrar(self):
+        if not self.archivo.closed:
+            self.archivo.close()
+            os.replace(self.temporal, self.ruta)
+
+    def resumen(self):
+        return {'acciones': dict(self.acciones), 'bytes_a_colocar': self.bytes_a_colocar}
+
+
+def leer_plan(ruta):
+    """
+    Devuelve (cabecera, generador de (posición, operación)) de un plan
+    guardado; la posición (en bytes) sirve para volver a leer la operación
+    con LectorPlan.
+    """
+    f = open(ruta, 'rb')
+    cabecera = json.loads(f.readline())
+    if cabecera.get('formato') != FORMATO_PLAN or cabecera.get('version') != VERSION_PLAN:
+        f.close()
+        raise ValueError(f"{ruta} no es un plan de organización compatible")
+
+    def operaciones():
+        with f:
+            while True:
+                posicion = f.tell()
+                linea = f.readline()
+                if not linea:
+                    break
+                if linea.strip():
+                    yield posicion, json.loads(linea)
+    return cabecera, operaciones()
+
+
+class LectorPlan:
+    """Vuelve a leer del plan, por su posición, la operación que se va a ejecutar"""
+
+    def __init__(self, ruta):
+        self.archivo = open(ruta, 'rb')
+
+    def leer(self, posicion):
+        self.archivo.seek(posicion)
+        return json.loads(self.archivo.readline())
+
+    def cerrar(self):
+        self.archivo.close()
+
+
+class PendientesPlan:
+    """
+    Operaciones pendientes de un plan, ya ordenadas para el ejecutor, sin
+    tenerlas en memoria: de cada una queda su posición en el archivo del
+    plan (8 bytes) y su sitio en la cola de su par de dispositivos (4). Se
+    vuelven a leer del plan al repartirlas.
+
+    colas:      par de dispositivos -> array('I') con la primera operación
+                de cada tarea, de modo que pop() da la de menor inodo
+    siguientes: primera operación de una tarea -> las demás con el mismo
+                destino, en el orden del plan (solo existe si se repite)
+    carpetas:   carpetas destino, para crearlas todas antes de empezar
+    """
+
+    def __init__(self):
+        self.posiciones = array('Q')
+        self.colas = OrderedDict()
+        self.siguientes = {}
+        self.carpetas = set()
+
+    def __len__(self):
+        return len(self.posiciones)
+
+
+class LimitadorCaudal:
+    """
+    Límite de bytes por segundo compartido por todos los hilos: cada
+    operación se apunta lo que escribió y, si el total va por delante del
+    ritmo permitido, el hilo espera lo que sobra.
+    """
+
+    def __init__(self, bytes_por_segundo):
+        self.bytes_por_segundo = bytes_por_segundo
+        self.siguiente = time.monotonic()
+        self._cerrojo = threading.Lock()
+
+    def consumir(self, cantidad):
+        if not cantidad:
+            return
+        with self._cerrojo:
+            ahora = time.monotonic()
+            self.siguiente = max(self.siguiente, ahora) + cantidad / self.bytes_por_segundo
+            espera = self.siguiente - ahora
+        if espera > 0:
+            time.sleep(espera)
+
+
+class EjecutorPlan:
+    """
+    Ejecuta las operaciones de colocación de un plan en un pool acotado de
+    hilos. Las operaciones se agrupan por par de dispositivos (st_dev del
+    origen y del destino) y dentro de cada grupo se ordenan por inodo del
+    origen, que en discos mecánicos se parece al orden físico. Los grupos se
+    reparten por turnos, con como mucho `hilos_por_dispositivo` operaciones
+    a la vez sobre el mismo par. Las operaciones con el mismo destino se
+    ejecutan una tras otra en el orden del plan, como en una ejecución
+    secuencial. Cada operación lleva 'origen' y 'destino' (rutas completas),
+    y 'bytes', 'mtime_ns', 'dispositivo' e 'inodo' del origen si se conocen.
+    """
+
+    def __init__(self, colocador, hilos=4, hilos_por_dispositivo=None, limite_bytes_s=None,
+                 reintentos=3, espera_reintento=0.5):
+        self.colocador = colocador
+        self.hilos = max(1, hilos)
+        self.hilos_por_dispositivo = max(1, hilos_por_dispositivo or self.hilos)
+        self.limitador = LimitadorCaudal(limite_bytes_s) if limite_bytes_s else None
+        self.reintentos = reintentos
+        self.espera_reintento = espera_reintento
+        self.reintentados = 0
+        self._dispositivos = {}
+        self._cerrojo = threading.Lock()
+
+    def _dispositivo(self, carpeta):
+        """st_dev de la carpeta o, si aún no existe, del primer antecesor que exista"""
+        carpeta = Path(carpeta)
+        if carpeta not in self._dispositivos:
+            try:
+                self._dispositivos[carpeta] = os.stat(carpeta).st_dev
+            except OSError:
+                padre = carpeta.parent
+                self._dispositivos[carpeta] = self._dispositivo(padre) if padre != carpeta else None
+        return self._dispositivos[carpeta]
+
+    def ordenar(self, operaciones):
+        """
+        Recorre una vez las operaciones, (posición en el plan, operación),
+        y devuelve sus PendientesPlan. Las operaciones con el mismo destino
+        (misma huella de la ruta) forman una sola tarea. El dispositivo y
+        el inodo del origen vienen en el plan; solo los planes sin ellos
+        necesitan un stat por operación.
+        """
+        pendientes = PendientesPlan()
+        por_destino = MapaEnteros()
+        grupos = defaultdict(lambda: (array('I'), array('Q')))
+        for posicion, operacion in operaciones:
+            i = len(pendientes.posiciones)
+            pendientes.posiciones.append(posicion)
+            destino = Path(operacion['destino'])
+            huella = huella_ruta(destino)
+            primera = por_destino.get(huella)
+            if primera is not None:
+                pendientes.siguientes.setdefault(primera, []).append(i)
+                continue
+            por_destino[huella] = i
+            pendientes.carpetas.add(destino.parent)
+            dispositivo, inodo = operacion.get('dispositivo'), operacion.get('inodo')
+            if inodo is None:
+                try:
+                    st = os.stat(operacion['origen'])
+                    dispositivo, inodo = st.st_dev, st.st_ino
+                except OSError:
+                    dispositivo, inodo = None, 0  # fallará al ejecutarla y quedará anotado
+            clave = (dispositivo, self._dispositivo(destino.parent)) if dispositivo is not None else (None, None)
+            tareas, inodos = grupos[clave]
+            tareas.append(i)
+            inodos.append(inodo)
+        for clave in sorted(grupos, key=lambda c: (c[0] is None, c[0] or 0, c[1] or 0)):
+            tareas, inodos = grupos.pop(clave)
+            orden = sorted(range(len(tareas)), key=inodos.__getitem__)
+            orden.reverse()  # se sacan del final
+            pendientes.colas[clave] = array('I', (tareas[j] for j in orden))
+        return pendientes
+
+    def _colocar(self, origen, destino):
+        """colocar() con reintentos y espera creciente ante errores transitorios; (destino final, bytes)"""
+        for intento in range(self.reintentos + 1):
+            try:
+                return self.colocador.colocar(origen, destino)
+            except OSError as e:
+                if e.errno not in ERRORES_TRANSITORIOS or intento == self.reintentos:
+                    raise
+                with self._cerrojo:
+                    self.reintentados += 1
+                time.sleep(self.espera_reintento * 2 ** intento)
+
+    def _ejecutar_tarea(self, tarea):
+        """En un hilo del pool: ejecuta en orden las operaciones de un mismo destino"""
+        resultados = []
+        for operacion in tarea:
+            origen, destino = operacion['origen'], Path(operacion['destino'])
+            inicio = time.perf_counter()
+            error = None
+            escritos = 0
+            try:
+                st = os.stat(origen)
+                if operacion['bytes'] is not None and (st.st_size, st.st_mtime_ns) != (
+                        operacion['bytes'], operacion['mtime_ns']):
+                    raise RuntimeError("el origen ha cambiado desde que se hizo el plan")
+                final, escritos = self._colocar(origen, destino)
+                operacion['destino'] = str(final)  # otro nombre si el original ya estaba ocupado
+                if self.limitador is not None:
+                    self.limitador.consumir(escritos)
+            except Exception as e:
+                error = e
+            resultados.append((operacion, error, time.perf_counter() - inicio, escritos))
+        return resultados
+
+    def ejecutar(self, pendientes, leer):
+        """
+        Ejecuta unos PendientesPlan; `leer(posición)` devuelve la operación
+        completa, que solo se lee al repartir su tarea. Genera (operación,
+        error, segundos, bytes escritos) a medida que terminan, en el hilo
+        que llama: lo que no es seguro entre hilos (diario, manifiesto,
+        índices) se actualiza ahí.
+        """
+        colas = pendientes.colas
+        en_curso = {}
+        activos = defaultdict(int)
+        with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+            while colas or en_curso:
+                enviada = True
+                while enviada and len(en_curso) < self.hilos:
+                    enviada = False
+                    for clave in colas:
+                        if activos[clave] < self.hilos_por_dispositivo:
+                            cola = colas.pop(clave)
+                            primera = cola.pop()
+                            tarea = [leer(pendientes.posiciones[i])
+                                     for i in [primera] + pendientes.siguientes.pop(primera, [])]
+                            en_curso[pool.submit(self._ejecutar_tarea, tarea)] = clave
+                            activos[clave] += 1
+                            if cola:
+                                colas[clave] = cola  # al final: turno para el siguiente dispositivo
+                            enviada = True
+                            break
+                hechos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    activos[en_curso.pop(futuro)] -= 1
+                    yield from futuro.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ejecutar (o volver a ejecutar) un plan de organización")
+    parser.add_argument('plan', help=f"plan guardado ({NOMBRE_PLAN})")
+    parser.add_argument('--hilos', type=int, default=4)
+    parser.add_argument('--hilos-por-dispositivo', type=int)
+    parser.add_argument('--limite-mb', type=float, help="MB/s máximos escritos")
+    parser.add_argument('--reintentos', type=int, default=3)
+    parser.add_argument('--silencioso', action='store_true')
+    args = parser.parse_args()
+
+    from organizador_fotos import OrganizadorFotos
+
+    cabecera, _ = leer_plan(args.plan)
+    organizador = OrganizadorFotos(cabecera['origen'], cabecera['destino'],
+                                   algoritmo_hash=cabecera['algoritmo'], modo_colocacion=cabecera['modo'],
+                                   reanudar=True, silencioso=args.silencioso, hilos=args.hilos,
+                                   hilos_por_dispositivo=args.hilos_por_dispositivo,
+                                   limite_mb_s=args.limite_mb, reintentos=args.reintentos)
+    try:
+        organizador.ejecutar_plan(args.plan, contar=True)
+        organizador.generar_reporte()
+    finally:
+        organizador.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+ESCÁNER DE CARPETAS - Un único recorrido con os.scandir
+Devuelve las imágenes a medida que las encuentra, junto con su stat
+"""
+
+import os
+from pathlib import Path
+
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.raw', '.heic')
+
+
+def es_imagen(nombre, extensiones=EXTENSIONES_IMAGEN):
+    """True si el nombre termina en una de las extensiones (sin distinguir mayúsculas)"""
+    return os.path.splitext(nombre)[1].lower() in extensiones
+
+
+def identificar_carpetas(carpetas):
+    """
+    (st_dev, st_ino) de las carpetas que existen: así se reconocen durante
+    un recorrido con el stat de cada subcarpeta, sin resolver su ruta
+    """
+    identidades = set()
+    for carpeta in carpetas:
+        try:
+            st = os.stat(carpeta)
+        except OSError:
+            continue
+        identidades.add((st.st_dev, st.st_ino))
+    return identidades
+
+
+def recorrer_imagenes(carpeta, extensiones=EXTENSIONES_IMAGEN, recursivo=True, excluir=()):
+    """
+    Genera (ruta, stat) de cada imagen bajo `carpeta` en un solo recorrido.
+
+    El orden es determinista: dentro de cada carpeta primero los archivos y
+    luego las subcarpetas, ambos por nombre. No sigue enlaces simbólicos a
+    carpetas. Las carpetas de `excluir` (p. ej. el destino, si está dentro
+    del origen) no se recorren.
+    """
+    extensiones = tuple(ext.lower() for ext in extensiones)
+    excluidas = identificar_carpetas(excluir)
+    pendientes = [os.fspath(carpeta)]
+
+    while pendientes:
+        actual = pendientes.pop()
+        try:
+            with os.scandir(actual) as entradas:
+                entradas = sorted(entradas, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        subcarpetas = []
+        for entrada in entradas:
+            try:
+                if entrada.is_dir(follow_symlinks=False):
+                    if not recursivo:
+                        continue
+                    if excluidas:
+                        st = entrada.stat(follow_symlinks=False)
+                        if (st.st_dev, st.st_ino) in excluidas:
+                            continue
+                    subcarpetas.append(entrada.path)
+                elif es_imagen(entrada.name, extensiones) and entrada.is_file():
+                    yield Path(entrada.path), entrada.stat()
+            except OSError:
+                continue
+
+        # La pila saca el último primero: invertir para mantener el orden por nombre
+        pendientes.extend(reversed(subcarpetas))
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+FRAGMENTOS - Huellas repartidas entre varias máquinas y fusión posterior
+Cada trabajador calcula las huellas de un subconjunto fijo del origen y las
+escribe en un índice portable; la fusión las combina y decide como una
+ejecución en una sola máquina
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+
+from escaner import recorrer_imagenes
+from metadatos_imagen import VERSION_FECHA
+from organizador_fotos import OrganizadorFotos, calcular_huella, CAMPOS_HUELLA
+from sonda_imagen import CAMPOS_HASH, CAMPOS_CALIDAD, VERSION_HASH_PERCEPTUAL
+
+FORMATO_INDICE = 'indice_fragmento'
+VERSION_INDICE = 1
+CRITERIOS = ('ruta', 'subarbol')
+# El digest sí va en el índice: la fusión no tiene que volver a leer los archivos
+CAMPOS_INDICE = (('digest',) + CAMPOS_HUELLA
+                 + tuple(campo for campo in CAMPOS_HASH.values() if campo not in CAMPOS_HUELLA) + CAMPOS_CALIDAD)
+
+
+def fragmento_de(ruta_relativa, total, criterio='ruta'):
+    """
+    Fragmento (0..total-1) al que pertenece una ruta relativa al origen.
+    Con 'ruta' se reparte archivo por archivo; con 'subarbol' todo lo que
+    cuelga de la misma carpeta de primer nivel va al mismo fragmento.
+    Es determinista: no depende de la máquina ni de PYTHONHASHSEED.
+    """
+    if criterio not in CRITERIOS:
+        raise ValueError(f"Criterio de reparto no soportado: {criterio}")
+    clave = ruta_relativa
+    if criterio == 'subarbol':
+        partes = PurePosixPath(ruta_relativa).parts
+        clave = partes[0] if len(partes) > 1 else ''
+    resumen = hashlib.blake2b(clave.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(resumen, 'big') % total
+
+
+def _relativa(archivo, carpeta):
+    return PurePosixPath(Path(archivo).relative_to(carpeta)).as_posix()
+
+
+def huellar_fragmento(carpeta_origen, ruta_indice, fragmento, total, criterio='ruta',
+                      algoritmo_hash='md5', procesos=1):
+    """
+    Calcula las huellas completas (digest, hashes perceptuales, fecha y
+    dimensiones) de los archivos del fragmento y las escribe en
+    `ruta_indice`: JSON Lines comprimido con gzip, una cabecera y una línea
+    por archivo con su ruta relativa al origen. Se escribe en un temporal y
+    se renombra al terminar, así la fusión nunca ve un índice a medias.
+    """
+    carpeta_origen = Path(carpeta_origen)
+    ruta_indice = Path(ruta_indice)
+    inicio = time.perf_counter()
+    archivos = [(archivo, st) for archivo, st in recorrer_imagenes(carpeta_origen)
+                if fragmento_de(_relativa(archivo, carpeta_origen), total, criterio) == fragmento]
+
+    cabecera = {
+        'formato': FORMATO_INDICE,
+        'version': VERSION_INDICE,
+        'fragmento': fragmento,
+        'total': total,
+        'criterio': criterio,
+        'algoritmo': algoritmo_hash,
+        'version_phash': VERSION_HASH_PERCEPTUAL,
+        'version_fecha': VERSION_FECHA,
+        'archivos': len(archivos)
+    }
+
+    rutas = [str(archivo) for archivo, _ in archivos]
+    argumentos = ([algoritmo_hash] * len(rutas), [CAMPOS_INDICE] * len(rutas))
+    temporal = ruta_indice.with_name(ruta_indice.name + '.tmp')
+    bytes_totales = 0
+    with gzip.open(temporal, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(cabecera) + '\n')
+        if procesos > 1:
+            pool = ProcessPoolExecutor(max_workers=procesos)
+            huellas = pool.map(calcular_huella, rutas, *argumentos, chunksize=16)
+        else:
+            pool = None
+            huellas = map(calcular_huella, rutas, *argumentos)
+        try:
+            for (archivo, st), huella in zip(archivos, huellas):
+                huella.pop('tiempos', None)
+                huella.pop('bytes_leidos', None)
+                huella.pop('bytes_hash', None)
+                fecha = huella.get('fecha')
+                f.write(json.dumps({
+                    'ruta': _relativa(archivo, carpeta_origen),
+                    'bytes': st.st_size,
+                    'mtime_ns': st.st_mtime_ns,
+                    **{campo: huella.get(campo) for campo in CAMPOS_INDICE if campo != 'fecha'},
+                    'algoritmo': huella.get('algoritmo'),
+                    'fecha': fecha.isoformat() if fecha else None
+                }, ensure_ascii=False) + '\n')
+                bytes_totales += st.st_size
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    os.replace(temporal, ruta_indice)
+
+    duracion = time.perf_counter() - inicio
+    print(f"🧩 Fragmento {fragmento + 1}/{total}: {len(archivos):,} archivos, "
+          f"{bytes_totales / 1e6:,.1f} MB en {duracion:.1f} s → {ruta_indice}")
+    return cabecera
+
+
+def leer_indice(ruta_indice):
+    """Devuelve (cabecera, generador de entradas) de un índice de fragmento"""
+    f = gzip.open(ruta_indice, 'rt', encoding='utf-8')
+    cabecera = json.loads(f.readline())
+    if cabecera.get('formato') != FORMATO_INDICE or cabecera.get('version') != VERSION_INDICE:
+        f.close()
+        raise ValueError(f"{ruta_indice} no es un índice de fragmento compatible")
+
+    def entradas():
+        with f:
+            for linea in f:
+                if linea.strip():
+                    yield json.loads(linea)
+    return cabecera, entradas()
+
+
+def importar_indices(organizador, rutas_indices):
+    """
+    Vuelca los índices de los fragmentos en la caché de huellas del
+    organizador. Cada entrada se valida con el tamaño y el mtime del
+    archivo en esta máquina; las que no coinciden (o faltan) se
+    recalcularán durante el proceso normal. Después basta con
+    procesar_carpeta(): todas las decisiones globales (duplicados exactos,
+    cuasi-duplicados, grupos) se toman aquí, en el orden de siempre.
+    """
+    if organizador.cache is None:
+        raise ValueError("La fusión de fragmentos necesita la caché de huellas (usar_cache=True)")
+
+    cache = organizador.cache
+    origen = organizador.carpeta_origen
+    vistos = set()
+    importadas = cambiadas = desaparecidas = 0
+    cabecera_comun = None
+
+    for ruta_indice in rutas_indices:
+        cabecera, entradas = leer_indice(ruta_indice)
+        comun = (cabecera['total'], cabecera['criterio'])
+        if cabecera_comun is None:
+            cabecera_comun = comun
+        elif comun != cabecera_comun:
+            raise ValueError(f"{ruta_indice} pertenece a otro reparto: {comun} en lugar de {cabecera_comun}")
+        if cabecera['fragmento'] in vistos:
+            raise ValueError(f"Fragmento {cabecera['fragmento']} repetido en {ruta_indice}")
+        vistos.add(cabecera['fragmento'])
+        phash_valido = cabecera['version_phash'] == cache.version_phash
+        fecha_valida = cabecera.get('version_fecha') == cache.version_fecha
+
+        for entrada in entradas:
+            archivo = origen / entrada['ruta']
+            try:
+                st = os.stat(archivo)
+            except OSError:
+                desaparecidas += 1
+                continue
+            if (st.st_size, st.st_mtime_ns) != (entrada['bytes'], entrada['mtime_ns']):
+                cambiadas += 1
+                continue
+            huella = {
+                'digest': entrada['digest'],
+                'algoritmo': entrada['algoritmo'],
+                'fecha': datetime.fromisoformat(entrada['fecha']) if entrada['fecha'] and fecha_valida else None,
+                'dimensiones': tuple(entrada['dimensiones']) if entrada['dimensiones'] else None
+            }
+            if phash_valido:
+                for campo in tuple(CAMPOS_HASH.values()) + CAMPOS_CALIDAD:
+                    huella[campo] = entrada.get(campo)
+            cache.guardar(archivo, st, huella)
+            importadas += 1
+    cache.confirmar()
+
+    if cabecera_comun is not None:
+        faltan = sorted(set(range(cabecera_comun[0])) - vistos)
+        if faltan:
+            print(f"⚠️  Faltan los fragmentos {faltan}: sus archivos se calcularán ahora")
+    print(f"🧩 Importadas {importadas:,} huellas de {len(vistos)} fragmentos "
+          f"({cambiadas:,} archivos cambiados, {desaparecidas:,} desaparecidos)")
+    return importadas
+
+
+def fusionar(carpeta_origen, carpeta_destino, rutas_indices, **opciones):
+    """Importa los índices y organiza: el resultado es el de una sola máquina"""
+    organizador = OrganizadorFotos(carpeta_origen, carpeta_destino, **opciones)
+    try:
+        importar_indices(organizador, rutas_indices)
+        organizador.crear_estructura_carpetas()
+        organizador.procesar_carpeta()
+        organizador.generar_reporte()
+    finally:
+        organizador.cerrar()
+    return organizador
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Huellas por fragmentos y fusión")
+    ordenes = parser.add_subparsers(dest='orden', required=True)
+
+    huellar = ordenes.add_parser('huellar', help="calcular las huellas de un fragmento")
+    huellar.add_argument('origen')
+    huellar.add_argument('indice', help="archivo de índice a escribir (.jsonl.gz)")
+    huellar.add_argument('--fragmento', type=int, required=True, help="número de fragmento, desde 0")
+    huellar.add_argument('--total', type=int, required=True)
+
+    fusion = ordenes.add_parser('fusionar', help="combinar los índices y organizar")
+    fusion.add_argument('origen')
+    fusion.add_argument('destino')
+    fusion.add_argument('indices', nargs='+')
+
+    local = ordenes.add_parser('local', help="varios trabajadores en esta máquina y fusión")
+    local.add_argument('origen')
+    local.add_argument('destino')
+    local.add_argument('--total', type=int, default=os.cpu_count() or 1)
+
+    for orden in (huellar, local):
+        orden.add_argument('--criterio', choices=CRITERIOS, default='ruta')
+    for orden in (huellar, fusion, local):
+        orden.add_argument('--algoritmo', default='md5')
+        orden.add_argument('--procesos', type=int, default=1)
+    for orden in (fusion, local):
+        orden.add_argument('--modo', default='copiar', help="modo de colocación")
+        orden.add_argument('--agrupar', action='store_true', help="agrupar cuasi-duplicados en lote")
+        orden.add_argument('--silencioso', action='store_true')
+    args = parser.parse_args()
+
+    if args.orden == 'huellar':
+        huellar_fragmento(args.origen, args.indice, args.fragmento, args.total, args.criterio,
+                          args.algoritmo, args.procesos)
+        return
+
+    opciones = dict(algoritmo_hash=args.algoritmo, procesos=args.procesos, modo_colocacion=args.modo,
+                    agrupar_cuasi=args.agrupar, silencioso=args.silencioso)
+    if args.orden == 'fusionar':
+        fusionar(args.origen, args.destino, args.indices, **opciones)
+        return
+
+    # local: un proceso trabajador por fragmento, como si fueran máquinas distintas
+    with tempfile.TemporaryDirectory() as carpeta_indices:
+        indices = [str(Path(carpeta_indices) / f"fragmento_{i:03d}.jsonl.gz") for i in range(args.total)]
+        trabajadores = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), 'huellar', args.origen, indice,
+                              '--fragmento', str(i), '--total', str(args.total),
+                              '--criterio', args.criterio, '--algoritmo', args.algoritmo])
+            for i, indice in enumerate(indices)
+        ]
+        fallidos = [i for i, trabajador in enumerate(trabajadores) if trabajador.wait() != 0]
+        if fallidos:
+            print(f"❌ Fallaron los fragmentos {fallidos}")
+            return
+        fusionar(args.origen, args.destino, indices, **opciones)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+ÍNDICE DE SIMILITUD - Búsqueda rápida de fotos parecidas
+Multi-index hashing sobre hashes perceptuales de 64 bits
+"""
+
+from array import array
+
+from almacen_compacto import TablaCadenas
+
+
+def hash_a_entero(hash_hex):
+    """Convierte un hash perceptual en hexadecimal a entero"""
+    return int(str(hash_hex), 16)
+
+
+def distancia_hamming(hash_a, hash_b):
+    """Cuenta los bits distintos entre dos hashes enteros"""
+    return (hash_a ^ hash_b).bit_count()
+
+
+def segmentos_hamming(umbral, bits=64):
+    """
+    Divide `bits` en umbral + 1 segmentos lo más parejos posible.
+    Devuelve [(desplazamiento, mascara)] para extraer cada segmento.
+    """
+    num_segmentos = umbral + 1
+    base, resto = divmod(bits, num_segmentos)
+    segmentos = []
+    desplazamiento = 0
+    for i in range(num_segmentos):
+        ancho = base + (1 if i < resto else 0)
+        segmentos.append((desplazamiento, (1 << ancho) - 1))
+        desplazamiento += ancho
+    return segmentos
+
+
+class IndiceHamming:
+    """
+    Índice de hashes por distancia de Hamming.
+
+    Divide cada hash en umbral + 1 segmentos: si dos hashes difieren en
+    como mucho `umbral` bits, al menos un segmento coincide exactamente
+    (principio del palomar). Solo se comparan los hashes que comparten
+    algún segmento, en lugar de recorrer todo el índice.
+
+    Las claves se guardan como texto (p. ej. la ruta) en una TablaCadenas,
+    los hashes en un array de uint64 y las posiciones de cada segmento en
+    arrays de uint32: 8 + 4 * (umbral + 1) bytes por hash más la clave.
+    """
+
+    def __init__(self, umbral=5, bits=64):
+        self.umbral = umbral
+        self.bits = bits
+        self.segmentos = segmentos_hamming(umbral, bits)
+        self.tablas = [{} for _ in self.segmentos]
+        self.hashes = array('Q')
+        self.claves = TablaCadenas()
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def bytes_usados(self):
+        """Memoria ocupada por hashes, claves y listas de posiciones"""
+        return (len(self.hashes) * self.hashes.itemsize + self.claves.bytes_usados()
+                + sum(len(posiciones) * posiciones.itemsize
+                      for tabla in self.tablas for posiciones in tabla.values()))
+
+    def agregar(self, clave, hash_entero):
+        """Añade un hash al índice y devuelve su posición de inserción"""
+        posicion = len(self.hashes)
+        self.hashes.append(hash_entero)
+        self.claves.agregar(clave)
+        for tabla, (desplazamiento, mascara) in zip(self.tablas, self.segmentos):
+            segmento = (hash_entero >> desplazamiento) & mascara
+            posiciones = tabla.get(segmento)
+            if posiciones is None:
+                posiciones = tabla[segmento] = array('I')
+            posiciones.append(posicion)
+        return posicion
+
+    def _candidatos(self, hash_entero):
+        """Posiciones que comparten al menos un segmento con el hash"""
+        candidatos = set()
+        for tabla, (desplazamiento, mascara) in zip(self.tablas, self.segmentos):
+            posiciones = tabla.get((hash_entero >> desplazamiento) & mascara)
+            if posiciones:
+                candidatos.update(posiciones)
+        return sorted(candidatos)
+
+    def buscar(self, hash_entero, umbral=None):
+        """Devuelve [(clave, distancia)] a distancia <= umbral, en orden de inserción"""
+        if umbral is None:
+            umbral = self.umbral
+
+        if umbral > self.umbral:
+            # El palomar no garantiza nada por encima del umbral del índice
+            posiciones = range(len(self.hashes))
+        else:
+            posiciones = self._candidatos(hash_entero)
+
+        resultados = []
+        for posicion in posiciones:
+            distancia = distancia_hamming(hash_entero, self.hashes[posicion])
+            if distancia <= umbral:
+                resultados.append((self.claves[posicion], distancia))
+        return resultados
+
+    def primero_similar(self, hash_entero, excluir=None):
+        """Primera clave insertada a distancia <= umbral, o None"""
+        excluir = str(excluir) if excluir is not None else None
+        for posicion in self._candidatos(hash_entero):
+            if distancia_hamming(hash_entero, self.hashes[posicion]) <= self.umbral:
+                clave = self.claves[posicion]
+                if clave != excluir:
+                    return clave
+        return None
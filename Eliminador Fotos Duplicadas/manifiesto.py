@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+MANIFIESTO DE LA BIBLIOTECA - Índice de las fotos ya organizadas
+Lo mantiene el organizador y lo consulta el analizador sin recorrer carpetas
+"""
+
+import sqlite3
+from pathlib import Path, PurePosixPath
+
+NOMBRE_MANIFIESTO = ".manifiesto_biblioteca.sqlite"
+CARPETA_REVISION = "00_PENDIENTE_REVISION"
+
+
+class ManifiestoBiblioteca:
+    """
+    Una fila por foto colocada en la biblioteca: ruta relativa a la
+    carpeta destino, carpeta, estado (CONSERVAR / REVISAR), categoría,
+    fecha, tamaño, digest (si se conoce) y ruta de origen.
+    Con en_memoria=True (simulaciones) no se toca el disco, y con
+    solo_lectura=True (el analizador) se consulta sin escribir nada.
+    """
+
+    def __init__(self, carpeta_destino, lote_commit=500, crear=True, en_memoria=False, solo_lectura=False):
+        self.carpeta = Path(carpeta_destino)
+        self.ruta_db = self.carpeta / NOMBRE_MANIFIESTO
+        self.lote_commit = lote_commit
+        self.pendientes = 0
+        if solo_lectura:
+            # immutable: sin bloqueos ni archivos -wal/-shm (mode=ro los crearía en modo WAL)
+            self.conexion = sqlite3.connect(f"{self.ruta_db.resolve().as_uri()}?mode=ro&immutable=1", uri=True)
+            if not self.conexion.execute("PRAGMA table_info(biblioteca)").fetchall():
+                self.conexion.close()
+                raise ValueError(f"{self.ruta_db} no es un manifiesto de biblioteca")
+            return
+        if crear and not en_memoria:
+            self.carpeta.mkdir(parents=True, exist_ok=True)
+        self.conexion = sqlite3.connect(':memory:' if en_memoria else str(self.ruta_db))
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.execute("""
+            CREATE TABLE IF NOT EXISTS biblioteca (
+                ruta TEXT PRIMARY KEY,
+                carpeta TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                categoria TEXT,
+                fecha TEXT,
+                bytes INTEGER,
+                digest TEXT,
+                algoritmo TEXT,
+                origen TEXT
+            )
+        """)
+        self.conexion.execute("CREATE INDEX IF NOT EXISTS biblioteca_carpeta ON biblioteca (carpeta)")
+        self.conexion.commit()
+
+    @classmethod
+    def abrir_existente(cls, carpeta_destino, solo_lectura=True):
+        """
+        Abre el manifiesto de una biblioteca, o devuelve None si no tiene
+        (o no se puede leer). Por defecto en solo lectura; con
+        solo_lectura=False se puede modificar (p. ej. para depurarlo).
+        """
+        if not (Path(carpeta_destino) / NOMBRE_MANIFIESTO).exists():
+            return None
+        try:
+            return cls(carpeta_destino, crear=False, solo_lectura=solo_lectura)
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def _relativa(self, ruta):
+        return PurePosixPath(Path(ruta).relative_to(self.carpeta)).as_posix()
+
+    def registrar(self, destino, entrada, tamaño=None, digest=None, algoritmo=None):
+        """Registra (o actualiza) una foto colocada en `destino`"""
+        relativa = self._relativa(destino)
+        self.conexion.execute(
+            "INSERT OR REPLACE INTO biblioteca "
+            "(ruta, carpeta, estado, categoria, fecha, bytes, digest, algoritmo, origen) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (relativa, str(PurePosixPath(relativa).parent), entrada['accion'],
+             entrada.get('categoria'), entrada.get('fecha'), tamaño, digest,
+             algoritmo if digest else None, entrada.get('origen'))
+        )
+        self.pendientes += 1
+        if self.pendientes >= self.lote_commit:
+            self.conexion.commit()
+            self.pendientes = 0
+
+    def distribucion(self):
+        """{año: {mes: cantidad}} de las fotos conservadas en carpetas año/mes"""
+        distribucion = {}
+        for carpeta, cantidad in self.conexion.execute(
+                "SELECT carpeta, COUNT(*) FROM biblioteca WHERE estado = 'CONSERVAR' GROUP BY carpeta"):
+            partes = carpeta.split('/')
+            if len(partes) == 2 and partes[0].isdigit():
+                distribucion.setdefault(partes[0], {})[partes[1]] = cantidad
+        return distribucion
+
+    def revision(self):
+        """{subcarpeta de 00_PENDIENTE_REVISION: cantidad}"""
+        revision = {}
+        for carpeta, cantidad in self.conexion.execute(
+                "SELECT carpeta, COUNT(*) FROM biblioteca WHERE carpeta LIKE ? GROUP BY carpeta",
+                (CARPETA_REVISION + '/%',)):
+            subcarpeta = carpeta.split('/')[1]
+            revision[subcarpeta] = revision.get(subcarpeta, 0) + cantidad
+        return revision
+
+    def rutas(self):
+        """Conjunto de rutas relativas registradas"""
+        return {fila[0] for fila in self.conexion.execute("SELECT ruta FROM biblioteca")}
+
+    def eliminar(self, rutas):
+        """Quita del manifiesto las rutas indicadas (p. ej. archivos borrados a mano)"""
+        self.conexion.executemany("DELETE FROM biblioteca WHERE ruta = ?", [(r,) for r in rutas])
+        self.conexion.commit()
+
+    def confirmar(self):
+        """Escribe en disco lo pendiente sin esperar a completar el lote"""
+        self.conexion.commit()
+        self.pendientes = 0
+
+    def cerrar(self):
+        self.conexion.commit()
+        self.conexion.close()
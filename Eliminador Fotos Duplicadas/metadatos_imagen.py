@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+METADATOS DE IMAGEN - Fecha EXIF y dimensiones leyendo solo la cabecera
+JPEG, PNG, TIFF y HEIC: se salta de estructura en estructura con seek y
+se leen unos pocos KB, sin decodificar la imagen ni pasar por PIL
+"""
+
+import io
+import struct
+from datetime import datetime
+
+# Versión de la extracción de la fecha. Las fechas guardadas con otra
+# versión se vuelven a leer (v1: solo DateTime del IFD0; v2: DateTimeOriginal
+# del sub-IFD Exif con preferencia)
+VERSION_FECHA = 2
+
+# Etiquetas TIFF/EXIF
+TAG_ANCHO = 0x0100
+TAG_ALTO = 0x0101
+TAG_FECHA = 0x0132                # DateTime (IFD0): última modificación
+TAG_EXIF_IFD = 0x8769             # puntero al sub-IFD Exif
+TAG_FECHA_ORIGINAL = 0x9003       # DateTimeOriginal (sub-IFD Exif): momento de la captura
+TAG_FECHA_DIGITALIZADA = 0x9004   # DateTimeDigitized (sub-IFD Exif)
+# Orden de preferencia: la captura antes que la última edición
+TAGS_FECHA = (TAG_FECHA_ORIGINAL, TAG_FECHA_DIGITALIZADA, TAG_FECHA)
+
+# Marcadores SOF de JPEG: 0xC0-0xCF salvo DHT (C4), JPG (C8) y DAC (CC)
+MARCADORES_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+FIRMA_PNG = b'\x89PNG\r\n\x1a\n'
+# Tamaño en bytes de cada tipo de dato TIFF (BYTE, ASCII, SHORT, LONG, RATIONAL...)
+TAMAÑO_TIPO_TIFF = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8}
+
+# Límites de cordura para no recorrer archivos corruptos sin fin
+MAXIMO_ENTRADAS_IFD = 1000
+MAXIMO_SEGMENTOS = 256
+MAXIMO_CAJA_META = 4 * 1024 * 1024
+
+
+class CabeceraInvalida(ValueError):
+    """La cabecera no tiene la estructura esperada para su formato"""
+
+
+class _Lector:
+    """Lecturas por posición sobre un archivo abierto, contando los bytes leídos"""
+
+    def __init__(self, f):
+        self.f = f
+        self.leidos = 0
+
+    def leer(self, posicion, cantidad):
+        self.f.seek(posicion)
+        datos = self.f.read(cantidad)
+        self.leidos += len(datos)
+        if len(datos) < cantidad:
+            raise CabeceraInvalida("Archivo truncado")
+        return datos
+
+
+def convertir_fecha_exif(valor):
+    """'AAAA:MM:DD HH:MM:SS' (con o sin NUL final) a datetime, o None"""
+    if isinstance(valor, bytes):
+        valor = valor.decode('ascii', 'replace')
+    try:
+        return datetime.strptime(valor.strip('\x00 ')[:19], '%Y:%m:%d %H:%M:%S')
+    except (ValueError, TypeError):
+        return None
+
+
+def _leer_ifd(lector, base, orden, desplazamiento, tags):
+    """
+    Lee las entradas `tags` de un IFD. Devuelve ({tag: valor}, siguiente IFD).
+    Los valores son enteros (SHORT/LONG) o bytes (ASCII).
+    """
+    cantidad, = struct.unpack(orden + 'H', lector.leer(base + desplazamiento, 2))
+    if cantidad > MAXIMO_ENTRADAS_IFD:
+        raise CabeceraInvalida("IFD con demasiadas entradas")
+    bloque = lector.leer(base + desplazamiento + 2, 12 * cantidad + 4)
+    valores = {}
+    for i in range(cantidad):
+        tag, tipo, numero = struct.unpack_from(orden + 'HHI', bloque, 12 * i)
+        if tag not in tags:
+            continue
+        tamaño = TAMAÑO_TIPO_TIFF.get(tipo, 1) * numero
+        crudo = bloque[12 * i + 8:12 * i + 12]
+        if tamaño > 4:
+            crudo = lector.leer(base + struct.unpack(orden + 'I', crudo)[0], min(tamaño, 256))
+        if tipo == 3:
+            valores[tag] = struct.unpack_from(orden + 'H', crudo)[0]
+        elif tipo == 4:
+            valores[tag] = struct.unpack_from(orden + 'I', crudo)[0]
+        elif tipo == 2:
+            valores[tag] = crudo[:numero]
+    siguiente, = struct.unpack_from(orden + 'I', bloque, 12 * cantidad)
+    return valores, siguiente
+
+
+def _leer_tiff(lector, base):
+    """
+    Estructura TIFF que empieza en `base` (un .tiff o el bloque EXIF de un
+    JPEG, PNG o HEIC). Devuelve (fecha, dimensiones del IFD0).
+    """
+    cabecera = lector.leer(base, 8)
+    if cabecera[:2] == b'II':
+        orden = '<'
+    elif cabecera[:2] == b'MM':
+        orden = '>'
+    else:
+        raise CabeceraInvalida("Orden de bytes TIFF desconocido")
+    marca, desplazamiento = struct.unpack(orden + 'HI', cabecera[2:])
+    if marca != 42:
+        raise CabeceraInvalida("No es TIFF clásico")
+
+    ifd0, _ = _leer_ifd(lector, base, orden, desplazamiento,
+                        {TAG_ANCHO, TAG_ALTO, TAG_FECHA, TAG_EXIF_IFD})
+    fechas = dict(ifd0)
+    if TAG_EXIF_IFD in ifd0:
+        exif, _ = _leer_ifd(lector, base, orden, ifd0[TAG_EXIF_IFD],
+                            {TAG_FECHA_ORIGINAL, TAG_FECHA_DIGITALIZADA})
+        fechas.update(exif)
+
+    fecha = None
+    for tag in TAGS_FECHA:
+        if tag in fechas:
+            fecha = convertir_fecha_exif(fechas[tag])
+            if fecha is not None:
+                break
+    dimensiones = None
+    if TAG_ANCHO in ifd0 and TAG_ALTO in ifd0:
+        dimensiones = (ifd0[TAG_ANCHO], ifd0[TAG_ALTO])
+    return fecha, dimensiones
+
+
+def _leer_jpeg(lector):
+    """Recorre los segmentos hasta el SOF: APP1 'Exif' para la fecha, SOF para el tamaño"""
+    fecha = dimensiones = None
+    posicion = 2
+    for _ in range(MAXIMO_SEGMENTOS):
+        relleno, marcador, largo = struct.unpack('>BBH', lector.leer(posicion, 4))
+        if relleno != 0xFF:
+            raise CabeceraInvalida("Marcador JPEG esperado")
+        if marcador == 0xFF:
+            posicion += 1  # byte de relleno entre segmentos
+            continue
+        if marcador == 0xE1 and largo >= 14 and fecha is None:
+            if lector.leer(posicion + 4, 6) == b'Exif\x00\x00':
+                fecha, _ = _leer_tiff(lector, posicion + 10)
+        elif marcador in MARCADORES_SOF:
+            alto, ancho = struct.unpack('>HH', lector.leer(posicion + 5, 4))
+            dimensiones = (ancho, alto)
+            break  # el EXIF siempre va antes del SOF
+        elif marcador == 0xDA:
+            break  # empiezan los datos de la imagen
+        posicion += 2 + largo
+    if dimensiones is None:
+        raise CabeceraInvalida("JPEG sin SOF")
+    return fecha, dimensiones
+
+
+def _leer_png(lector):
+    """IHDR para el tamaño y, si lo hay, el fragmento eXIf (siempre antes de IDAT)"""
+    largo, tipo = struct.unpack('>I4s', lector.leer(8, 8))
+    if tipo != b'IHDR':
+        raise CabeceraInvalida("PNG sin IHDR")
+    dimensiones = struct.unpack('>II', lector.leer(16, 8))
+    fecha = None
+    posicion = 8 + 12 + largo
+    for _ in range(MAXIMO_SEGMENTOS):
+        try:
+            largo, tipo = struct.unpack('>I4s', lector.leer(posicion, 8))
+        except CabeceraInvalida:
+            break
+        if tipo in (b'IDAT', b'IEND'):
+            break
+        if tipo == b'eXIf':
+            fecha, _ = _leer_tiff(lector, posicion + 8)
+            break
+        posicion += 12 + largo
+    return fecha, dimensiones
+
+
+def _cajas(datos, inicio=0, fin=None):
+    """Genera (tipo, inicio del contenido, fin) de las cajas ISO BMFF de un bloque"""
+    fin = len(datos) if fin is None else fin
+    posicion = inicio
+    while posicion + 8 <= fin:
+        tamaño, tipo = struct.unpack_from('>I4s', datos, posicion)
+        cabecera = 8
+        if tamaño == 1:
+            tamaño, = struct.unpack_from('>Q', datos, posicion + 8)
+            cabecera = 16
+        elif tamaño == 0:
+            tamaño = fin - posicion
+        if tamaño < cabecera:
+            raise CabeceraInvalida("Caja ISO BMFF inválida")
+        yield tipo, posicion + cabecera, min(posicion + tamaño, fin)
+        posicion += tamaño
+
+
+def _entero(datos, posicion, bytes_):
+    """Entero big-endian de `bytes_` bytes; 0 bytes es un campo ausente (iloc)"""
+    if bytes_ == 0:
+        return 0, posicion
+    return int.from_bytes(datos[posicion:posicion + bytes_], 'big'), posicion + bytes_
+
+
+def _leer_heic(lector):
+    """
+    HEIC/HEIF (ISO BMFF): dentro de 'meta', 'pitm' da el elemento
+    principal, 'iinf' el elemento 'Exif', 'iloc' dónde está en el archivo
+    y 'iprp' la propiedad 'ispe' (ancho y alto) del principal.
+    """
+    # Cajas de primer nivel, leyendo solo sus cabeceras
+    posicion = 0
+    meta = None
+    for _ in range(MAXIMO_SEGMENTOS):
+        try:
+            tamaño, tipo = struct.unpack('>I4s', lector.leer(posicion, 8))
+        except CabeceraInvalida:
+            break
+        cabecera = 8
+        if tamaño == 1:
+            tamaño, = struct.unpack('>Q', lector.leer(posicion + 8, 8))
+            cabecera = 16
+        if tipo == b'meta':
+            if tamaño > MAXIMO_CAJA_META:
+                raise CabeceraInvalida("Caja meta demasiado grande")
+            meta = lector.leer(posicion + cabecera, tamaño - cabecera)
+            break
+        if tamaño < cabecera:
+            break
+        posicion += tamaño
+    if meta is None:
+        raise CabeceraInvalida("HEIF sin caja meta")
+
+    principal = None
+    tipos = {}
+    ubicaciones = {}
+    propiedades = []
+    asociaciones = {}
+    for tipo, inicio, fin in _cajas(meta, 4):  # meta es FullBox: 4 bytes de versión y flags
+        version = meta[inicio]
+        if tipo == b'pitm':
+            principal = struct.unpack_from('>H' if version == 0 else '>I', meta, inicio + 4)[0]
+        elif tipo == b'iinf':
+            primera = inicio + (6 if version == 0 else 8)
+            for tipo_entrada, inicio_entrada, _ in _cajas(meta, primera, fin):
+                version_entrada = meta[inicio_entrada]
+                if tipo_entrada != b'infe' or version_entrada < 2:
+                    continue
+                if version_entrada == 2:
+                    elemento, = struct.unpack_from('>H', meta, inicio_entrada + 4)
+                    tipos[elemento] = meta[inicio_entrada + 8:inicio_entrada + 12]
+                else:
+                    elemento, = struct.unpack_from('>I', meta, inicio_entrada + 4)
+                    tipos[elemento] = meta[inicio_entrada + 10:inicio_entrada + 14]
+        elif tipo == b'iloc':
+            p = inicio + 4
+            bytes_desplazamiento, bytes_largo = meta[p] >> 4, meta[p] & 0x0F
+            bytes_base, bytes_indice = meta[p + 1] >> 4, (meta[p + 1] & 0x0F if version in (1, 2) else 0)
+            p += 2
+            cantidad, p = _entero(meta, p, 2 if version < 2 else 4)
+            for _ in range(cantidad):
+                elemento, p = _entero(meta, p, 2 if version < 2 else 4)
+                metodo = 0
+                if version in (1, 2):
+                    metodo, p = _entero(meta, p, 2)
+                    metodo &= 0x0F
+                p += 2  # data_reference_index
+                base, p = _entero(meta, p, bytes_base)
+                extensiones, p = _entero(meta, p, 2)
+                trozos = []
+                for _ in range(extensiones):
+                    _, p = _entero(meta, p, bytes_indice)
+                    desplazamiento, p = _entero(meta, p, bytes_desplazamiento)
+                    largo, p = _entero(meta, p, bytes_largo)
+                    trozos.append((base + desplazamiento, largo))
+                if metodo == 0:  # solo datos en el propio archivo
+                    ubicaciones[elemento] = trozos
+        elif tipo == b'iprp':
+            for tipo_hijo, inicio_hijo, fin_hijo in _cajas(meta, inicio, fin):
+                if tipo_hijo == b'ipco':
+                    for tipo_propiedad, inicio_propiedad, _ in _cajas(meta, inicio_hijo, fin_hijo):
+                        if tipo_propiedad == b'ispe':
+                            propiedades.append(struct.unpack_from('>II', meta, inicio_propiedad + 4))
+                        else:
+                            propiedades.append(None)
+                elif tipo_hijo == b'ipma':
+                    version_ipma = meta[inicio_hijo]
+                    indices_largos = meta[inicio_hijo + 3] & 1
+                    p = inicio_hijo + 4
+                    cantidad, p = _entero(meta, p, 4)
+                    for _ in range(cantidad):
+                        elemento, p = _entero(meta, p, 2 if version_ipma < 1 else 4)
+                        numero = meta[p]
+                        p += 1
+                        indices = []
+                        for _ in range(numero):
+                            if indices_largos:
+                                valor, p = _entero(meta, p, 2)
+                                indices.append(valor & 0x7FFF)
+                            else:
+                                indices.append(meta[p] & 0x7F)
+                                p += 1
+                        asociaciones[elemento] = indices
+
+    dimensiones = None
+    for indice in asociaciones.get(principal, ()):
+        if 0 < indice <= len(propiedades) and propiedades[indice - 1] is not None:
+            dimensiones = tuple(propiedades[indice - 1])
+            break
+
+    fecha = None
+    for elemento, tipo in tipos.items():
+        if tipo == b'Exif' and ubicaciones.get(elemento):
+            inicio, _ = ubicaciones[elemento][0]
+            # Los datos Exif empiezan con el desplazamiento hasta la cabecera TIFF
+            salto, = struct.unpack('>I', lector.leer(inicio, 4))
+            fecha, _ = _leer_tiff(lector, inicio + 4 + salto)
+            break
+    if dimensiones is None:
+        raise CabeceraInvalida("HEIF sin ispe para el elemento principal")
+    return fecha, dimensiones
+
+
+def leer_metadatos(origen):
+    """
+    Fecha EXIF y dimensiones leyendo solo la cabecera. `origen` es una ruta
+    o el contenido ya leído (bytes). Devuelve un diccionario con 'formato',
+    'fecha' (datetime o None si no hay) y 'dimensiones' (ancho, alto), y
+    'bytes_leidos' si se leyó del disco; o None si el formato no es uno de
+    los soportados o la cabecera no se pudo interpretar (entonces conviene
+    recurrir a PIL).
+    """
+    if isinstance(origen, (bytes, bytearray, memoryview)):
+        f = io.BytesIO(origen)
+        desde_disco = False
+    else:
+        try:
+            f = open(origen, 'rb')
+        except OSError:
+            return None
+        desde_disco = True
+
+    with f:
+        lector = _Lector(f)
+        try:
+            inicio = lector.leer(0, 16)
+            if inicio[:2] == b'\xff\xd8':
+                formato = 'JPEG'
+                fecha, dimensiones = _leer_jpeg(lector)
+            elif inicio[:8] == FIRMA_PNG:
+                formato = 'PNG'
+                fecha, dimensiones = _leer_png(lector)
+            elif inicio[:4] in (b'II*\x00', b'MM\x00*'):
+                formato = 'TIFF'
+                fecha, dimensiones = _leer_tiff(lector, 0)
+                if dimensiones is None:
+                    return None
+            elif inicio[4:8] == b'ftyp':
+                formato = 'HEIF'
+                fecha, dimensiones = _leer_heic(lector)
+            else:
+                return None
+        except (CabeceraInvalida, struct.error, IndexError, OSError):
+            return None
+
+    metadatos = {'formato': formato, 'fecha': fecha, 'dimensiones': dimensiones}
+    if desde_disco:
+        metadatos['bytes_leidos'] = lector.leidos
+    return metadatos
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+MÉTRICAS - Tiempos por etapa, contadores y progreso del organizador
+Exporta a JSON o al formato de texto de Prometheus
+"""
+
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Límites superiores (segundos) de los cubos del histograma de cada etapa
+LIMITES_HISTOGRAMA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                      0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Etapa:
+    """Histograma de duraciones de una etapa"""
+
+    def __init__(self):
+        self.cuenta = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.cubos = [0] * (len(LIMITES_HISTOGRAMA) + 1)  # el último es +Inf
+
+    def registrar(self, segundos):
+        self.cuenta += 1
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+        for i, limite in enumerate(LIMITES_HISTOGRAMA):
+            if segundos <= limite:
+                self.cubos[i] += 1
+                return
+        self.cubos[-1] += 1
+
+    def percentil(self, fraccion):
+        """Límite del cubo donde cae el percentil (cota superior)"""
+        objetivo = fraccion * self.cuenta
+        acumulado = 0
+        for limite, cantidad in zip(LIMITES_HISTOGRAMA, self.cubos):
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+
+class Metricas:
+    """
+    Tiempos por etapa (con histograma) y contadores del proceso.
+
+    Las etapas se miden con `with metricas.medir('hash'):` o, si la duración
+    viene de otro proceso, con `registrar(etapa, segundos)`. Los contadores
+    (bytes leídos y escritos, aciertos de caché...) se suman con `sumar`.
+    """
+
+    def __init__(self):
+        self.etapas = defaultdict(_Etapa)
+        self.contadores = defaultdict(int)
+
+    @contextmanager
+    def medir(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapas[etapa].registrar(time.perf_counter() - inicio)
+
+    def registrar(self, etapa, segundos):
+        self.etapas[etapa].registrar(segundos)
+
+    def sumar(self, contador, valor=1):
+        self.contadores[contador] += valor
+
+    def fijar(self, contador, valor):
+        """Para contadores que se llevan en otro sitio (p. ej. la caché)"""
+        self.contadores[contador] = valor
+
+    def resumen(self):
+        """Diccionario serializable con todas las etapas y contadores"""
+        etapas = {}
+        for nombre, etapa in sorted(self.etapas.items()):
+            etapas[nombre] = {
+                'cuenta': etapa.cuenta,
+                'total_s': round(etapa.total, 6),
+                'media_ms': round(1000 * etapa.total / etapa.cuenta, 3) if etapa.cuenta else None,
+                'p50_ms': round(1000 * etapa.percentil(0.50), 3),
+                'p95_ms': round(1000 * etapa.percentil(0.95), 3),
+                'max_ms': round(1000 * etapa.maximo, 3),
+                'histograma': {str(limite): cantidad for limite, cantidad
+                               in zip(LIMITES_HISTOGRAMA + ('+Inf',), etapa.cubos)}
+            }
+        return {'etapas': etapas, 'contadores': dict(sorted(self.contadores.items()))}
+
+    def exportar_json(self, ruta):
+        _escribir_atomico(ruta, json.dumps(self.resumen(), indent=2, ensure_ascii=False) + '\n')
+
+    def exportar_prometheus(self, ruta, prefijo='organizador_fotos'):
+        """Formato de texto de Prometheus (apto para el textfile collector de node_exporter)"""
+        lineas = [
+            f"# HELP {prefijo}_etapa_segundos Duración de cada etapa por archivo",
+            f"# TYPE {prefijo}_etapa_segundos histogram"
+        ]
+        for nombre, etapa in sorted(self.etapas.items()):
+            acumulado = 0
+            for limite, cantidad in zip(LIMITES_HISTOGRAMA + ('+Inf',), etapa.cubos):
+                acumulado += cantidad
+                lineas.append(f'{prefijo}_etapa_segundos_bucket{{etapa="{nombre}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{prefijo}_etapa_segundos_sum{{etapa="{nombre}"}} {etapa.total:.6f}')
+            lineas.append(f'{prefijo}_etapa_segundos_count{{etapa="{nombre}"}} {etapa.cuenta}')
+        for contador, valor in sorted(self.contadores.items()):
+            lineas.append(f"# TYPE {prefijo}_{contador}_total counter")
+            lineas.append(f"{prefijo}_{contador}_total {valor}")
+        _escribir_atomico(ruta, '\n'.join(lineas) + '\n')
+
+    def imprimir(self):
+        """Tabla de etapas para el reporte por pantalla"""
+        resumen = self.resumen()
+        if resumen['etapas']:
+            print(f"\n⏱️  TIEMPOS POR ETAPA:")
+            print(f"   {'Etapa':<22} {'veces':>8} {'total s':>9} {'media ms':>9} {'p95 ms':>8} {'máx ms':>9}")
+            for nombre, e in resumen['etapas'].items():
+                print(f"   {nombre:<22} {e['cuenta']:>8} {e['total_s']:>9.2f} {e['media_ms']:>9.2f} "
+                      f"{e['p95_ms']:>8.1f} {e['max_ms']:>9.1f}")
+
+
+def memoria_residente_mb(maxima=False):
+    """
+    Memoria residente actual del proceso en MB (o la máxima, si no se puede
+    saber). Con maxima=True, la máxima desde que arrancó el proceso: VmHWM
+    se reinicia en exec, mientras que ru_maxrss arrastra la del proceso
+    padre en Linux, así que solo se usa como último recurso.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith('VmHWM:' if maxima else 'VmRSS:'):
+                    return round(int(linea.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is not None:
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(maximo / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    return None
+
+
+def _escribir_atomico(ruta, contenido):
+    """Escribe en un temporal y lo renombra, para no dejar nunca un archivo a medias"""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+
+class Progreso:
+    """
+    Línea de progreso que se reescribe como mucho cada `intervalo` segundos,
+    en lugar de imprimir una o más líneas por archivo.
+    """
+
+    def __init__(self, total=None, intervalo=1.0, salida=None):
+        self.total = total
+        self.intervalo = intervalo
+        self.salida = salida or sys.stdout
+        self.hechos = 0
+        self.inicio = time.perf_counter()
+        self.ultima = 0.0
+
+    def avanzar(self, cantidad=1):
+        self.hechos += cantidad
+        ahora = time.perf_counter()
+        if ahora - self.ultima >= self.intervalo:
+            self.ultima = ahora
+            self._mostrar(ahora)
+
+    def _mostrar(self, ahora):
+        transcurrido = ahora - self.inicio
+        ritmo = self.hechos / transcurrido if transcurrido > 0 else 0.0
+        if self.total:
+            texto = f"{self.hechos:,}/{self.total:,} ({100 * self.hechos / self.total:.1f}%)"
+        else:
+            texto = f"{self.hechos:,}"
+        self.salida.write(f"\r⏳ {texto} imágenes, {ritmo:,.1f} img/s   ")
+        self.salida.flush()
+
+    def terminar(self):
+        self._mostrar(time.perf_counter())
+        self.salida.write("\n")
+        self.salida.flush()
@@ -6,17 +6,33 @@ Por Claude - Gratis y sin restricciones
 """
 
 import os
-import shutil
-import hashlib
+import sys
+import time
 from datetime import datetime
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 import json
-from collections import defaultdict
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from agrupamiento import NUMPY_AVAILABLE, agrupar_cuasi_duplicados, elegir_mejores, matriz_hashes
+from almacen_compacto import ConjuntoRutas, TablaCadenas
+from cache_huellas import CacheHuellas, NOMBRE_CACHE
+from colocacion import Colocador, MODOS_COLOCACION
+from diario import DiarioEjecucion, NOMBRE_DIARIO
+from duplicados_exactos import DetectorDuplicadosExactos
+from ejecutor import EjecutorPlan, LectorPlan, PlanAcciones, NOMBRE_PLAN, leer_plan
+from escaner import recorrer_imagenes
+from indice_similitud import IndiceHamming, hash_a_entero
+from manifiesto import ManifiestoBiblioteca
+from metadatos_imagen import VERSION_FECHA
+from metricas import Metricas, Progreso, memoria_residente_mb
+from sonda_imagen import SondaImagen, CAMPOS_HASH, CAMPOS_CALIDAD, VERSION_HASH_PERCEPTUAL
+from vigilancia import vigilar
 
 # Intentar importar librerías opcionales
 try:
     from PIL import Image
-    from PIL.ExifTags import TAGS
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
@@ -29,8 +45,82 @@ except ImportError:
     IMAGEHASH_AVAILABLE = False
     print("⚠️ imagehash no instalado. Ejecuta: pip install imagehash")
 
+# Campos que calculan los procesos trabajadores. El digest no está: lo pide
+# el detector de duplicados exactos solo cuando el tamaño se repite.
+CAMPOS_HUELLA = ('phash', 'fecha', 'dimensiones')
+
+# Medidas con las que se elige la mejor copia de un grupo (más es mejor).
+# Los bytes por píxel distinguen una copia recomprimida a la misma
+# resolución: los bloques del JPEG suben la varianza del laplaciano y, sin
+# esa medida, la copia peor parecería la más nítida.
+MEDIDAS_CALIDAD = ('resolucion', 'nitidez', 'contraste', 'bytes_por_pixel')
+
+
+def medidas_calidad(huella, tamaño):
+    """Valores de MEDIDAS_CALIDAD de una foto, con NaN donde falta el dato"""
+    dimensiones = huella.get('dimensiones')
+    pixeles = dimensiones[0] * dimensiones[1] if dimensiones else None
+    valores = (pixeles, huella.get('nitidez'), huella.get('contraste'),
+               tamaño / pixeles if pixeles and tamaño is not None else None)
+    return [float('nan') if valor is None else valor for valor in valores]
+
+def calcular_huella(archivo, algoritmo_hash, campos):
+    """
+    Calcula en un proceso trabajador los campos pedidos de la huella.
+    Los campos que fallan quedan en None y el coordinador los reintenta.
+    En 'tiempos', 'bytes_leidos' y 'bytes_hash' (los resumidos en el
+    digest) van las medidas para las métricas.
+    """
+    huella = {}
+    tiempos = {}
+    with SondaImagen(archivo) as sonda:
+        if 'digest' in campos:
+            inicio = time.perf_counter()
+            try:
+                huella['digest'] = sonda.digest(algoritmo_hash)
+                huella['algoritmo'] = algoritmo_hash
+                huella['bytes_hash'] = len(sonda.datos)
+            except OSError:
+                pass
+            tiempos['calculo_hash'] = time.perf_counter() - inicio
+        if PIL_AVAILABLE:
+            if IMAGEHASH_AVAILABLE and any(campo in campos for campo in CAMPOS_HASH.values()):
+                inicio = time.perf_counter()
+                for tipo, campo in CAMPOS_HASH.items():
+                    if campo in campos:
+                        try:
+                            huella[campo] = sonda.hash_perceptual(tipo)
+                        except Exception:
+                            pass
+                tiempos['calculo_perceptual'] = time.perf_counter() - inicio
+            if NUMPY_AVAILABLE and any(campo in campos for campo in CAMPOS_CALIDAD):
+                inicio = time.perf_counter()
+                try:
+                    huella.update(sonda.calidad())
+                except Exception:
+                    pass
+                tiempos['calculo_calidad'] = time.perf_counter() - inicio
+        if 'dimensiones' in campos:
+            inicio = time.perf_counter()
+            try:
+                huella['dimensiones'] = sonda.dimensiones()
+            except Exception:
+                pass
+            tiempos['calculo_dimensiones'] = time.perf_counter() - inicio
+        if 'fecha' in campos:
+            inicio = time.perf_counter()
+            huella['fecha'] = sonda.fecha()
+            tiempos['calculo_fecha'] = time.perf_counter() - inicio
+        huella['bytes_leidos'] = sonda.bytes_leidos
+    huella['tiempos'] = tiempos
+    return huella
+
 class OrganizadorFotos:
-    def __init__(self, carpeta_origen, carpeta_destino):
+    def __init__(self, carpeta_origen, carpeta_destino, algoritmo_hash='md5', usar_cache=True, procesos=1,
+                 modo_colocacion='copiar', agrupar_cuasi=False, tipos_hash=('ahash',),
+                 combinacion_hashes='todos', reanudar=False, silencioso=False,
+                 deduplicar_biblioteca=False, planificar=False, simular=False, hilos=4,
+                 hilos_por_dispositivo=None, limite_mb_s=None, reintentos=3):
         self.carpeta_origen = Path(carpeta_origen)
         self.carpeta_destino = Path(carpeta_destino)
         self.estadisticas = {
@@ -40,91 +130,120 @@ class OrganizadorFotos:
             'cuasi_duplicados': 0,
             'sin_fecha': 0,
             'calidad_dudosa': 0,
-            'errores': 0
+            'errores': 0,
+            'bytes_leidos_hash': 0,
+            'cache_aciertos': 0,
+            'cache_fallos': 0,
+            'cache_invalidados': 0
         }
-        self.hashes_md5 = {}
-        self.hashes_perceptuales = {}
-        self.reporte = []
+        self.detector_exactos = DetectorDuplicadosExactos(algoritmo=algoritmo_hash)
+        self.indice_perceptual = IndiceHamming(umbral=5)
+        
+        # Modo por lotes: grupos de cuasi-duplicados calculados antes de decidir
+        if agrupar_cuasi and not NUMPY_AVAILABLE:
+            print("⚠️ numpy no instalado, se usa la detección incremental. Ejecuta: pip install numpy")
+            agrupar_cuasi = False
+        self.agrupar_cuasi = agrupar_cuasi
+        self.tipos_hash = tuple(tipos_hash)
+        self.combinacion_hashes = combinacion_hashes
+        self.grupos = None
+        self.representantes = {}
+        # Al reanudar: fotos que el diario ya conservó y que tienen que
+        # representar a su grupo, sea cual sea el número que reciba ahora
+        self.conservadas_diario = ConjuntoRutas()
+        self.campos_huella = CAMPOS_HUELLA + tuple(
+            CAMPOS_HASH[tipo] for tipo in self.tipos_hash if CAMPOS_HASH[tipo] not in CAMPOS_HUELLA)
+        if agrupar_cuasi:
+            # Para elegir la mejor copia de cada grupo
+            self.campos_huella += CAMPOS_CALIDAD
+        self.reanudar = reanudar
+        
+        # Comparar también con las fotos que ya están en la carpeta destino
+        self.deduplicar_biblioteca = deduplicar_biblioteca
+        self.biblioteca_rutas = TablaCadenas()
+        self.biblioteca_hashes = array('Q')  # tantos hashes por foto como tipos_hash
+        self.carga_biblioteca = None
+        # Una simulación no escribe en el destino nada más que el plan: el
+        # diario solo se lee (al reanudar), el manifiesto vive en memoria y
+        # la caché se consulta sin escribir en ella
+        self.diario = DiarioEjecucion(self.carpeta_destino / NOMBRE_DIARIO, reanudar=reanudar,
+                                      escribir=not simular)
+        self.manifiesto = ManifiestoBiblioteca(self.carpeta_destino, en_memoria=simular)
+        self.procesos = max(1, procesos or 1)
+        self.colocador = Colocador(modo_colocacion)
+        self.rendimiento = {}
+        
+        # Dos fases: primero el plan completo, después su ejecución en un
+        # pool de hilos. Simular es quedarse en el plan.
+        self.simular = simular
+        self.planificar = planificar or simular
+        self.plan = None
+        self.ejecutor = EjecutorPlan(self.colocador, hilos, hilos_por_dispositivo,
+                                     limite_mb_s * 1e6 if limite_mb_s else None, reintentos)
+        
+        # Métricas por etapa; en modo silencioso, progreso en vez de líneas por foto
+        self.metricas = Metricas()
+        self.silencioso = silencioso
+        self.progreso = None
+        self.cache = None
+        if usar_cache and simular:
+            self.cache = CacheHuellas.abrir_solo_lectura(self.carpeta_destino / NOMBRE_CACHE,
+                                                         version_phash=VERSION_HASH_PERCEPTUAL,
+                                                         version_fecha=VERSION_FECHA)
+        elif usar_cache:
+            self.cache = CacheHuellas(self.carpeta_destino / NOMBRE_CACHE,
+                                      version_phash=VERSION_HASH_PERCEPTUAL, version_fecha=VERSION_FECHA)
         
     def crear_estructura_carpetas(self):
-        """Crea la estructura de carpetas necesaria"""
-        carpetas = [
-            self.carpeta_destino / "00_PENDIENTE_REVISION" / "DUPLICADOS_POR_CONFIRMAR",
-            self.carpeta_destino / "00_PENDIENTE_REVISION" / "FOTOS_SIN_FECHA",
-            self.carpeta_destino / "00_PENDIENTE_REVISION" / "CALIDAD_DUDOSA",
-            self.carpeta_destino / "00_METADATOS_PROBLEMA"
-        ]
-        
-        # Crear carpetas para cada mes del año
-        meses = ['01_Enero', '02_Febrero', '03_Marzo', '04_Abril', '05_Mayo', '06_Junio',
-                '07_Julio', '08_Agosto', '09_Septiembre', '10_Octubre', '11_Noviembre', '12_Diciembre']
-        
-        for año in range(2020, 2026):  # Ajusta según tus necesidades
-            for mes in meses:
-                carpetas.append(self.carpeta_destino / str(año) / mes)
-        
-        for carpeta in carpetas:
-            carpeta.mkdir(parents=True, exist_ok=True)
-            
-        print("✅ Estructura de carpetas creada")
-        
-    def calcular_hash_md5(self, archivo):
-        """Calcula el hash MD5 de un archivo"""
-        hash_md5 = hashlib.md5()
-        try:
-            with open(archivo, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
-        except:
-            return None
+        """
+        Crea la carpeta destino. Las de año/mes y las de revisión ya no se
+        crean por adelantado: el colocador crea cada una la primera vez que
+        se usa (para cualquier año) y la recuerda, así no quedan carpetas vacías.
+        """
+        self.colocador.preparar_carpeta(self.carpeta_destino)
+        print("✅ Carpeta destino lista (las subcarpetas se crean al usarlas)")
+        
+    def informar(self, *args, **kwargs):
+        """print() de los mensajes por foto, que se omiten en modo silencioso"""
+        if not self.silencioso:
+            print(*args, **kwargs)
             
-    def obtener_fecha_foto(self, archivo):
+    @staticmethod
+    def obtener_fecha_foto(archivo, sonda=None):
         """Extrae la fecha de los metadatos EXIF o del archivo"""
-        fecha = None
-        
-        if PIL_AVAILABLE:
-            try:
-                imagen = Image.open(archivo)
-                exifdata = imagen.getexif()
-                
-                # Buscar fecha en EXIF
-                for tag_id, value in exifdata.items():
-                    tag = TAGS.get(tag_id, tag_id)
-                    if tag in ['DateTime', 'DateTimeOriginal', 'DateTimeDigitized']:
-                        try:
-                            fecha = datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
-                            break
-                        except:
-                            continue
-            except:
-                pass
+        if sonda is not None:
+            return sonda.fecha()
+        with SondaImagen(archivo) as sonda:
+            return sonda.fecha()
         
-        # Si no hay fecha EXIF, usar fecha de modificación del archivo
-        if not fecha:
-            try:
-                timestamp = os.path.getmtime(archivo)
-                fecha = datetime.fromtimestamp(timestamp)
-            except:
-                return None
-                
-        return fecha
+    @staticmethod
+    def obtener_dimensiones(archivo, sonda=None):
+        """Devuelve (ancho, alto) de la imagen"""
+        if sonda is not None:
+            return sonda.dimensiones()
+        with SondaImagen(archivo) as sonda:
+            return sonda.dimensiones()
         
-    def evaluar_calidad(self, archivo):
+    def evaluar_calidad(self, archivo, huella=None, tamaño=None, sonda=None):
         """Evalúa la calidad técnica de la imagen"""
-        if not PIL_AVAILABLE:
-            return "OK"
-            
         try:
-            imagen = Image.open(archivo)
-            ancho, alto = imagen.size
+            dimensiones = huella.get('dimensiones') if huella else None
+            if dimensiones is None:
+                dimensiones = self.obtener_dimensiones(archivo, sonda)
+                if dimensiones is None:
+                    return "OK"  # Formato sin cabecera conocida y sin PIL
+                if huella is not None:
+                    huella['dimensiones'] = dimensiones
+            ancho, alto = dimensiones
             
             # Criterios de calidad
             if ancho < 800 or alto < 600:
                 return "BAJA_RESOLUCION"
             
             # Verificar tamaño del archivo (muy pequeño = baja calidad)
-            tamaño_kb = os.path.getsize(archivo) / 1024
+            if tamaño is None:
+                tamaño = os.path.getsize(archivo)
+            tamaño_kb = tamaño / 1024
             if tamaño_kb < 50:
                 return "MUY_COMPRIMIDA"
                 
@@ -132,97 +251,344 @@ class OrganizadorFotos:
         except:
             return "ERROR"
             
-    def detectar_cuasi_duplicados(self, archivo):
+    @staticmethod
+    def calcular_hash_perceptual(archivo, sonda=None):
+        """Calcula el hash perceptual (average hash) en hexadecimal"""
+        if sonda is not None:
+            return sonda.hash_perceptual()
+        with SondaImagen(archivo) as sonda:
+            return sonda.hash_perceptual()
+            
+    def detectar_cuasi_duplicados(self, archivo, huella=None, sonda=None):
         """Detecta imágenes similares usando hash perceptual"""
         if not PIL_AVAILABLE or not IMAGEHASH_AVAILABLE:
             return False
             
+        if self.grupos is not None:
+            # Modo por lotes: el primer miembro del grupo que llega aquí se conserva
+            grupo = self.grupos.get(archivo)
+            if grupo is None:
+                return False
+            representante = self.representantes.setdefault(grupo, archivo)
+            return representante if representante != archivo else False
+            
         try:
-            imagen = Image.open(archivo)
-            hash_perceptual = str(imagehash.average_hash(imagen))
-            
-            # Buscar hashes similares
-            for archivo_existente, hash_existente in self.hashes_perceptuales.items():
-                if archivo_existente != archivo:
-                    diferencia = sum(c1 != c2 for c1, c2 in zip(hash_perceptual, hash_existente))
-                    if diferencia <= 5:  # Umbral de similitud
-                        return archivo_existente
+            hash_perceptual = huella.get('phash') if huella else None
+            if hash_perceptual is None:
+                hash_perceptual = self.calcular_hash_perceptual(archivo, sonda)
+                if huella is not None:
+                    huella['phash'] = hash_perceptual
+            
+            hash_entero = hash_a_entero(hash_perceptual)
+            
+            # Buscar hashes similares (distancia de Hamming en bits)
+            archivo_existente = self.indice_perceptual.primero_similar(hash_entero, excluir=archivo)
+            if archivo_existente is not None:
+                return archivo_existente
                         
-            self.hashes_perceptuales[archivo] = hash_perceptual
+            self.indice_perceptual.agregar(archivo, hash_entero)
             return False
         except:
             return False
             
-    def procesar_imagen(self, archivo):
+    def cargar_huella(self, archivo, st):
+        """Obtiene de la caché los datos ya calculados del archivo"""
+        if self.cache is None or st is None:
+            return {}
+        return self.cache.obtener(archivo, st) or {}
+        
+    def guardar_huella(self, archivo, st, huella):
+        """Guarda en la caché los datos calculados del archivo"""
+        # Digests calculados ahora (de este archivo o de otros del mismo tamaño)
+        calculados = self.detector_exactos.digests_calculados
+        archivo_texto = str(archivo)
+        for ruta, digest in calculados:
+            if ruta == archivo_texto:
+                huella['digest'] = digest
+                huella['algoritmo'] = self.detector_exactos.algoritmo
+        if self.cache is not None and st is not None:
+            self.cache.guardar(archivo, st, huella)
+            for ruta, digest in calculados:
+                if ruta != archivo_texto:
+                    self.cache.actualizar_digest(ruta, digest, self.detector_exactos.algoritmo)
+        calculados.clear()
+            
+    def procesar_imagen(self, archivo, st=None, huella=None):
         """Procesa una imagen individual"""
+        self.informar(f"📸 Procesando: {Path(archivo).name}")
+        self.estadisticas['total_procesadas'] += 1
+        
+        try:
+            if st is None:
+                st = os.stat(archivo)
+        except OSError:
+            st = None
+        
+        if huella is None:
+            huella = self.cargar_huella(archivo, st)
+        
+        # Una sola lectura y un solo análisis de la imagen para todos los pasos
+        with SondaImagen(archivo, st) as sonda:
+            try:
+                destino, entrada = self.clasificar_imagen(archivo, st, huella, sonda)
+            finally:
+                self.guardar_huella(archivo, st, huella)
+        self.metricas.sumar('bytes_leidos', sonda.bytes_leidos)
+        entrada['origen'] = str(archivo)
+        
+        if self.plan is not None:
+            # Primera fase: solo se anota la decisión, el destino no se toca
+            self.plan.agregar(archivo, destino, entrada, st, huella)
+            if self.progreso is not None:
+                self.progreso.avanzar()
+            return
+            
+        if destino is not None:
+            # Llevar el archivo al destino (copia, movimiento, enlace o reflink)
+            try:
+                with self.metricas.medir('copia'):
+                    final, _ = self.colocador.colocar(archivo, destino)
+                destino = self.anotar_destino_final(entrada, final)
+                if self.colocador.mueve and st is not None:
+                    self.detector_exactos.renombrar(archivo, destino, st.st_size)
+                self.registrar_en_manifiesto(destino, entrada, st, huella)
+            except Exception as e:
+                self.estadisticas['errores'] += 1
+                entrada['error'] = str(e)
+                print(f"   ❌ Error: {e}")
+        
+        # La decisión queda en disco antes de pasar a la siguiente foto
+        self.diario.registrar(entrada)
+        if self.progreso is not None:
+            self.progreso.avanzar()
+        
+    def anotar_destino_final(self, entrada, final):
+        """
+        El colocador nunca sobrescribe: si el nombre ya estaba ocupado por
+        otra foto, el archivo se guardó como nombre_1.jpg... y la entrada
+        del diario tiene que decirlo. Devuelve el destino final.
+        """
+        prevista = Path(entrada['destino'])
+        if final.name != prevista.name:
+            entrada['destino'] = str(prevista.with_name(final.name))
+            self.informar(f"   ⚠️  {prevista.name} ya existía con otro contenido: guardada como {final.name}")
+        return final
+        
+    def registrar_en_manifiesto(self, destino, entrada, st, huella):
+        """Anota en el manifiesto de la biblioteca una foto ya colocada"""
+        self.manifiesto.registrar(destino, entrada,
+                                  st.st_size if st is not None else None,
+                                  huella.get('digest'), huella.get('algoritmo'))
+            
+    def reanudar_desde_diario(self):
+        """
+        Reconstruye estadísticas, duplicados exactos e índice perceptual con
+        las decisiones del diario, para que las fotos nuevas se comparen con
+        las ya procesadas igual que en una ejecución sin interrupciones.
+        """
+        restauradas = 0
+        for entrada in self.diario.entradas():
+            restauradas += 1
+            self.estadisticas['total_procesadas'] += 1
+            self.estadisticas[entrada['categoria']] += 1
+            if 'error' in entrada:
+                self.estadisticas['errores'] += 1
+            
+            origen = Path(entrada['origen'])
+            ruta = origen
+            if not ruta.exists() and 'destino' in entrada:
+                ruta = Path(entrada['destino'])  # Se movió al destino
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            
+            huella = self.cargar_huella(ruta, st)
+            digest = huella.get('digest') if huella.get('algoritmo') == self.detector_exactos.algoritmo else None
+            self.detector_exactos.registrar(ruta, entrada['archivo'], st.st_size, digest)
+            
+            if entrada['categoria'] in ('movidas_definitivas', 'sin_fecha', 'calidad_dudosa'):
+                if self.agrupar_cuasi:
+                    # Los números de grupo cambian si el origen ha cambiado:
+                    # se guarda la foto y agrupar() la hace representante
+                    if ruta == origen:
+                        self.conservadas_diario.agregar(origen)
+                    else:
+                        self.agregar_conservada_movida(ruta, huella)
+                elif PIL_AVAILABLE and IMAGEHASH_AVAILABLE:
+                    try:
+                        if huella.get('phash') is None:
+                            huella['phash'] = self.calcular_hash_perceptual(ruta)
+                        self.indice_perceptual.agregar(origen, hash_a_entero(huella['phash']))
+                    except Exception:
+                        pass
+            self.guardar_huella(ruta, st, huella)
+            
+            # Filas del manifiesto que no llegaron a guardarse antes de la caída
+            if 'destino' in entrada and 'error' not in entrada and Path(entrada['destino']).exists():
+                self.registrar_en_manifiesto(Path(entrada['destino']), entrada, st, huella)
+            
+        print(f"🔁 Reanudando: {restauradas} decisiones ya tomadas según el diario")
+            
+    def agregar_conservada_movida(self, ruta, huella):
+        """
+        Una foto conservada que ya se movió al destino no vuelve a aparecer
+        en el origen: entra en el agrupamiento como una foto de la
+        biblioteca, que representa a su grupo sin procesarse.
+        """
+        campos = tuple(CAMPOS_HASH[tipo] for tipo in self.tipos_hash)
+        faltan = tuple(campo for campo in campos if huella.get(campo) is None)
+        if faltan:
+            calculada = calcular_huella(ruta, self.detector_exactos.algoritmo, faltan)
+            huella.update((campo, calculada[campo]) for campo in faltan if calculada.get(campo))
+        if all(huella.get(campo) for campo in campos):
+            self.biblioteca_rutas.agregar(ruta)
+            self.biblioteca_hashes.extend(hash_a_entero(huella[campo]) for campo in campos)
+            
+    def cargar_biblioteca(self):
+        """
+        Indexa una sola vez las fotos que ya están en la carpeta destino para
+        que las nuevas se comparen también con ellas.
+        
+        Para los duplicados exactos basta con el tamaño: las fotos de la
+        biblioteca no se comparan entre sí, y bloques y digest solo se
+        calculan si una foto nueva tiene el mismo tamaño. Los hashes
+        perceptuales salen de la caché o se calculan (en paralelo si
+        procesos > 1) y se guardan para la próxima carga.
+        """
+        print(f"📚 Indexando la biblioteca existente en {self.carpeta_destino}...")
+        inicio = time.perf_counter()
+        memoria_inicial = memoria_residente_mb()
+        aciertos_iniciales = self.cache.aciertos if self.cache is not None else 0
+        
+        campos = ()
+        if PIL_AVAILABLE and IMAGEHASH_AVAILABLE:
+            # El modo incremental solo compara el average hash ('phash')
+            campos = tuple(CAMPOS_HASH[tipo] for tipo in self.tipos_hash) if self.agrupar_cuasi else ('phash',)
+        fotos = recorrer_imagenes(self.carpeta_destino, excluir=[self.carpeta_origen])
+        algoritmo = self.detector_exactos.algoritmo
+        
+        total = 0
+        for archivo, st, huella in self.huellas_completas(fotos, campos):
+            total += 1
+            nombre = PurePosixPath(archivo.relative_to(self.carpeta_destino)).as_posix()
+            digest = huella.get('digest') if huella.get('algoritmo') == algoritmo else None
+            self.detector_exactos.agregar_sin_comparar(archivo, nombre, st.st_size, digest)
+            
+            if campos and all(huella.get(campo) for campo in campos):
+                if self.agrupar_cuasi:
+                    # Solo lo necesario para agrupar: pueden ser millones
+                    self.biblioteca_rutas.agregar(archivo)
+                    self.biblioteca_hashes.extend(hash_a_entero(huella[campo]) for campo in campos)
+                else:
+                    self.indice_perceptual.agregar(archivo, hash_a_entero(huella['phash']))
+            self.guardar_huella(archivo, st, huella)
+        if self.cache is not None:
+            self.cache.confirmar()
+        
+        duracion = time.perf_counter() - inicio
+        memoria_final = memoria_residente_mb()
+        self.metricas.registrar('carga_biblioteca', duracion)
+        self.carga_biblioteca = {
+            'fotos': total,
+            'segundos': round(duracion, 3),
+            'desde_cache': (self.cache.aciertos - aciertos_iniciales) if self.cache is not None else 0,
+            'memoria_mb': round(memoria_final - memoria_inicial, 1)
+                          if memoria_final is not None and memoria_inicial is not None else None
+        }
+        print(f"📚 Biblioteca: {total:,} fotos indexadas en {duracion:.1f} s "
+              f"({self.carga_biblioteca['desde_cache']:,} desde la caché), "
+              f"memoria +{self.carga_biblioteca['memoria_mb']} MB")
+            
+    def clasificar_imagen(self, archivo, st, huella, sonda=None):
+        """
+        Decide qué hacer con la imagen. Devuelve (destino, entrada): el destino
+        es None si la imagen se descarta; la entrada va al diario de la ejecución.
+        """
         archivo_path = Path(archivo)
         nombre_archivo = archivo_path.name
+        tamaño = st.st_size if st is not None else None
         
-        print(f"📸 Procesando: {nombre_archivo}")
-        self.estadisticas['total_procesadas'] += 1
+        # 1. Detectar duplicados exactos (tamaño -> bloques -> contenido)
+        digest = None
+        if huella.get('algoritmo') == self.detector_exactos.algoritmo:
+            digest = huella.get('digest')
+        datos = (lambda: sonda.datos) if sonda is not None else None
+        with self.metricas.medir('hash'):
+            original = self.detector_exactos.registrar(archivo, nombre_archivo, tamaño, digest, datos)
+        self.estadisticas['bytes_leidos_hash'] = self.detector_exactos.bytes_leidos
         
-        # 1. Calcular hash MD5 para detectar duplicados exactos
-        hash_md5 = self.calcular_hash_md5(archivo)
-        
-        if hash_md5 and hash_md5 in self.hashes_md5:
+        if original:
             # Duplicado exacto encontrado
             self.estadisticas['duplicados_exactos'] += 1
-            accion = f"❌ ELIMINAR (duplicado exacto de {self.hashes_md5[hash_md5]})"
-            self.reporte.append({
+            accion = f"❌ ELIMINAR (duplicado exacto de {original})"
+            entrada = {
                 'archivo': nombre_archivo,
                 'accion': 'ELIMINAR',
-                'razon': f'Duplicado exacto de {self.hashes_md5[hash_md5]}'
-            })
-            print(f"   {accion}")
-            return
-            
-        if hash_md5:
-            self.hashes_md5[hash_md5] = nombre_archivo
+                'razon': f'Duplicado exacto de {original}',
+                'categoria': 'duplicados_exactos'
+            }
+            self.informar(f"   {accion}")
+            return None, entrada
             
         # 2. Detectar cuasi-duplicados
-        cuasi_duplicado = self.detectar_cuasi_duplicados(archivo)
+        with self.metricas.medir('perceptual'):
+            cuasi_duplicado = self.detectar_cuasi_duplicados(archivo, huella, sonda)
+        grupo = self.grupos.get(archivo) if self.grupos else None
         if cuasi_duplicado:
-            destino = self.carpeta_destino / "00_PENDIENTE_REVISION" / "DUPLICADOS_POR_CONFIRMAR" / nombre_archivo
+            carpeta_revision = self.carpeta_destino / "00_PENDIENTE_REVISION" / "DUPLICADOS_POR_CONFIRMAR"
+            if grupo is not None:
+                carpeta_revision = carpeta_revision / f"grupo_{grupo:05d}"
+            destino = carpeta_revision / nombre_archivo
             self.estadisticas['cuasi_duplicados'] += 1
             accion = f"⚠️  REVISAR: Posible duplicado de {cuasi_duplicado}"
-            self.reporte.append({
+            entrada = {
                 'archivo': nombre_archivo,
                 'accion': 'REVISAR',
                 'destino': str(destino),
-                'razon': f'Cuasi-duplicado de {cuasi_duplicado}'
-            })
-            print(f"   {accion}")
-            shutil.copy2(archivo, destino)
-            return
+                'razon': f'Cuasi-duplicado de {cuasi_duplicado}',
+                'categoria': 'cuasi_duplicados'
+            }
+            if grupo is not None:
+                entrada['grupo'] = grupo
+            self.informar(f"   {accion}")
+            return destino, entrada
             
         # 3. Obtener fecha de la foto
-        fecha = self.obtener_fecha_foto(archivo)
+        fecha = huella.get('fecha')
+        if fecha is None:
+            with self.metricas.medir('fecha'):
+                fecha = self.obtener_fecha_foto(archivo, sonda)
+            huella['fecha'] = fecha
         
         if not fecha:
             # Sin fecha - mover a revisión
             destino = self.carpeta_destino / "00_PENDIENTE_REVISION" / "FOTOS_SIN_FECHA" / nombre_archivo
             self.estadisticas['sin_fecha'] += 1
             accion = "📅 SIN FECHA: Moviendo a revisión"
-            self.reporte.append({
+            entrada = {
                 'archivo': nombre_archivo,
                 'accion': 'REVISAR',
                 'destino': str(destino),
-                'razon': 'Sin metadatos de fecha'
-            })
+                'razon': 'Sin metadatos de fecha',
+                'categoria': 'sin_fecha'
+            }
         else:
             # 4. Evaluar calidad
-            calidad = self.evaluar_calidad(archivo)
+            with self.metricas.medir('calidad'):
+                calidad = self.evaluar_calidad(archivo, huella, tamaño, sonda)
             
             if calidad != "OK":
                 destino = self.carpeta_destino / "00_PENDIENTE_REVISION" / "CALIDAD_DUDOSA" / nombre_archivo
                 self.estadisticas['calidad_dudosa'] += 1
                 accion = f"⚠️  CALIDAD: {calidad}"
-                self.reporte.append({
+                entrada = {
                     'archivo': nombre_archivo,
                     'accion': 'REVISAR',
                     'destino': str(destino),
-                    'razon': calidad
-                })
+                    'razon': calidad,
+                    'categoria': 'calidad_dudosa'
+                }
             else:
                 # Imagen OK - mover a carpeta definitiva
                 meses = ['01_Enero', '02_Febrero', '03_Marzo', '04_Abril', '05_Mayo', '06_Junio',
@@ -233,41 +599,433 @@ class OrganizadorFotos:
                 destino = self.carpeta_destino / str(año) / mes / nombre_archivo
                 self.estadisticas['movidas_definitivas'] += 1
                 accion = f"✅ MOVER A: {año}/{mes}/"
-                self.reporte.append({
+                entrada = {
                     'archivo': nombre_archivo,
                     'accion': 'CONSERVAR',
                     'destino': str(destino),
-                    'fecha': fecha.strftime('%Y-%m-%d')
-                })
+                    'fecha': fecha.strftime('%Y-%m-%d'),
+                    'categoria': 'movidas_definitivas'
+                }
                 
-        print(f"   {accion}")
-        
-        # Copiar archivo al destino
-        try:
-            destino.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(archivo, destino)
-        except Exception as e:
-            self.estadisticas['errores'] += 1
-            print(f"   ❌ Error: {e}")
+        if grupo is not None:
+            entrada['grupo'] = grupo
+        self.informar(f"   {accion}")
+        return destino, entrada
             
+    def imagenes_origen(self, incluir_completadas=False):
+        """
+        Genera (ruta, stat) de cada imagen del origen en un solo recorrido,
+        saltando las que el diario ya da por completadas al reanudar.
+        """
+        for archivo, st in recorrer_imagenes(self.carpeta_origen, excluir=[self.carpeta_destino]):
+            if incluir_completadas or str(archivo) not in self.diario.completados:
+                yield archivo, st
+        
     def procesar_carpeta(self):
         """Procesa todas las imágenes de la carpeta origen"""
-        extensiones_imagen = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.raw', '.heic']
+        print(f"\n🎯 Buscando y procesando imágenes en {self.carpeta_origen}\n")
+        
+        inicio = time.perf_counter()
+        if self.silencioso:
+            self.progreso = Progreso()
+        if self.planificar:
+            self.plan = PlanAcciones(self.carpeta_destino / NOMBRE_PLAN, self.carpeta_destino, {
+                'origen': str(self.carpeta_origen.resolve()),
+                'destino': str(self.carpeta_destino.resolve()),
+                'modo': self.colocador.modo,
+                'algoritmo': self.detector_exactos.algoritmo
+            })
+        if self.reanudar:
+            self.reanudar_desde_diario()
+        if self.deduplicar_biblioteca:
+            self.cargar_biblioteca()
+        if self.agrupar_cuasi:
+            total = self.procesar_por_grupos(self.imagenes_origen(incluir_completadas=True))
+        elif self.procesos > 1:
+            total = self.procesar_en_paralelo(self.imagenes_origen())
+        else:
+            total = 0
+            for archivo, st in self.imagenes_origen():
+                total += 1
+                self.informar(f"\n[{total}]", end=" ")
+                self.procesar_imagen(archivo, st)
+        duracion = time.perf_counter() - inicio
+        if self.progreso is not None:
+            self.progreso.terminar()
+            self.progreso = None
         
-        archivos = []
-        for ext in extensiones_imagen:
-            archivos.extend(self.carpeta_origen.glob(f'**/*{ext}'))
-            archivos.extend(self.carpeta_origen.glob(f'**/*{ext.upper()}'))
+        self.rendimiento = {
+            'procesos': self.procesos,
+            'segundos': round(duracion, 3),
+            'imagenes_por_segundo': round(total / duracion, 1) if duracion > 0 else None
+        }
+        if self.carga_biblioteca is not None:
+            self.rendimiento['biblioteca'] = self.carga_biblioteca
+        print(f"\n⏱️  {total} imágenes en {duracion:.1f} s con {self.procesos} proceso(s)")
+        
+        if self.plan is not None:
+            self.plan.cerrar()
+            resumen = self.plan.resumen()
+            self.rendimiento['plan'] = resumen
+            acciones = ', '.join(f"{cantidad} {accion}" for accion, cantidad in sorted(resumen['acciones'].items()))
+            acciones = acciones or "nada pendiente"
+            print(f"🗺️  Plan: {acciones}; {resumen['bytes_a_colocar'] / 1e6:,.1f} MB a colocar → {self.plan.ruta}")
+            ruta_plan, self.plan = self.plan.ruta, None
+            if not self.simular:
+                self.ejecutar_plan(ruta_plan)
             
-        total = len(archivos)
-        print(f"\n🎯 Encontradas {total} imágenes para procesar\n")
+    def ejecutar_plan(self, ruta=None, contar=False):
+        """
+        Segunda fase: ejecuta un plan (por defecto, el de esta ejecución).
+        Las colocaciones van al pool de hilos del ejecutor; diario, manifiesto
+        e índices se actualizan aquí, a medida que terminan. Las fotos que el
+        diario ya da por completadas se saltan, así un plan interrumpido puede
+        volver a ejecutarse. Con contar=True (un plan guardado por otra
+        ejecución) las estadísticas se toman del propio plan.
+        
+        El plan se lee una vez para ordenar las colocaciones, guardando de
+        cada una solo su posición en el archivo, y cada operación se vuelve
+        a leer cuando se reparte a un hilo.
+        """
+        ruta = Path(ruta) if ruta else self.carpeta_destino / NOMBRE_PLAN
+        cabecera, operaciones = leer_plan(ruta)
+        if cabecera['modo'] != self.colocador.modo:
+            raise ValueError(f"El plan es para el modo {cabecera['modo']}, no {self.colocador.modo}")
+        
+        def con_destino_completo(operacion):
+            operacion['destino'] = str(self.carpeta_destino / operacion['destino'])
+            return operacion
         
-        for i, archivo in enumerate(archivos, 1):
-            print(f"\n[{i}/{total}]", end=" ")
-            self.procesar_imagen(archivo)
+        def colocaciones():
+            for posicion, operacion in operaciones:
+                entrada = operacion['entrada']
+                if contar:
+                    self.estadisticas['total_procesadas'] += 1
+                    self.estadisticas[entrada['categoria']] += 1
+                if entrada['origen'] in self.diario.completados:
+                    continue
+                if operacion['destino'] is not None:
+                    yield posicion, con_destino_completo(operacion)
+                else:
+                    self.diario.registrar(entrada)  # descartada: no hay nada que colocar
+        
+        pendientes = self.ejecutor.ordenar(colocaciones())
+        print(f"🚚 Ejecutando el plan: {len(pendientes):,} colocaciones con {self.ejecutor.hilos} hilos...")
+        inicio = time.perf_counter()
+        # Todas las carpetas del plan de una vez, antes de repartir el trabajo entre los hilos
+        with self.metricas.medir('crear_carpetas'):
+            self.colocador.preparar_carpetas(pendientes.carpetas)
+        progreso = Progreso(total=len(pendientes)) if self.silencioso else None
+        lector = LectorPlan(ruta)
+        try:
+            for operacion, error, segundos, _ in self.ejecutor.ejecutar(
+                    pendientes, lambda posicion: con_destino_completo(lector.leer(posicion))):
+                entrada = operacion['entrada']
+                self.metricas.registrar('copia', segundos)
+                if error is None:
+                    destino = self.anotar_destino_final(entrada, Path(operacion['destino']))
+                    if self.colocador.mueve and operacion['bytes'] is not None:
+                        self.detector_exactos.renombrar(entrada['origen'], destino, operacion['bytes'])
+                    self.manifiesto.registrar(destino, entrada, operacion['bytes'],
+                                              operacion['digest'], operacion['algoritmo'])
+                else:
+                    self.estadisticas['errores'] += 1
+                    entrada['error'] = str(error)
+                    print(f"   ❌ Error con {entrada['archivo']}: {error}")
+                self.diario.registrar(entrada)
+                if progreso is not None:
+                    progreso.avanzar()
+        finally:
+            lector.cerrar()
+        duracion = time.perf_counter() - inicio
+        if progreso is not None:
+            progreso.terminar()
+        
+        self.rendimiento['ejecucion_plan'] = {
+            'colocaciones': len(pendientes),
+            'hilos': self.ejecutor.hilos,
+            'segundos': round(duracion, 3),
+            'reintentos': self.ejecutor.reintentados
+        }
+        print(f"🚚 Plan ejecutado en {duracion:.1f} s ({self.ejecutor.reintentados} reintentos)")
+            
+    def huellas_completas(self, imagenes, campos):
+        """
+        Genera (archivo, st, huella) en el mismo orden que `imagenes`, con los
+        campos pedidos ya calculados: de la caché o, si faltan, en este
+        proceso o en un pool de procesos (con una ventana acotada).
+        """
+        algoritmo = self.detector_exactos.algoritmo
+        
+        def pendiente(archivo, st):
+            huella = self.cargar_huella(archivo, st)
+            faltan = tuple(campo for campo in campos if huella.get(campo) is None)
+            if 'digest' in campos and huella.get('algoritmo') != algoritmo and 'digest' not in faltan:
+                faltan += ('digest',)
+            return huella, faltan
+        
+        def completar(huella, calculada):
+            for etapa, segundos in calculada.pop('tiempos').items():
+                self.metricas.registrar(etapa, segundos)
+            self.metricas.sumar('bytes_leidos', calculada.pop('bytes_leidos'))
+            # Digest calculado en el trabajador: también cuenta como lectura para exactos
+            self.detector_exactos.bytes_leidos += calculada.pop('bytes_hash', 0)
+            for campo, valor in calculada.items():
+                if valor is not None:
+                    huella[campo] = valor
+            return huella
+        
+        if self.procesos == 1:
+            for archivo, st in imagenes:
+                huella, faltan = pendiente(archivo, st)
+                if faltan:
+                    completar(huella, calcular_huella(archivo, algoritmo, faltan))
+                yield archivo, st, huella
+            return
+        
+        ventana = self.procesos * 4
+        pendientes = deque()
+        imagenes = iter(imagenes)
+        
+        with ProcessPoolExecutor(max_workers=self.procesos) as pool:
+            def enviar_siguiente():
+                siguiente = next(imagenes, None)
+                if siguiente is None:
+                    return False
+                archivo, st = siguiente
+                huella, faltan = pendiente(archivo, st)
+                futuro = pool.submit(calcular_huella, archivo, algoritmo, faltan) if faltan else None
+                pendientes.append((archivo, st, huella, futuro))
+                return True
+            
+            while len(pendientes) < ventana and enviar_siguiente():
+                pass
+            
+            while pendientes:
+                archivo, st, huella, futuro = pendientes.popleft()
+                if futuro is not None:
+                    completar(huella, futuro.result())
+                enviar_siguiente()
+                yield archivo, st, huella
+            
+    def procesar_en_paralelo(self, imagenes):
+        """
+        Calcula las huellas en un pool de procesos y toma las decisiones en
+        este proceso, en el mismo orden que una ejecución secuencial.
+        Recibe pares (ruta, stat) y devuelve cuántas imágenes procesó.
+        """
+        i = 0
+        for archivo, st, huella in self.huellas_completas(imagenes, self.campos_huella):
+            i += 1
+            self.informar(f"\n[{i}]", end=" ")
+            self.procesar_imagen(archivo, st, huella)
+        return i
+            
+    def procesar_llegadas(self, llegadas):
+        """
+        Modo continuo: organiza un lote de fotos recién llegadas con los
+        índices que ya están en memoria. `llegadas` son (ruta, stat,
+        detectada), con detectada medida con time.monotonic().
+        """
+        detectadas = {archivo: detectada for archivo, _, detectada in llegadas}
+        imagenes = [(archivo, st) for archivo, st, _ in llegadas]
+        if self.procesos > 1:
+            pendientes = self.huellas_completas(imagenes, self.campos_huella)
+        else:
+            pendientes = ((archivo, st, None) for archivo, st in imagenes)
+            
+        latencias = []
+        for archivo, st, huella in pendientes:
+            self.procesar_imagen(archivo, st, huella)
+            latencia = time.monotonic() - detectadas[archivo]
+            latencias.append(latencia)
+            self.metricas.registrar('ingesta', latencia)
+            self.informar(f"   ⏱️  Ingerida {latencia:.2f} s después de llegar")
+        
+        # Lo decidido queda en disco aunque el proceso siga en marcha
+        self.confirmar()
+        print(f"📥 {len(latencias)} fotos nuevas organizadas (latencia media "
+              f"{sum(latencias) / len(latencias):.2f} s, máx {max(latencias):.2f} s)")
+            
+    def agrupar(self, rutas, con_hash, hashes, medidas):
+        """
+        Calcula los grupos de cuasi-duplicados de todo el lote de una vez.
+        Solo se guardan los grupos de dos o más fotos, numerados por orden
+        de aparición. Si se cargó la biblioteca, sus fotos entran primero y
+        un grupo que contiene alguna queda representado por ella; los grupos
+        sin ninguna foto nueva se ignoran. En el resto se conserva la mejor
+        copia (MEDIDAS_CALIDAD) y las demás van a revisión.
+        
+        rutas:    TablaCadenas con todas las fotos del lote
+        con_hash: posición en `rutas` de cada foto con todos los hashes
+        hashes:   hashes enteros fila a fila, los de la biblioteca delante
+        medidas:  MEDIDAS_CALIDAD de cada foto con hashes, fila a fila
+        """
+        en_biblioteca = len(self.biblioteca_rutas)
+        self.grupos = {}
+        if not con_hash:
+            return
+        
+        raices = agrupar_cuasi_duplicados(matriz_hashes(hashes, len(self.tipos_hash)),
+                                         [self.indice_perceptual.umbral] * len(self.tipos_hash),
+                                         self.combinacion_hashes)
+        
+        tamaños = defaultdict(int)
+        nuevas = defaultdict(int)
+        for i, raiz in enumerate(raices):
+            tamaños[int(raiz)] += 1
+            if i >= en_biblioteca:
+                nuevas[int(raiz)] += 1
+        numeros = {}
+        miembros = []
+        fotos = 0
+        for i, raiz in enumerate(raices):
+            if tamaños[int(raiz)] > 1 and nuevas[int(raiz)] > 0:
+                grupo = numeros.setdefault(int(raiz), len(numeros) + 1)
+                fotos += 1
+                if i < en_biblioteca:
+                    # Las fotos de la biblioteca no se procesan: solo representan al grupo
+                    self.representantes.setdefault(grupo, self.biblioteca_rutas[i])
+                else:
+                    archivo = Path(rutas[con_hash[i - en_biblioteca]])
+                    self.grupos[archivo] = grupo
+                    miembros.append((grupo, archivo, i - en_biblioteca))
+        print(f"🧩 {len(numeros)} grupos de cuasi-duplicados con {fotos} fotos")
+        
+        # Al reanudar, la foto que el diario ya conservó sigue representando a su grupo
+        conservadas = set()
+        for grupo, archivo, _ in miembros:
+            if grupo not in conservadas and str(archivo) in self.conservadas_diario:
+                self.representantes[grupo] = archivo
+                conservadas.add(grupo)
+        n = len(MEDIDAS_CALIDAD)
+        self.elegir_representantes([(grupo, archivo, medidas[n * fila:n * (fila + 1)].tolist())
+                                    for grupo, archivo, fila in miembros
+                                    if grupo not in self.representantes])
+        
+    def elegir_representantes(self, candidatas):
+        """
+        Representante (la copia que se conserva) de cada grupo que aún no lo
+        tiene por la biblioteca o por el diario: la de mejor puntuación,
+        calculada para todos los grupos en una sola pasada vectorizada.
+        `candidatas` son (grupo, archivo, medidas) en orden de aparición.
+        """
+        if not candidatas:
+            return
+        mejores = elegir_mejores([grupo for grupo, _, _ in candidatas],
+                                 [medidas for _, _, medidas in candidatas])
+        primeras = {}
+        for grupo, archivo, _ in candidatas:
+            primeras.setdefault(grupo, archivo)
+        distintas = 0
+        for grupo, indice in mejores.items():
+            self.representantes[grupo] = candidatas[indice][1]
+            distintas += candidatas[indice][1] != primeras[grupo]
+        print(f"🏅 Mejor copia elegida en {len(mejores)} grupos ({distintas} distinta de la primera)")
+        
+    def procesar_por_grupos(self, imagenes):
+        """
+        Modo por lotes: calcula primero las huellas de todas las imágenes,
+        agrupa los cuasi-duplicados y después decide foto a foto.
+        
+        De la primera pasada solo quedan en memoria la ruta (en una
+        TablaCadenas), los hashes enteros y las medidas de calidad: menos
+        de 80 bytes por foto más la ruta. Las huellas completas van a la
+        caché y la segunda pasada las vuelve a leer de ahí. Sin caché (o
+        en una simulación, con la caché de solo lectura) la segunda pasada
+        las calcula otra vez.
+        """
+        print("🧮 Calculando huellas de todas las imágenes...")
+        campos = [CAMPOS_HASH[tipo] for tipo in self.tipos_hash]
+        rutas = TablaCadenas()
+        con_hash = array('I')
+        hashes = array('Q', self.biblioteca_hashes)
+        medidas = array('d')
+        for archivo, st, huella in self.huellas_completas(imagenes, self.campos_huella):
+            posicion = rutas.agregar(archivo)
+            if all(huella.get(campo) for campo in campos):
+                con_hash.append(posicion)
+                hashes.extend(hash_a_entero(huella[campo]) for campo in campos)
+                medidas.extend(medidas_calidad(huella, st.st_size if st is not None else None))
+            self.guardar_huella(archivo, st, huella)
+        if self.cache is not None:
+            self.cache.confirmar()
+        self.agrupar(rutas, con_hash, hashes, medidas)
+        del con_hash, hashes, medidas
+        
+        pendientes = array('I', (posicion for posicion in range(len(rutas))
+                                 if rutas[posicion] not in self.diario.completados))
+        total = len(pendientes)
+        if self.progreso is not None:
+            self.progreso.total = total
+        
+        def imagenes_pendientes():
+            for posicion in pendientes:
+                archivo = Path(rutas[posicion])
+                try:
+                    st = os.stat(archivo)
+                except OSError:
+                    st = None
+                yield archivo, st
+        
+        if self.procesos > 1:
+            lote = self.huellas_completas(imagenes_pendientes(), self.campos_huella)
+        else:
+            lote = ((archivo, st, None) for archivo, st in imagenes_pendientes())
+        for i, (archivo, st, huella) in enumerate(lote, 1):
+            self.informar(f"\n[{i}/{total}]", end=" ")
+            self.procesar_imagen(archivo, st, huella)
+        return total
+            
+    def confirmar(self):
+        """Confirma caché y manifiesto en disco y actualiza los archivos de métricas"""
+        if self.cache is not None:
+            self.cache.confirmar()
+        self.manifiesto.confirmar()
+        self.exportar_metricas()
+            
+    def exportar_metricas(self):
+        """Escribe metricas_organizacion.json y .prom junto al reporte"""
+        self.actualizar_contadores()
+        self.metricas.exportar_json(self.carpeta_destino / "metricas_organizacion.json")
+        self.metricas.exportar_prometheus(self.carpeta_destino / "metricas_organizacion.prom")
+            
+    def compactar_cache(self, forzar=False):
+        """Elimina de la caché los archivos que ya no existen (periódicamente, o ya si se fuerza)"""
+        if self.cache is not None:
+            eliminados = self.cache.compactar(forzar)
+            if eliminados is not None:
+                print(f"🧹 Caché compactada: {eliminados} entradas obsoletas eliminadas")
+            
+    def cerrar(self):
+        """Guarda y cierra el diario, el manifiesto y la caché de huellas"""
+        self.diario.cerrar()
+        self.manifiesto.cerrar()
+        if self.cache is not None:
+            self.cache.cerrar()
+            self.cache = None
+            
+    def actualizar_contadores(self):
+        """Copia a las métricas los contadores que llevan otros componentes"""
+        self.metricas.fijar('bytes_leidos_hash', self.detector_exactos.bytes_leidos)
+        self.metricas.fijar('bytes_escritos', sum(self.colocador.bytes_escritos.values()))
+        self.metricas.fijar('carpetas_creadas', self.colocador.carpetas_creadas)
+        for categoria in ('total_procesadas', 'movidas_definitivas', 'duplicados_exactos',
+                          'cuasi_duplicados', 'sin_fecha', 'calidad_dudosa', 'errores'):
+            self.metricas.fijar(f"archivos_{categoria}", self.estadisticas[categoria])
+        if self.cache is not None:
+            self.metricas.fijar('cache_aciertos', self.cache.aciertos)
+            self.metricas.fijar('cache_fallos', self.cache.fallos)
+            self.metricas.fijar('cache_invalidados', self.cache.invalidados)
             
     def generar_reporte(self):
         """Genera el reporte final"""
+        if self.cache is not None:
+            self.estadisticas['cache_aciertos'] = self.cache.aciertos
+            self.estadisticas['cache_fallos'] = self.cache.fallos
+            self.estadisticas['cache_invalidados'] = self.cache.invalidados
+        self.actualizar_contadores()
+            
         print("\n" + "="*60)
         print("📊 REPORTE FINAL DE ORGANIZACIÓN")
         print("="*60)
@@ -281,18 +1039,42 @@ class OrganizadorFotos:
    • 📅 Sin fecha (revisión): {self.estadisticas['sin_fecha']}
    • 📸 Calidad dudosa (revisión): {self.estadisticas['calidad_dudosa']}
    • ❗ Errores: {self.estadisticas['errores']}
+   • 💽 Bytes leídos para duplicados exactos: {self.estadisticas['bytes_leidos_hash']:,}
+   • 🗃️  Caché: {self.estadisticas['cache_aciertos']} aciertos, {self.estadisticas['cache_fallos']} fallos ({self.estadisticas['cache_invalidados']} invalidados)
         """)
         
-        # Guardar reporte detallado en JSON
+        # Guardar reporte detallado en JSON, recorriendo el diario
         reporte_path = self.carpeta_destino / "reporte_organizacion.json"
         with open(reporte_path, 'w', encoding='utf-8') as f:
-            json.dump({
-                'estadisticas': self.estadisticas,
-                'detalles': self.reporte,
-                'fecha_proceso': datetime.now().isoformat()
-            }, f, indent=2, ensure_ascii=False)
+            f.write("{\n")
+            for clave, valor in (('estadisticas', self.estadisticas),
+                                 ('rendimiento', self.rendimiento),
+                                 ('colocacion', self.colocador.resumen()),
+                                 ('metricas', self.metricas.resumen())):
+                valor_json = json.dumps(valor, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+                f.write(f'  "{clave}": {valor_json},\n')
+            f.write('  "detalles": [')
+            for n, item in enumerate(self.diario.entradas()):
+                f.write(",\n    " if n else "\n    ")
+                f.write(json.dumps(item, ensure_ascii=False))
+            f.write("\n  ],\n")
+            f.write(f'  "fecha_proceso": {json.dumps(datetime.now().isoformat())}\n}}\n')
             
         print(f"💾 Reporte detallado guardado en: {reporte_path}")
+        
+        colocacion = self.colocador.resumen()
+        print(f"\n📦 COLOCACIÓN (modo {colocacion['modo']}):")
+        for operacion, cantidad in colocacion['archivos'].items():
+            print(f"   • {operacion}: {cantidad} archivos, {colocacion['bytes_escritos'][operacion]:,} bytes escritos")
+        for motivo, cantidad in colocacion['respaldos'].items():
+            print(f"   • Respaldo {motivo}: {cantidad} veces")
+        if colocacion['nombres_cambiados']:
+            print(f"   • Guardadas con otro nombre (el suyo ya estaba ocupado): {colocacion['nombres_cambiados']}")
+        print(f"   • Carpetas creadas: {colocacion['carpetas_creadas']}")
+            
+        self.metricas.imprimir()
+        self.exportar_metricas()
+        print(f"📈 Métricas guardadas en: {self.carpeta_destino / 'metricas_organizacion.json'} (y .prom)")
 
         
         
@@ -308,7 +1090,7 @@ class OrganizadorFotos:
             f.write("\n\nDETALLES POR ARCHIVO:\n")
             f.write("-"*50 + "\n")
             
-            for item in self.reporte:
+            for item in self.diario.entradas():
                 f.write(f"\n📸 {item['archivo']}\n")
                 f.write(f"   Acción: {item['accion']}\n")
                 if 'destino' in item:
@@ -334,6 +1116,22 @@ def main():
     if not carpeta_origen:
         carpeta_origen = "."  # Carpeta actual por defecto
         
+    # --reanudar / --resume: continuar una ejecución interrumpida según su diario
+    reanudar = '--reanudar' in sys.argv or '--resume' in sys.argv
+    # --silencioso / --quiet: una línea de progreso en lugar de varias por foto
+    silencioso = '--silencioso' in sys.argv or '--quiet' in sys.argv
+    # --vigilar / --watch: tras la primera pasada, seguir organizando lo que llegue
+    # (--sondeo fuerza el sondeo periódico en lugar de inotify)
+    vigilar_origen = '--vigilar' in sys.argv or '--watch' in sys.argv
+    if vigilar_origen:
+        reanudar = True  # el diario es la memoria de lo ya organizado
+    # --simular / --dry-run: solo decidir y guardar el plan, sin tocar el destino
+    # --plan: decidir todo primero y después colocar con varios hilos
+    simular = '--simular' in sys.argv or '--dry-run' in sys.argv
+    planificar = (simular or '--plan' in sys.argv) and not vigilar_origen
+    # --compactar: limpiar ya la caché de huellas (si no, se hace cada COMPACTAR_CADA_DIAS días)
+    compactar = '--compactar' in sys.argv
+    
     carpeta_destino = input("Ingresa la ruta donde quieres organizar las fotos: ").strip()
     if not carpeta_destino:
         carpeta_destino = "FOTOS_ORGANIZADAS"
@@ -343,8 +1141,32 @@ def main():
         print("❌ La carpeta origen no existe")
         return
         
+    nucleos = os.cpu_count() or 1
+    procesos = input(f"Número de procesos en paralelo (Enter = {nucleos}): ").strip()
+    procesos = int(procesos) if procesos.isdigit() else nucleos
+        
+    modo = input(f"Modo de colocación {'/'.join(MODOS_COLOCACION)} (Enter = copiar): ").strip().lower()
+    if modo not in MODOS_COLOCACION:
+        modo = 'copiar'
+        
+    biblioteca = input("¿Comparar también con las fotos que ya hay en el destino? (s/n, Enter = n): ").strip().lower() == 's'
+        
+    agrupar = False
+    if not vigilar_origen:
+        agrupar = input("¿Agrupar cuasi-duplicados en lote (requiere numpy)? (s/n, Enter = n): ").strip().lower() == 's'
+        
+    hilos, limite_mb_s = 4, None
+    if planificar and not simular:
+        respuesta = input("Hilos para colocar los archivos (Enter = 4): ").strip()
+        hilos = int(respuesta) if respuesta.isdigit() else 4
+        respuesta = input("Límite de escritura en MB/s (Enter = sin límite): ").strip()
+        limite_mb_s = float(respuesta) if respuesta.replace('.', '', 1).isdigit() else None
+        
     # Crear organizador
-    organizador = OrganizadorFotos(carpeta_origen, carpeta_destino)
+    organizador = OrganizadorFotos(carpeta_origen, carpeta_destino, procesos=procesos,
+                                   modo_colocacion=modo, agrupar_cuasi=agrupar, reanudar=reanudar,
+                                   silencioso=silencioso, deduplicar_biblioteca=biblioteca,
+                                   planificar=planificar, simular=simular, hilos=hilos, limite_mb_s=limite_mb_s)
     
     print(f"\n✅ Carpeta origen: {carpeta_origen}")
     print(f"✅ Carpeta destino: {carpeta_destino}")
@@ -362,9 +1184,19 @@ def main():
     print("\n🚀 INICIANDO PROCESO DE ORGANIZACIÓN...")
     print("-"*40)
     
-    organizador.crear_estructura_carpetas()
+    if not simular:
+        organizador.crear_estructura_carpetas()
     organizador.procesar_carpeta()
+    if simular:
+        organizador.cerrar()
+        print(f"\n🗺️  Simulación: no se ha colocado ningún archivo. Revisa el plan y ejecútalo con:")
+        print(f"   python ejecutor.py {organizador.carpeta_destino / NOMBRE_PLAN}")
+        return
+    if vigilar_origen:
+        vigilar(organizador, sondeo='--sondeo' in sys.argv)
     organizador.generar_reporte()
+    organizador.compactar_cache(forzar=compactar)
+    organizador.cerrar()
     
     print("\n✨ ¡PROCESO COMPLETADO!")
     print(f"📁 Revisa tus fotos organizadas en: {carpeta_destino}")
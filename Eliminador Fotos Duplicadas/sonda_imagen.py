@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+SONDA DE IMAGEN - Una sola lectura y un solo análisis por foto
+Sirve digest, fecha EXIF, dimensiones, tamaño y hash perceptual
+"""
+
+import io
+import os
+from datetime import datetime
+
+from duplicados_exactos import nuevo_hash
+from metadatos_imagen import TAG_EXIF_IFD, TAGS_FECHA, convertir_fecha_exif, leer_metadatos
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import imagehash
+    IMAGEHASH_AVAILABLE = True
+except ImportError:
+    IMAGEHASH_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Versión del cálculo del hash perceptual. Los hashes guardados con otra
+# versión se recalculan (v1: imagen completa; v2: decodificación reducida JPEG)
+VERSION_HASH_PERCEPTUAL = 2
+
+# Tamaño mínimo que se pide al decodificador JPEG en modo draft. El escalado
+# DCT (1/2, 1/4, 1/8) nunca baja de este tamaño, muy por encima de los 8x8
+# del average hash, así que el resultado coincide con el de la imagen
+# completa salvo por algún bit en los bordes del umbral.
+TAMAÑO_DRAFT = 128
+
+# Tipos de hash perceptual y el campo de la huella donde se guarda cada uno
+CAMPOS_HASH = {'ahash': 'phash', 'dhash': 'dhash', 'phash': 'phash_dct'}
+
+# Medidas para elegir la mejor copia de un grupo de cuasi-duplicados, sobre
+# la imagen en gris reducida a LADO_CALIDAD x LADO_CALIDAD
+CAMPOS_CALIDAD = ('nitidez', 'contraste')
+LADO_CALIDAD = 128
+
+
+class SondaImagen:
+    """
+    Lee el archivo completo una única vez (solo cuando algo lo necesita) y
+    abre la imagen desde memoria una única vez. Todos los datos de la foto
+    salen de esa lectura. Fecha y dimensiones salen de la cabecera
+    (metadatos_imagen): si el archivo aún no se ha leído, solo se leen
+    unos KB. PIL se usa solo cuando la cabecera no se puede interpretar.
+    Usar como context manager para liberar la imagen y los bytes en cuanto
+    se termina con el archivo.
+    """
+
+    def __init__(self, archivo, st=None):
+        self.archivo = archivo
+        self.st = st
+        self.bytes_leidos = 0
+        self._datos = None
+        self._imagen = None
+        self._dimensiones = None
+        self._metadatos = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    @property
+    def datos(self):
+        """Contenido completo del archivo"""
+        if self._datos is None:
+            with open(self.archivo, 'rb') as f:
+                self._datos = f.read()
+            self.bytes_leidos += len(self._datos)
+        return self._datos
+
+    @property
+    def tamaño(self):
+        if self.st is not None:
+            return self.st.st_size
+        if self._datos is not None:
+            return len(self._datos)
+        return os.path.getsize(self.archivo)
+
+    @property
+    def imagen(self):
+        """Imagen PIL abierta desde los bytes ya leídos (solo cabecera hasta decodificar)"""
+        if self._imagen is None:
+            self._imagen = Image.open(io.BytesIO(self.datos))
+            # Guardar el tamaño real antes de que un draft lo reduzca
+            self._dimensiones = self._imagen.size
+        return self._imagen
+
+    def digest(self, algoritmo='md5'):
+        """Digest del contenido completo"""
+        h = nuevo_hash(algoritmo)
+        h.update(self.datos)
+        return h.hexdigest()
+
+    def metadatos(self):
+        """Fecha y dimensiones leídas de la cabecera, o None si hay que usar PIL"""
+        if self._metadatos is None:
+            if self._datos is not None:
+                self._metadatos = leer_metadatos(self._datos) or False
+            else:
+                self._metadatos = leer_metadatos(self.archivo) or False
+                if self._metadatos:
+                    self.bytes_leidos += self._metadatos['bytes_leidos']
+        return self._metadatos or None
+
+    def dimensiones(self):
+        """(ancho, alto) de la imagen, o None si no se puede saber sin PIL"""
+        if self._dimensiones is None:
+            metadatos = self.metadatos()
+            if metadatos is not None:
+                self._dimensiones = metadatos['dimensiones']
+            elif PIL_AVAILABLE:
+                self.imagen
+        return self._dimensiones
+
+    def fecha_exif(self):
+        """Fecha de los metadatos EXIF (preferida la de captura), o None"""
+        metadatos = self.metadatos()
+        if metadatos is not None:
+            return metadatos['fecha']
+        if not PIL_AVAILABLE:
+            return None
+        exifdata = self.imagen.getexif()
+        etiquetas = dict(exifdata)
+        etiquetas.update(exifdata.get_ifd(TAG_EXIF_IFD))
+        for tag in TAGS_FECHA:
+            if tag in etiquetas:
+                fecha = convertir_fecha_exif(etiquetas[tag])
+                if fecha is not None:
+                    return fecha
+        return None
+
+    def fecha(self):
+        """Fecha EXIF o, si no hay, fecha de modificación del archivo"""
+        fecha = None
+        try:
+            fecha = self.fecha_exif()
+        except:
+            pass
+
+        if not fecha:
+            try:
+                if self.st is not None:
+                    timestamp = self.st.st_mtime
+                else:
+                    timestamp = os.path.getmtime(self.archivo)
+                fecha = datetime.fromtimestamp(timestamp)
+            except:
+                return None
+        return fecha
+
+    def hash_perceptual(self, tipo='ahash'):
+        """Hash perceptual en hexadecimal: 'ahash' (average), 'dhash' o 'phash' (DCT)"""
+        funciones = {'ahash': imagehash.average_hash, 'dhash': imagehash.dhash, 'phash': imagehash.phash}
+        imagen = self.imagen
+        if imagen.format == 'JPEG':
+            # Decodificar directamente a escala reducida y solo luminancia
+            imagen.draft('L', (TAMAÑO_DRAFT, TAMAÑO_DRAFT))
+        return str(funciones[tipo](imagen))
+
+    def calidad(self):
+        """
+        Nitidez (varianza del laplaciano) y contraste (distancia entre los
+        percentiles 5 y 95 del histograma), medidos sobre la misma imagen
+        que el hash perceptual: en JPEG ya decodificada a escala reducida.
+        """
+        imagen = self.imagen
+        if imagen.format == 'JPEG':
+            imagen.draft('L', (TAMAÑO_DRAFT, TAMAÑO_DRAFT))
+        factor = min(imagen.size) // LADO_CALIDAD
+        if factor > 1:
+            # Reducir por bloques antes de convertir: en PNG la imagen llega completa
+            try:
+                imagen = imagen.reduce(factor)
+            except ValueError:
+                pass  # modos sin reduce() (paleta, 1 bit...)
+        gris = np.asarray(imagen.convert('L').resize((LADO_CALIDAD, LADO_CALIDAD), Image.BILINEAR),
+                          dtype=np.float32)
+        laplaciano = (4 * gris[1:-1, 1:-1] - gris[:-2, 1:-1] - gris[2:, 1:-1]
+                      - gris[1:-1, :-2] - gris[1:-1, 2:])
+        bajo, alto = np.percentile(gris, (5, 95))
+        return {'nitidez': round(float(laplaciano.var()), 3), 'contraste': round(float(alto - bajo), 3)}
+
+    def cerrar(self):
+        if self._imagen is not None:
+            self._imagen.close()
+            self._imagen = None
+        self._datos = None
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+PRUEBA DEL ANALIZADOR - --verificar solo informa y no escribe nada en la
+biblioteca (ni filas ni archivos -wal/-shm); --depurar quita del
+manifiesto las fotos que ya no existen
+"""
+
+import contextlib
+import io
+
+import pytest
+
+from analizar_resultados import analizar_carpeta_organizada
+from manifiesto import ManifiestoBiblioteca, NOMBRE_MANIFIESTO
+
+
+@pytest.fixture
+def biblioteca(tmp_path):
+    """Manifiesto con dos fotos registradas, de las que solo una sigue en disco"""
+    carpeta = tmp_path / "biblioteca"
+    for nombre in ("presente.jpg", "borrada.jpg"):
+        destino = carpeta / "2020" / "01_Enero" / nombre
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        destino.write_bytes(b"foto")
+    manifiesto = ManifiestoBiblioteca(carpeta)
+    for destino in sorted((carpeta / "2020" / "01_Enero").iterdir()):
+        manifiesto.registrar(destino, {'accion': 'CONSERVAR', 'categoria': 'conservadas'})
+    manifiesto.cerrar()
+    (carpeta / "2020" / "01_Enero" / "borrada.jpg").unlink()
+    return carpeta
+
+
+def archivos(carpeta):
+    return sorted(ruta.name for ruta in carpeta.iterdir())
+
+
+def filas(carpeta):
+    manifiesto = ManifiestoBiblioteca.abrir_existente(carpeta)
+    try:
+        return manifiesto.rutas()
+    finally:
+        manifiesto.cerrar()
+
+
+def test_verificar_no_escribe(biblioteca):
+    antes = archivos(biblioteca)
+    with contextlib.redirect_stdout(io.StringIO()) as salida:
+        analizar_carpeta_organizada(biblioteca, verificar=True)
+    assert "Registradas pero ausentes: 1" in salida.getvalue()
+    assert archivos(biblioteca) == antes  # sin -wal/-shm
+    assert filas(biblioteca) == {'2020/01_Enero/presente.jpg', '2020/01_Enero/borrada.jpg'}
+
+
+def test_depurar_quita_las_ausentes(biblioteca):
+    with contextlib.redirect_stdout(io.StringIO()):
+        analizar_carpeta_organizada(biblioteca, depurar=True)
+    assert filas(biblioteca) == {'2020/01_Enero/presente.jpg'}
+    assert NOMBRE_MANIFIESTO in archivos(biblioteca)
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+PRUEBA DE MEMORIA - Versión reducida de benchmark_memoria.py para pytest
+50.000 fotos sintéticas en unos segundos; el benchmark de un millón
+(python benchmark_memoria.py) sigue siendo la medida de referencia
+"""
+
+from almacen_compacto import ConjuntoRutas
+from benchmark_memoria import PRESUPUESTO_BYTES_POR_FOTO, medir
+
+FOTOS = 50_000
+
+
+def test_bytes_por_foto_dentro_del_presupuesto():
+    r = medir(FOTOS)
+    assert r['registradas'] + r['duplicados_exactos'] == FOTOS
+    assert r['indexadas'] == r['registradas']
+    assert r['bytes_por_foto'] <= PRESUPUESTO_BYTES_POR_FOTO, r
+
+
+def test_conjunto_rutas_compacto():
+    rutas = ConjuntoRutas()
+    for i in range(FOTOS):
+        rutas.agregar(f"/fotos/{2005 + i % 20}/IMG_{i:08d}.JPG")
+    assert len(rutas) == FOTOS
+    assert "/fotos/2005/IMG_00000000.JPG" in rutas
+    assert "/fotos/2005/IMG_99999999.JPG" not in rutas
+    assert rutas.bytes_usados() / FOTOS <= 34
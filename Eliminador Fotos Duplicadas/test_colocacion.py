@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+PRUEBA DE COLOCACIÓN - Mover sin enlaces duros (exFAT, SMB...) renombra en
+el mismo sistema de archivos, sin copiar y sin sobrescribir nunca
+"""
+
+import errno
+import os
+
+import pytest
+
+import colocacion
+from colocacion import Colocador
+
+
+@pytest.fixture(params=['renameat2', 'reserva'])
+def sin_enlaces(request, monkeypatch):
+    """os.link falla como en un sistema de archivos sin enlaces duros"""
+    def link(origen, destino):
+        raise OSError(errno.EPERM, os.strerror(errno.EPERM))
+    monkeypatch.setattr(os, 'link', link)
+    if request.param == 'reserva':
+        monkeypatch.setattr(colocacion, 'RENAMEAT2_AVAILABLE', False)
+    elif not colocacion.RENAMEAT2_AVAILABLE:
+        pytest.skip("renameat2 no disponible")
+
+
+def test_mover_sin_enlaces_renombra(tmp_path, sin_enlaces):
+    origen = tmp_path / "IMG_0001.jpg"
+    origen.write_bytes(b"foto")
+    inodo = origen.stat().st_ino
+    colocador = Colocador('mover')
+
+    final, escritos = colocador.colocar(origen, tmp_path / "2020" / "IMG_0001.jpg")
+
+    assert escritos == 0
+    assert not origen.exists()
+    assert final.read_bytes() == b"foto" and final.stat().st_ino == inodo
+    assert colocador.resumen()['archivos'] == {'renombrado': 1}
+    assert not colocador.respaldos
+
+
+def test_mover_sin_enlaces_no_sobrescribe(tmp_path, sin_enlaces):
+    destino = tmp_path / "2020" / "IMG_0001.jpg"
+    destino.parent.mkdir()
+    destino.write_bytes(b"otra foto")
+    origen = tmp_path / "IMG_0001.jpg"
+    origen.write_bytes(b"foto")
+
+    final, _ = Colocador('mover').colocar(origen, destino)
+
+    assert final.name == "IMG_0001_1.jpg"
+    assert destino.read_bytes() == b"otra foto"
+    assert final.read_bytes() == b"foto" and not origen.exists()
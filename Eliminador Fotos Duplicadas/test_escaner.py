@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+PRUEBA DEL ESCÁNER - Las carpetas excluidas no se recorren, se indiquen
+por su ruta o por un enlace simbólico a ella
+"""
+
+import os
+
+import pytest
+
+from escaner import recorrer_imagenes
+
+
+@pytest.fixture
+def origen(tmp_path):
+    for carpeta in ("a", "destino", "destino/2020", "z"):
+        (tmp_path / carpeta).mkdir()
+        (tmp_path / carpeta / "foto.jpg").write_bytes(b"foto")
+    os.symlink(tmp_path / "destino", tmp_path / "enlace")
+    return tmp_path
+
+
+def relativas(origen, **opciones):
+    return [archivo.relative_to(origen).as_posix() for archivo, _ in recorrer_imagenes(origen, **opciones)]
+
+
+def test_sin_exclusiones(origen):
+    assert relativas(origen) == ["a/foto.jpg", "destino/foto.jpg", "destino/2020/foto.jpg", "z/foto.jpg"]
+
+
+@pytest.mark.parametrize('excluida', ["destino", "enlace"])
+def test_excluye_la_carpeta(origen, excluida):
+    assert relativas(origen, excluir=[origen / excluida]) == ["a/foto.jpg", "z/foto.jpg"]
+
+
+def test_exclusion_inexistente(origen):
+    assert len(relativas(origen, excluir=[origen / "no_existe"])) == 4
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+PRUEBA DE LA MEJOR COPIA - En un grupo de cuasi-duplicados se conserva el
+original frente a copias recomprimidas, reducidas, desenfocadas o lavadas,
+aunque la copia se procese antes
+"""
+
+import contextlib
+import io
+import json
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('imagehash')
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+from diario import NOMBRE_DIARIO
+from organizador_fotos import OrganizadorFotos
+
+
+def foto_suave(ancho=1024, alto=768, semilla=3):
+    """Degradado con elipses difuminadas: sin ruido fino, como una foto real desenfocada de fondo"""
+    rng = random.Random(semilla)
+    imagen = Image.linear_gradient('L').resize((ancho, alto)).convert('RGB')
+    dibujo = ImageDraw.Draw(imagen)
+    for _ in range(12):
+        x, y = rng.randrange(ancho), rng.randrange(alto)
+        r = rng.randrange(40, 200)
+        dibujo.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return imagen.filter(ImageFilter.GaussianBlur(3))
+
+
+COPIAS = {
+    'recomprimida_q60': lambda foto: (foto, 60),
+    'recomprimida_q75': lambda foto: (foto, 75),
+    'reducida': lambda foto: (foto.resize((foto.width * 9 // 10, foto.height * 9 // 10)), 90),
+    'desenfocada': lambda foto: (foto.filter(ImageFilter.GaussianBlur(4)), 90),
+    'lavada': lambda foto: (ImageEnhance.Contrast(foto).enhance(0.5), 90),
+}
+
+
+@pytest.mark.parametrize('copia', sorted(COPIAS))
+def test_se_conserva_el_original(tmp_path, copia):
+    origen, destino = tmp_path / "origen", tmp_path / "destino"
+    origen.mkdir()
+    foto = foto_suave()
+    foto.save(origen / "b_original.jpg", quality=90)
+    imagen, calidad = COPIAS[copia](foto)
+    imagen.save(origen / "a_copia.jpg", quality=calidad)  # se procesa antes que el original
+
+    organizador = OrganizadorFotos(origen, destino, agrupar_cuasi=True, silencioso=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        organizador.crear_estructura_carpetas()
+        organizador.procesar_carpeta()
+        organizador.cerrar()
+
+    with open(destino / NOMBRE_DIARIO, encoding='utf-8') as f:
+        categorias = {entrada['archivo']: entrada['categoria'] for entrada in map(json.loads, f)}
+    assert categorias['a_copia.jpg'] == 'cuasi_duplicados'
+    assert categorias['b_original.jpg'] != 'cuasi_duplicados'
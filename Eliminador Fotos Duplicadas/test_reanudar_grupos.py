@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+PRUEBA DE REANUDACIÓN - Modo por grupos con fotos añadidas entre la caída
+y la reanudación: la copia que el diario ya conservó sigue representando a
+su grupo y los grupos nuevos eligen la suya
+"""
+
+import contextlib
+import io
+import json
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('imagehash')
+from PIL import Image
+
+from diario import NOMBRE_DIARIO
+from organizador_fotos import OrganizadorFotos
+
+
+def guardar_par(carpeta, nombre, semilla):
+    """Una foto de bloques al azar y una copia reducida (cuasi-duplicado de menor resolución)"""
+    rng = random.Random(semilla)
+    pequeña = Image.new('L', (8, 8))
+    pequeña.putdata([rng.choice((30, 220)) for _ in range(64)])
+    foto = pequeña.resize((800, 600), Image.NEAREST).convert('RGB')
+    carpeta.mkdir(parents=True, exist_ok=True)
+    foto.save(carpeta / f"{nombre}.jpg", quality=92)
+    foto.resize((400, 300)).save(carpeta / f"{nombre}_b.jpg", quality=92)
+
+
+def organizar(origen, destino, modo, caer_tras=None):
+    organizador = OrganizadorFotos(origen, destino, modo_colocacion=modo, agrupar_cuasi=True,
+                                   reanudar=True, silencioso=True)
+    if caer_tras is not None:
+        procesar = organizador.procesar_imagen
+
+        def procesar_y_caer(*args):
+            if organizador.estadisticas['total_procesadas'] >= caer_tras:
+                raise KeyboardInterrupt
+            procesar(*args)
+        organizador.procesar_imagen = procesar_y_caer
+    with contextlib.redirect_stdout(io.StringIO()):
+        organizador.crear_estructura_carpetas()
+        try:
+            organizador.procesar_carpeta()
+        except KeyboardInterrupt:
+            pass
+        organizador.cerrar()
+
+
+@pytest.mark.parametrize('modo', ['copiar', 'mover'])
+def test_fotos_añadidas_entre_caida_y_reanudacion(tmp_path, modo):
+    origen, destino = tmp_path / "origen", tmp_path / "destino"
+    guardar_par(origen / "m", "A", semilla=1)
+    organizar(origen, destino, modo, caer_tras=1)  # solo queda decidida A.jpg
+
+    # Llegan C y su copia en una carpeta que el recorrido visita antes
+    guardar_par(origen / "a", "C", semilla=2)
+    organizar(origen, destino, modo)
+
+    entradas = {}
+    with open(destino / NOMBRE_DIARIO, encoding='utf-8') as f:
+        for linea in f:
+            entrada = json.loads(linea)
+            entradas[entrada['archivo']] = entrada
+    assert set(entradas) == {'A.jpg', 'A_b.jpg', 'C.jpg', 'C_b.jpg'}
+    assert entradas['A.jpg']['categoria'] != 'cuasi_duplicados'
+    assert entradas['A_b.jpg']['razon'].endswith('A.jpg')
+    assert entradas['C.jpg']['categoria'] != 'cuasi_duplicados'
+    assert entradas['C_b.jpg']['razon'].endswith('C.jpg')
+    assert entradas['C_b.jpg']['grupo'] != entradas['A_b.jpg']['grupo']
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+VIGILANCIA - Modo continuo: organiza las fotos nuevas según van llegando
+inotify en Linux y, si no está disponible, sondeo periódico de la carpeta
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import sys
+import time
+from pathlib import Path
+
+from escaner import es_imagen, identificar_carpetas, recorrer_imagenes
+
+# Constantes de <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+MASCARA_VIGILANCIA = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+CABECERA_EVENTO = struct.Struct('iIII')
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    _libc.inotify_init1.argtypes = [ctypes.c_int]
+    _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    INOTIFY_AVAILABLE = sys.platform.startswith('linux')
+except (OSError, AttributeError, TypeError):
+    INOTIFY_AVAILABLE = False
+
+
+class VigilanteInotify:
+    """
+    Vigila `carpeta` y sus subcarpetas con inotify. `cambios(espera)`
+    devuelve las rutas de imagen creadas, escritas o movidas hacia dentro
+    desde la última llamada (puede repetir rutas; el llamador deduplica).
+    `iniciales` son las imágenes que ya había al empezar a vigilar.
+    """
+
+    def __init__(self, carpeta, excluir=()):
+        self.carpeta = Path(carpeta)
+        self.excluir = tuple(excluir)
+        self.fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.carpetas = {}  # descriptor de vigilancia -> carpeta
+        self.iniciales = self._vigilar_arbol(self.carpeta)
+
+    def _vigilar_arbol(self, carpeta):
+        """Añade carpeta y subcarpetas; devuelve las imágenes que ya contienen"""
+        encontradas = []
+        excluidas = identificar_carpetas(self.excluir)
+        pendientes = [os.fspath(carpeta)]
+        while pendientes:
+            actual = pendientes.pop()
+            if excluidas:
+                try:
+                    st = os.lstat(actual)
+                except OSError:
+                    continue
+                if (st.st_dev, st.st_ino) in excluidas:
+                    continue
+            wd = _libc.inotify_add_watch(self.fd, os.fsencode(actual), MASCARA_VIGILANCIA)
+            if wd < 0:
+                continue  # desapareció o sin permisos
+            self.carpetas[wd] = Path(actual)
+            try:
+                with os.scandir(actual) as entradas:
+                    for entrada in entradas:
+                        if entrada.is_dir(follow_symlinks=False):
+                            pendientes.append(entrada.path)
+                        elif es_imagen(entrada.name):
+                            encontradas.append(Path(entrada.path))
+            except OSError:
+                continue
+        return encontradas
+
+    def cambios(self, espera):
+        listos, _, _ = select.select([self.fd], [], [], espera)
+        if not listos:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        rutas = []
+        posicion = 0
+        while posicion < len(buffer):
+            wd, mascara, _, largo = CABECERA_EVENTO.unpack_from(buffer, posicion)
+            posicion += CABECERA_EVENTO.size
+            nombre = os.fsdecode(buffer[posicion:posicion + largo].rstrip(b'\0'))
+            posicion += largo
+
+            if mascara & IN_Q_OVERFLOW:
+                # Se perdieron eventos: volver a mirar todo el árbol
+                rutas.extend(archivo for archivo, _ in
+                             recorrer_imagenes(self.carpeta, excluir=self.excluir))
+                continue
+            if mascara & IN_IGNORED:
+                self.carpetas.pop(wd, None)
+                continue
+            carpeta = self.carpetas.get(wd)
+            if carpeta is None or not nombre:
+                continue
+            ruta = carpeta / nombre
+            if mascara & IN_ISDIR:
+                # Carpeta nueva: vigilarla y recoger lo que ya tenga dentro
+                rutas.extend(self._vigilar_arbol(ruta))
+            elif es_imagen(nombre):
+                rutas.append(ruta)
+        return rutas
+
+    def cerrar(self):
+        os.close(self.fd)
+
+
+class VigilanteSondeo:
+    """
+    Alternativa sin inotify: recorre la carpeta cada `espera` segundos y
+    devuelve las imágenes nuevas o cambiadas (tamaño o mtime) desde la
+    pasada anterior. `iniciales` son las imágenes que ya había al empezar.
+    """
+
+    def __init__(self, carpeta, excluir=()):
+        self.carpeta = Path(carpeta)
+        self.excluir = tuple(excluir)
+        self.firmas = self._firmas()
+        self.iniciales = list(self.firmas)
+
+    def _firmas(self):
+        return {archivo: (st.st_size, st.st_mtime_ns)
+                for archivo, st in recorrer_imagenes(self.carpeta, excluir=self.excluir)}
+
+    def cambios(self, espera):
+        time.sleep(espera)
+        anteriores, self.firmas = self.firmas, self._firmas()
+        return [archivo for archivo, firma in self.firmas.items() if anteriores.get(archivo) != firma]
+
+    def cerrar(self):
+        pass
+
+
+def vigilar(organizador, asentamiento=2.0, intervalo=1.0, sondeo=False):
+    """
+    Bucle del modo continuo. Cada ruta nueva queda pendiente hasta que su
+    tamaño y mtime no cambian durante `asentamiento` segundos (el archivo
+    ya terminó de escribirse); entonces se organiza con el mismo
+    organizador, cuyos índices de duplicados siguen en memoria.
+
+    Las imágenes que ya están en el origen al empezar a vigilar y que el
+    diario no tiene (llegaron durante la primera pasada o justo después)
+    entran también como pendientes.
+
+    La latencia de ingesta (desde que se detecta hasta que su decisión
+    está en el diario) queda en la etapa 'ingesta' de las métricas.
+    Termina con Ctrl+C o SIGTERM.
+    """
+    excluir = [organizador.carpeta_destino]
+    if INOTIFY_AVAILABLE and not sondeo:
+        vigilante = VigilanteInotify(organizador.carpeta_origen, excluir)
+        print(f"👀 Vigilando {organizador.carpeta_origen} con inotify (Ctrl+C para terminar)")
+    else:
+        vigilante = VigilanteSondeo(organizador.carpeta_origen, excluir)
+        intervalo = max(intervalo, asentamiento)
+        print(f"👀 Vigilando {organizador.carpeta_origen} cada {intervalo:.0f} s (Ctrl+C para terminar)")
+
+    # SIGTERM (systemd, docker stop...) termina igual que Ctrl+C
+    def detener(signum, frame):
+        raise KeyboardInterrupt
+    anterior_sigterm = signal.signal(signal.SIGTERM, detener)
+
+    pendientes = {}  # ruta -> [detectada, firma, estable_desde]
+    completados = organizador.diario.completados
+    for ruta in vigilante.iniciales:
+        if str(ruta) not in completados:
+            pendientes[ruta] = [time.monotonic(), None, None]
+    if pendientes:
+        print(f"📥 {len(pendientes)} fotos llegaron durante la primera pasada: se organizan ahora")
+    try:
+        while True:
+            for ruta in vigilante.cambios(intervalo):
+                if str(ruta) not in completados and ruta not in pendientes:
+                    pendientes[ruta] = [time.monotonic(), None, None]
+
+            ahora = time.monotonic()
+            listos = []
+            for ruta, estado in list(pendientes.items()):
+                try:
+                    st = os.stat(ruta)
+                except OSError:
+                    del pendientes[ruta]  # se borró o se movió antes de terminar
+                    continue
+                firma = (st.st_size, st.st_mtime_ns)
+                if firma != estado[1]:
+                    estado[1], estado[2] = firma, ahora
+                elif ahora - estado[2] >= asentamiento:
+                    listos.append((ruta, st, estado[0]))
+                    del pendientes[ruta]
+
+            if listos:
+                listos.sort(key=lambda llegada: llegada[0])
+                organizador.procesar_llegadas(listos)
+    except KeyboardInterrupt:
+        print("\n🛑 Vigilancia detenida")
+    finally:
+        signal.signal(signal.SIGTERM, anterior_sigterm)
+        vigilante.cerrar()